@@ -0,0 +1,293 @@
+'''
+Compact binary (HDF5) storage of the dictionaries we otherwise keep in JSON files:
+models, weights and results.
+
+Every top level entry of the dictionary becomes one HDF5 group. Lists of dicts
+(e.g. `segmentationHypotheses` or `linkingResults`) are stored column-wise as typed arrays,
+where nested feature lists like `[[0.1], [2.3], [4.5]]` are flattened into one value array
+per column plus the lengths needed to restore the nesting.
+The `traxelToUniqueId` mapping is stored as three integer arrays (timestep, labelimage id, uuid).
+Everything that does not fit into these layouts (e.g. `settings`) is stored as JSON string attribute,
+so that reading a file always yields exactly the dictionary that was written.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import io
+import json
+import logging
+import numbers
+import h5py
+import numpy as np
+
+# file extensions that are read/written with this module instead of JSON
+HDF5_EXTENSIONS = ['.h5', '.hdf5']
+
+# layout identifiers stored in the `layout` attribute of every group
+_NONE = 'none'
+_TABLE = 'table'
+_ARRAY = 'array'
+_RAGGED = 'ragged'
+_TRAXEL_MAP = 'traxelmap'
+_JSON = 'json'
+
+# column kinds used within tables
+_SCALAR = 'scalar'
+_LIST = 'list'
+_NESTED_LIST = 'nestedlist'
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def isHDF5Filename(filename):
+    ''' check by the extension whether the given filename should be stored in our binary format '''
+    return any(filename.lower().endswith(ext) for ext in HDF5_EXTENSIONS)
+
+def _isNumber(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+def _isListOfNumbers(value):
+    return isinstance(value, list) and all(_isNumber(v) for v in value)
+
+def _isListOfListsOfNumbers(value):
+    return isinstance(value, list) and all(_isListOfNumbers(v) for v in value)
+
+def _numberDType(values):
+    ''' integers stay integers, everything else is stored as double '''
+    if all(isinstance(v, numbers.Integral) for v in values):
+        return np.int64
+    return np.float64
+
+def _toList(array):
+    ''' convert a numpy array to a list of python scalars '''
+    return array.tolist()
+
+# ----------------------------------------------------------------------------
+# encoding
+
+def _columnKind(values):
+    '''
+    Find the storage kind of one table column, given all values present in that column.
+    **returns** one of `_SCALAR`, `_LIST`, `_NESTED_LIST` or `_JSON`
+    '''
+    if all(isinstance(v, bool) for v in values):
+        return _SCALAR
+    if all(_isNumber(v) for v in values):
+        return _SCALAR
+    if all(_isListOfNumbers(v) for v in values):
+        return _LIST
+    if all(_isListOfListsOfNumbers(v) for v in values):
+        return _NESTED_LIST
+    return _JSON
+
+def _writeTableColumn(group, name, column):
+    '''
+    Write one column of a table, where `column` contains the value of each row or `None` if the key was missing.
+    '''
+    present = np.array([v is not None for v in column], dtype=bool)
+    values = [v for v in column if v is not None]
+    kind = _columnKind(values)
+    columnGroup = group.create_group(name)
+    columnGroup.attrs['kind'] = kind
+
+    if kind == _SCALAR:
+        if len(values) > 0 and all(isinstance(v, bool) for v in values):
+            columnGroup.attrs['bool'] = True
+            data = np.array(values, dtype=np.uint8)
+        else:
+            data = np.array(values, dtype=_numberDType(values))
+        columnGroup.create_dataset('values', data=data)
+        if not np.all(present):
+            columnGroup.create_dataset('present', data=present.astype(np.uint8))
+    elif kind == _LIST:
+        flat = [e for v in values for e in v]
+        columnGroup.create_dataset('values', data=np.array(flat, dtype=_numberDType(flat)))
+        lengths = np.full(len(column), -1, dtype=np.int64)
+        lengths[present] = [len(v) for v in values]
+        columnGroup.create_dataset('lengths', data=lengths)
+    elif kind == _NESTED_LIST:
+        innerLengths = np.array([len(inner) for v in values for inner in v], dtype=np.int64)
+        flat = [e for v in values for inner in v for e in inner]
+        columnGroup.create_dataset('values', data=np.array(flat, dtype=_numberDType(flat)))
+        lengths = np.full(len(column), -1, dtype=np.int64)
+        lengths[present] = [len(v) for v in values]
+        columnGroup.create_dataset('lengths', data=lengths)
+        if len(innerLengths) > 0 and np.all(innerLengths == innerLengths[0]):
+            # the usual case of one feature per state, don't store the same length again and again
+            columnGroup.attrs['innerLength'] = int(innerLengths[0])
+        else:
+            columnGroup.create_dataset('innerLengths', data=innerLengths)
+    else:
+        data = np.array([json.dumps(v) for v in column], dtype=object)
+        columnGroup.create_dataset('values', data=data, dtype=h5py.special_dtype(vlen=str))
+
+def _writeTable(group, listOfDicts):
+    ''' store a list of dictionaries column by column '''
+    group.attrs['layout'] = _TABLE
+    group.attrs['length'] = len(listOfDicts)
+    keys = []
+    for d in listOfDicts:
+        for k in d.keys():
+            if k not in keys:
+                keys.append(k)
+    group.attrs['keys'] = json.dumps(keys)
+    for i, k in enumerate(keys):
+        # keys might contain characters that are not allowed in HDF5 names, so we index the columns
+        _writeTableColumn(group, 'column{}'.format(i), [d.get(k, None) for d in listOfDicts])
+
+def _isTraxelToUniqueIdMap(value):
+    ''' check whether the value looks like `{str(timestep): {str(id): int(uuid)}}` '''
+    if not isinstance(value, dict):
+        return False
+    try:
+        return all(str(int(t)) == t and all(str(int(i)) == i and _isNumber(u) for i, u in ids.items())
+                   for t, ids in value.items())
+    except (ValueError, TypeError, AttributeError):
+        return False
+
+def _writeTraxelMap(group, traxelIdPerTimestepToUniqueIdMap):
+    group.attrs['layout'] = _TRAXEL_MAP
+    timesteps = []
+    ids = []
+    uuids = []
+    for t, idMap in traxelIdPerTimestepToUniqueIdMap.items():
+        for i, uuid in idMap.items():
+            timesteps.append(int(t))
+            ids.append(int(i))
+            uuids.append(uuid)
+    # keep empty timesteps as well
+    group.create_dataset('timesteps', data=np.array([int(t) for t in traxelIdPerTimestepToUniqueIdMap.keys()], dtype=np.int64))
+    group.create_dataset('traxelTimesteps', data=np.array(timesteps, dtype=np.int64))
+    group.create_dataset('traxelIds', data=np.array(ids, dtype=np.int64))
+    group.create_dataset('uuids', data=np.array(uuids, dtype=np.int64))
+
+def _writeEntry(parent, name, key, value):
+    group = parent.create_group(name)
+    if value is None:
+        group.attrs['layout'] = _NONE
+    elif isinstance(value, list) and len(value) > 0 and all(isinstance(v, dict) for v in value):
+        _writeTable(group, value)
+    elif isinstance(value, list) and len(value) > 0 and _isListOfNumbers(value):
+        group.attrs['layout'] = _ARRAY
+        group.create_dataset('values', data=np.array(value, dtype=_numberDType(value)))
+    elif isinstance(value, list) and len(value) > 0 and _isListOfListsOfNumbers(value):
+        group.attrs['layout'] = _RAGGED
+        flat = [e for v in value for e in v]
+        group.create_dataset('values', data=np.array(flat, dtype=_numberDType(flat)))
+        group.create_dataset('lengths', data=np.array([len(v) for v in value], dtype=np.int64))
+    elif key == 'traxelToUniqueId' and _isTraxelToUniqueIdMap(value):
+        _writeTraxelMap(group, value)
+    else:
+        group.attrs['layout'] = _JSON
+        group.attrs['json'] = json.dumps(value)
+
+def _writeDictionary(h5file, dictionary):
+    h5file.attrs['keys'] = json.dumps(list(dictionary.keys()))
+    for i, (k, v) in enumerate(dictionary.items()):
+        _writeEntry(h5file, 'entry{}'.format(i), k, v)
+
+# ----------------------------------------------------------------------------
+# decoding
+
+def _splitByLengths(values, lengths):
+    ''' cut the flat `values` list into pieces of the given `lengths` '''
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return [values[offsets[i]:offsets[i + 1]] for i in range(len(lengths))]
+
+def _readTableColumn(columnGroup, length):
+    '''
+    **returns** a list with one value per row, or `None` where the row did not contain the key
+    '''
+    kind = columnGroup.attrs['kind']
+    if kind == _SCALAR:
+        values = _toList(columnGroup['values'][()])
+        if columnGroup.attrs.get('bool', False):
+            values = [bool(v) for v in values]
+        if 'present' in columnGroup:
+            present = columnGroup['present'][()].astype(bool)
+            it = iter(values)
+            return [next(it) if p else None for p in present]
+        return values
+    elif kind in [_LIST, _NESTED_LIST]:
+        lengths = columnGroup['lengths'][()]
+        present = lengths >= 0
+        flat = _toList(columnGroup['values'][()])
+        if kind == _NESTED_LIST:
+            numInner = int(np.sum(lengths[present]))
+            if 'innerLengths' in columnGroup:
+                innerLengths = columnGroup['innerLengths'][()]
+            else:
+                innerLengths = np.full(numInner, columnGroup.attrs['innerLength'], dtype=np.int64)
+            flat = _splitByLengths(flat, innerLengths)
+        pieces = iter(_splitByLengths(flat, lengths[present]))
+        return [next(pieces) if p else None for p in present]
+    else:
+        return [json.loads(v) for v in columnGroup['values'][()]]
+
+def _readTable(group):
+    length = int(group.attrs['length'])
+    keys = json.loads(group.attrs['keys'])
+    result = [{} for _ in range(length)]
+    for i, k in enumerate(keys):
+        column = _readTableColumn(group['column{}'.format(i)], length)
+        for d, v in zip(result, column):
+            if v is not None:
+                d[k] = v
+    return result
+
+def _readTraxelMap(group):
+    traxelIdPerTimestepToUniqueIdMap = dict((str(t), {}) for t in _toList(group['timesteps'][()]))
+    for t, i, uuid in zip(_toList(group['traxelTimesteps'][()]), _toList(group['traxelIds'][()]), _toList(group['uuids'][()])):
+        traxelIdPerTimestepToUniqueIdMap[str(t)][str(i)] = uuid
+    return traxelIdPerTimestepToUniqueIdMap
+
+def _readEntry(group):
+    layout = group.attrs['layout']
+    if layout == _NONE:
+        return None
+    elif layout == _TABLE:
+        return _readTable(group)
+    elif layout == _ARRAY:
+        return _toList(group['values'][()])
+    elif layout == _RAGGED:
+        return _splitByLengths(_toList(group['values'][()]), group['lengths'][()])
+    elif layout == _TRAXEL_MAP:
+        return _readTraxelMap(group)
+    elif layout == _JSON:
+        return json.loads(group.attrs['json'])
+    else:
+        raise ValueError("Unknown layout {} of group {}".format(layout, group.name))
+
+def _readDictionary(h5file):
+    keys = json.loads(h5file.attrs['keys'])
+    return dict((k, _readEntry(h5file['entry{}'.format(i)])) for i, k in enumerate(keys))
+
+# ----------------------------------------------------------------------------
+# public API
+
+def writeToHDF5(filename, dictionary):
+    ''' Write a dictionary (model, weights or result) to our compact HDF5 layout '''
+    with h5py.File(filename, 'w') as f:
+        _writeDictionary(f, dictionary)
+
+def readFromHDF5(filename):
+    ''' Read a dictionary (model, weights or result) that was stored with `writeToHDF5` '''
+    with h5py.File(filename, 'r') as f:
+        return _readDictionary(f)
+
+def writeToBytes(dictionary):
+    '''
+    Serialize a dictionary (model, weights or result) to our compact HDF5 layout in memory,
+    e.g. to send it to another process.
+
+    **returns** the HDF5 file content as `bytes`
+    '''
+    buffer = io.BytesIO()
+    with h5py.File(buffer, 'w') as f:
+        _writeDictionary(f, dictionary)
+    return buffer.getvalue()
+
+def readFromBytes(data):
+    ''' Read a dictionary that was serialized with `writeToBytes` '''
+    with h5py.File(io.BytesIO(data), 'r') as f:
+        return _readDictionary(f)
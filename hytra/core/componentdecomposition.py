@@ -0,0 +1,158 @@
+'''
+Many hypotheses graphs fall apart into independent connected components, e.g. separate colonies or the wells
+of a multi-well plate. Tracking each component on its own yields the same (globally optimal) solution as tracking
+the whole graph at once, but the components can be solved in parallel.
+
+Two detections belong to the same component if they are connected by a link, are part of the same exclusion set,
+or are involved in the same division hypothesis. Small components are batched together into one submodel,
+such that we do not pay the scheduling overhead for every single one.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import concurrent.futures
+from hytra.core.binarygraph import writeToBytes, readFromBytes
+from hytra.core.solvers import solve
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def solveSubmodelInSeparateProcess(serializedSubmodel, serializedWeights, solver):
+    '''
+    Track one submodel, submodel, weights and result are passed in the compact binary format
+    of `hytra.core.binarygraph.writeToBytes`.
+
+    Meant to be run in its own process using `concurrent.futures.ProcessPoolExecutor`
+
+    **returns** the serialized result
+    '''
+    return writeToBytes(solve(readFromBytes(serializedSubmodel), readFromBytes(serializedWeights), solver))
+
+def findConnectedComponents(model):
+    '''
+    Find the weakly connected components of the hypotheses graph in `model` using union-find,
+    where detections in the same exclusion set or division hypothesis are considered connected as well.
+
+    **returns** a list of components, each given as list of detection uuids, sorted by decreasing size
+    '''
+    uuids = [d['id'] for d in model['segmentationHypotheses']]
+    parent = dict((u, u) for u in uuids)
+
+    def find(u):
+        root = u
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[u] != root:
+            parent[u], u = root, parent[u]
+        return root
+
+    def union(a, b):
+        rootA = find(a)
+        rootB = find(b)
+        if rootA != rootB:
+            parent[rootB] = rootA
+
+    for l in model['linkingHypotheses']:
+        union(l['src'], l['dest'])
+    for exclusionSet in model.get('exclusions', []):
+        for u in exclusionSet[1:]:
+            union(exclusionSet[0], u)
+    for d in model.get('divisionHypotheses', []):
+        for child in d['children']:
+            union(d['parent'], child)
+
+    componentsByRoot = {}
+    for u in uuids:
+        componentsByRoot.setdefault(find(u), []).append(u)
+    return sorted(componentsByRoot.values(), key=len, reverse=True)
+
+def batchComponents(components, minBatchSize):
+    '''
+    Group the given `components` (sorted by decreasing size) into batches that contain at least `minBatchSize`
+    detections, except for the last one. Components that are large enough form a batch on their own.
+
+    **returns** a list of batches, each given as list of detection uuids
+    '''
+    batches = []
+    currentBatch = []
+    for component in components:
+        currentBatch.extend(component)
+        if len(currentBatch) >= minBatchSize:
+            batches.append(currentBatch)
+            currentBatch = []
+    if len(currentBatch) > 0:
+        batches.append(currentBatch)
+    return batches
+
+def decomposeModel(model, minBatchSize=1000):
+    '''
+    Split the `model` into independent submodels, each consisting of one or more connected components.
+
+    **returns** a list of submodels, which contain the hypotheses in the same order as the `model`
+    '''
+    batches = batchComponents(findConnectedComponents(model), minBatchSize)
+    batchPerUuid = {}
+    for i, batch in enumerate(batches):
+        for u in batch:
+            batchPerUuid[u] = i
+
+    submodels = []
+    for _ in batches:
+        submodel = {'segmentationHypotheses': [],
+                    'linkingHypotheses': [],
+                    'exclusions': [],
+                    'divisionHypotheses': [],
+                    'settings': model.get('settings', {})}
+        submodels.append(submodel)
+
+    # all parts of a link, exclusion set or division are in the same component, so we look at the first uuid only
+    for d in model['segmentationHypotheses']:
+        submodels[batchPerUuid[d['id']]]['segmentationHypotheses'].append(d)
+    for l in model['linkingHypotheses']:
+        submodels[batchPerUuid[l['src']]]['linkingHypotheses'].append(l)
+    for exclusionSet in model.get('exclusions', []):
+        if len(exclusionSet) > 0:
+            submodels[batchPerUuid[exclusionSet[0]]]['exclusions'].append(exclusionSet)
+    for d in model.get('divisionHypotheses', []):
+        submodels[batchPerUuid[d['parent']]]['divisionHypotheses'].append(d)
+    return submodels
+
+def mergeResults(results):
+    '''
+    Concatenate the results of independent submodels into one result dictionary
+    '''
+    mergedResult = {'detectionResults': [], 'linkingResults': [], 'divisionResults': None}
+    for result in results:
+        mergedResult['detectionResults'].extend(result['detectionResults'])
+        mergedResult['linkingResults'].extend(result['linkingResults'])
+        if result.get('divisionResults') is not None:
+            if mergedResult['divisionResults'] is None:
+                mergedResult['divisionResults'] = []
+            mergedResult['divisionResults'].extend(result['divisionResults'])
+    return mergedResult
+
+def trackWithComponentDecomposition(model, weights, solver='flow-based', useMultiprocessing=True, numWorkers=None, minBatchSize=1000):
+    '''
+    Track the `model` by solving all independent components of the hypotheses graph separately,
+    in parallel using `numWorkers` processes (defaults to the number of CPU cores) if `useMultiprocessing=True`.
+    See `hytra.core.solvers` for the available solvers.
+
+    **returns** the merged result of all components, which is the optimal solution for the full `model`
+    '''
+    submodels = decomposeModel(model, minBatchSize)
+    getLogger().info("Found {} batches of independent components".format(len(submodels)))
+
+    if len(submodels) == 1:
+        return solve(model, weights, solver)
+
+    if useMultiprocessing:
+        serializedWeights = writeToBytes(weights)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            futures = [executor.submit(solveSubmodelInSeparateProcess, writeToBytes(submodel), serializedWeights, solver)
+                       for submodel in submodels]
+            results = [readFromBytes(f.result()) for f in futures]
+    else:
+        results = [solve(submodel, weights, solver) for submodel in submodels]
+
+    return mergeResults(results)
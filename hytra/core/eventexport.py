@@ -0,0 +1,118 @@
+'''
+Export a tracking result to the ilastik events format: one HDF5 file per frame that contains the label image
+of that frame, and the appearances, disappearances, moves, divisions and mergers of its objects.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import logging
+import numpy as np
+import h5py
+from multiprocessing import Pool
+import hytra.core.jsongraph
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def writeEvents(timestep, activeLinks, activeDivisions, mergers, detections, fn, labelImagePath, ilpFilename, verbose, pluginPaths):
+    dis = []
+    app = []
+    div = []
+    mov = []
+    mer = []
+    mul = []
+
+    pluginManager = TrackingPluginManager(verbose=verbose, pluginPaths=pluginPaths)
+    
+    getLogger().debug("-- Writing results to {}".format(fn))
+    try:
+        # convert to ndarray for better indexing
+        dis = np.asarray(dis)
+        app = np.asarray(app)
+        div = np.asarray([[k, v[0], v[1]] for k,v in activeDivisions.items()])
+        mov = np.asarray(activeLinks)
+        mer = np.asarray([[k,v] for k,v in mergers.items()])
+        mul = np.asarray(mul)
+
+        shape = pluginManager.getImageProvider().getImageShape(ilpFilename, labelImagePath)
+        label_img = pluginManager.getImageProvider().getLabelImageForFrame(ilpFilename, labelImagePath, timestep)
+        
+        with h5py.File(fn, 'w') as dest_file:
+            # write meta fields and copy segmentation from project
+            seg = dest_file.create_group('segmentation')
+            seg.create_dataset("labels", data=label_img, compression='gzip')
+            meta = dest_file.create_group('objects/meta')
+            ids = np.unique(label_img)
+            ids = ids[ids > 0]
+            valid = np.ones(ids.shape)
+            meta.create_dataset("id", data=ids, dtype=np.uint32)
+            meta.create_dataset("valid", data=valid, dtype=np.uint32)
+
+            tg = dest_file.create_group("tracking")
+
+            # write associations
+            if app is not None and len(app) > 0:
+                ds = tg.create_dataset("Appearances", data=app, dtype=np.int32)
+                ds.attrs["Format"] = "cell label appeared in current file"
+
+            if dis is not None and len(dis) > 0:
+                ds = tg.create_dataset("Disappearances", data=dis, dtype=np.int32)
+                ds.attrs["Format"] = "cell label disappeared in current file"
+
+            if mov is not None and len(mov) > 0:
+                ds = tg.create_dataset("Moves", data=mov, dtype=np.int32)
+                ds.attrs["Format"] = "from (previous file), to (current file)"
+
+            if div is not None and len(div) > 0:
+                ds = tg.create_dataset("Splits", data=div, dtype=np.int32)
+                ds.attrs["Format"] = "ancestor (previous file), descendant (current file), descendant (current file)"
+
+            if mer is not None and len(mer) > 0:
+                ds = tg.create_dataset("Mergers", data=mer, dtype=np.int32)
+                ds.attrs["Format"] = "descendant (current file), number of objects"
+
+            if mul is not None and len(mul) > 0:
+                ds = tg.create_dataset("MultiFrameMoves", data=mul, dtype=np.int32)
+                ds.attrs["Format"] = "from (given by timestep), to (current file), timestep"
+
+        getLogger().debug("-> results successfully written")
+    except Exception as e:
+        getLogger().warning("ERROR while writing events: {}".format(str(e)))
+
+def exportEvents(model, result, labelImageFilename, labelImagePath, outDirectory, pluginPaths, verbose=False):
+    '''
+    Write one events file per frame of the `model` (including empty frames) to `outDirectory`, in parallel.
+    The label images are read from `labelImageFilename` using the image provider plugin found in `pluginPaths`.
+    '''
+    assert(result['detectionResults'] is not None)
+    assert(result['linkingResults'] is not None)
+
+    uuidToTraxelMap = hytra.core.jsongraph.UuidTraxelMapping.fromModel(model)
+    # there might be empty frames. We want them as output too.
+    timesteps = [str(t) for t in range(min(uuidToTraxelMap.timesteps()), max(uuidToTraxelMap.timesteps()) + 1)]
+
+    # group by timestep for event creation
+    resultIndex = hytra.core.jsongraph.ResultIndex(result, uuidToTraxelMap, timesteps)
+
+    # save to disk in parallel
+    if not os.path.exists(outDirectory):
+        os.makedirs(outDirectory)
+
+    processing_pool = Pool()
+    for timestep in timesteps:
+        fn = os.path.join(outDirectory, "{0:05d}.h5".format(int(timestep)))
+        processing_pool.apply_async(writeEvents,
+                                    (int(timestep),
+                                     resultIndex.linkArray(timestep),
+                                     resultIndex.divisions(int(timestep) - 1),
+                                     resultIndex.mergers(timestep),
+                                     resultIndex.detections(timestep),
+                                     fn,
+                                     labelImagePath,
+                                     labelImageFilename,
+                                     verbose,
+                                     pluginPaths))
+
+    processing_pool.close()
+    processing_pool.join()
@@ -71,6 +71,7 @@ class HypothesesGraph(object):
         self.withTracklets = False
         self.allowLengthOneTracks = True
         self._nextNodeUuid = 0
+        self._uuidTraxelMappingCache = None
         self.progressVisitor=DefaultProgressVisitor()
 
     def nodeIterator(self):
@@ -264,6 +265,7 @@ class HypothesesGraph(object):
         tracklet_graph._graph = tracklet_graph._graph.copy()
         tracklet_graph.withTracklets = True
         tracklet_graph.referenceTraxelGraph = self
+        tracklet_graph._uuidTraxelMappingCache = None
         tracklet_graph.progressVisitor = self.progressVisitor
 
         self.progressVisitor.showState("Initializing Tracklet Graph")
@@ -438,37 +440,49 @@ class HypothesesGraph(object):
             self._graph.edge[a[0]][a[1]]['dest'] = self._graph.node[a[1]]['id']
             self._graph.edge[a[0]][a[1]]['features'] = features
 
-    def getMappingsBetweenUUIDsAndTraxels(self):
+    def getUuidTraxelMapping(self):
         '''
-        Extract the mapping from UUID to traxel and vice versa from the networkx graph.
+        **Returns** a `hytra.core.jsongraph.UuidTraxelMapping` between the UUIDs of the nodes and the traxels they represent.
 
-        ** Returns: a tuple of **
-
-        * `traxelIdPerTimestepToUniqueIdMap`: a dictionary of the structure `{str(timestep):{str(labelimageId):int(uuid), 
-         str(labelimageId):int(uuid), ...}, str(nextTimestep):{}, ...}`
-        * `uuidToTraxelMap`: a dictionary with keys = int(uuid), values = list(of timestep-Id-tuples (int(Timestep), int(Id)))
+        The mapping is cached and only recomputed if nodes have been added or removed since the last call.
+        If you change the `'id'` attributes of nodes manually, the cached mapping will be outdated!
         '''
+        signature = (self._graph.number_of_nodes(), self._nextNodeUuid, self.withTracklets)
+        if self._uuidTraxelMappingCache is not None and self._uuidTraxelMappingCache[0] == signature:
+            return self._uuidTraxelMappingCache[1]
 
-        uuidToTraxelMap = {}
-        traxelIdPerTimestepToUniqueIdMap = {}
-
+        timesteps = []
+        ids = []
+        uuids = []
         for n in self._graph.nodes_iter():
             uuid = self._graph.node[n]['id']
-            traxels = []
             if self.withTracklets:
                 traxels = self._graph.node[n]['tracklet']
             else:
                 traxels = [self._graph.node[n]['traxel']]
-            uuidToTraxelMap[uuid] = [(t.Timestep, t.Id) for t in traxels]
+            for t in traxels:
+                timesteps.append(t.Timestep)
+                ids.append(t.Id)
+                uuids.append(uuid)
 
-            for t in uuidToTraxelMap[uuid]:
-                traxelIdPerTimestepToUniqueIdMap.setdefault(str(t[0]), {})[str(t[1])] = uuid
+        mapping = hytra.core.jsongraph.UuidTraxelMapping(timesteps, ids, uuids)
+        self._uuidTraxelMappingCache = (signature, mapping)
+        return mapping
 
-        # sort the list of traxels per UUID by their timesteps
-        for v in uuidToTraxelMap.values():
-            v.sort(key=lambda timestepIdTuple: timestepIdTuple[0])
+    def getMappingsBetweenUUIDsAndTraxels(self):
+        '''
+        Extract the mapping from UUID to traxel and vice versa from the networkx graph.
 
-        return traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap
+        ** Returns: a tuple of **
+
+        * `traxelIdPerTimestepToUniqueIdMap`: a dictionary of the structure `{str(timestep):{str(labelimageId):int(uuid), 
+         str(labelimageId):int(uuid), ...}, str(nextTimestep):{}, ...}`
+        * `uuidToTraxelMap`: a dictionary with keys = int(uuid), values = list(of timestep-Id-tuples (int(Timestep), int(Id)))
+
+        Use `getUuidTraxelMapping()` instead if you do not need the dictionaries.
+        '''
+        mapping = self.getUuidTraxelMapping()
+        return mapping.toTraxelToUniqueId(), mapping.toUuidToTraxelMap()
 
     def toTrackingGraph(self, noFeatures=False):
         '''
@@ -503,7 +517,8 @@ class HypothesesGraph(object):
                     raise ValueError('Cannot use graph links without source, target, and features, run insertEnergies() first')
             return result
 
-        traxelIdPerTimestepToUniqueIdMap, _ = self.getMappingsBetweenUUIDsAndTraxels()
+        uuidTraxelMapping = self.getUuidTraxelMapping()
+        traxelIdPerTimestepToUniqueIdMap = uuidTraxelMapping.toTraxelToUniqueId()
         model = {
             'segmentationHypotheses':[translateNodeToDict(n) for n in self._graph.nodes_iter()],
             'linkingHypotheses':[translateLinkToDict(e) for e in self._graph.edges_iter()],
@@ -530,8 +545,8 @@ class HypothesesGraph(object):
                 if self.withTracklets:
                     getLogger().error("Exclusion constraints do not work with tracklets yet!")
                 
-                conflictingIds = [traxelIdPerTimestepToUniqueIdMap[str(traxel.Timestep)][str(i)] for i in traxel.conflictingTraxelIds]
-                myId = traxelIdPerTimestepToUniqueIdMap[str(traxel.Timestep)][str(traxel.Id)]
+                conflictingIds = [uuidTraxelMapping.getUuid(traxel.Timestep, i) for i in traxel.conflictingTraxelIds]
+                myId = uuidTraxelMapping.getUuid(traxel.Timestep, traxel.Id)
                 for ci in conflictingIds:
                     # insert pairwise exclusion constraints only, and always put the lower id first
                     if ci < myId:
@@ -541,9 +556,9 @@ class HypothesesGraph(object):
 
         model['exclusions'] = [list(t) for t in exclusions]
 
-        # TODO: this recomputes the uuidToTraxelMap even though we have it already...
         trackingGraph = hytra.core.jsongraph.JsonTrackingGraph(
             model=model,
+            uuidTraxelMapping=uuidTraxelMapping,
             progressVisitor=self.progressVisitor
         )
         return trackingGraph
@@ -555,7 +570,7 @@ class HypothesesGraph(object):
         Additionally a division indicator is saved in the node property "divisionValue".
         The link also gets a new attribute: the gap that is covered. E.g. 1, if consecutive timeframes, 2 if link skipping one timeframe.
         '''
-        _, uuidToTraxelMap = self.getMappingsBetweenUUIDsAndTraxels()
+        uuidToTraxelMap = self.getUuidTraxelMapping()
 
         if self.withTracklets:
             traxelgraph = self.referenceTraxelGraph
@@ -1,10 +1,10 @@
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
 import os
-import numpy as np
 import logging
 import hytra.core.mergerresolver
 from hytra.core.probabilitygenerator import Traxel
 import hytra.core.probabilitygenerator
+from hytra.util.labelimageindex import LabelImageIndexCache
 
 def getLogger():
     ''' logger to be used in this module '''
@@ -15,34 +15,59 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
     Specialization of merger resolving to work with the hypotheses graph given by ilastik,
     and to read/write images from/to the input/output slots of the respective operators. 
     '''
-    def __init__(self, hypothesesGraph, pluginPaths=[os.path.abspath('../hytra/plugins')], withFullGraph=False, numSplits=None, verbose=False):
-        super(IlastikMergerResolver, self).__init__(pluginPaths, numSplits, verbose)
+    def __init__(self,
+                 hypothesesGraph,
+                 pluginPaths=[os.path.abspath('../hytra/plugins')],
+                 withFullGraph=False,
+                 numSplits=None,
+                 verbose=False,
+                 useMultiprocessing=False,
+                 numWorkers=None,
+                 mergerResolverPluginName=None,
+                 timeRange=None,
+                 borderFits=None,
+                 solver='max-flow'):
+        '''
+        If a `timeRange=(first, last)` is given, only the mergers in the frames `first <= t < last` are resolved,
+        e.g. for newly appended frames. The `borderFits` of the run on the preceding frames (see `MergerResolver.borderFits`)
+        are then used as initializations for the mergers in the first frame.
+        '''
+        super(IlastikMergerResolver, self).__init__(pluginPaths,
+                                                    numSplits,
+                                                    verbose,
+                                                    useMultiprocessing=useMultiprocessing,
+                                                    numWorkers=numWorkers,
+                                                    mergerResolverPluginName=mergerResolverPluginName,
+                                                    solver=solver)
         trackingGraph = hypothesesGraph.toTrackingGraph(noFeatures=True)
         self.model = trackingGraph.model
+        self.uuidTraxelMapping = trackingGraph.uuidToTraxelMap
         self.result = hypothesesGraph.getSolutionDictionary()
         self.hypothesesGraph = hypothesesGraph
+        # getCoordinatesForObjectId is called once per object, so we index each label image only once
+        self.labelImageIndexCache = LabelImageIndexCache()
+        # fitAndRefineNodesForTimestep is called once per frame, so the worker processes are started only once
+        self._fittingExecutor = None
         
         # Find mergers in the given model and result
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(self.model)
+        uuidToTraxelMap = self._getUuidTraxelMapping()
         # there might be empty frames. We want them as output too.
-        timesteps = [str(t) for t in range(int(min(traxelIdPerTimestepToUniqueIdMap.keys())), max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1)]
+        timesteps = [str(t) for t in range(min(uuidToTraxelMap.timesteps()), max(uuidToTraxelMap.timesteps()) + 1)]
+        self.timeRange = timeRange
+        if borderFits is not None:
+            self.borderFits = borderFits
 
-        mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(self.result, uuidToTraxelMap)
+        self.resultIndex = hytra.core.jsongraph.ResultIndex(self.result, uuidToTraxelMap, timesteps, mergerTimeRange=timeRange)
         
-        self.mergerNum = len(mergers)
+        self.mergerNum = self.resultIndex.numMergers
         
         # Check that graph contains mergers
         if self.mergerNum > 0:
-            self.mergersPerTimestep = hytra.core.jsongraph.getMergersPerTimestep(mergers, timesteps)
-            self.detectionsPerTimestep = hytra.core.jsongraph.getDetectionsPerTimestep(detections, timesteps)
-            
-            linksPerTimestep = hytra.core.jsongraph.getLinksPerTimestep(links, timesteps)
-            divisionsPerTimestep = hytra.core.jsongraph.getDivisionsPerTimestep(divisions, linksPerTimestep, timesteps)
-            mergerLinks = hytra.core.jsongraph.getMergerLinks(linksPerTimestep, self.mergersPerTimestep, timesteps)
-    
             # Build graph of the unresolved (merger) nodes and their direct neighbors
-            self._createUnresolvedGraph(divisionsPerTimestep, self.mergersPerTimestep, mergerLinks, withFullGraph)
+            self._createUnresolvedGraph(self.resultIndex, withFullGraph)
             self._prepareResolvedGraph()
+            if timeRange is not None:
+                self._insertBorderFits(timeRange[0])
 
     def run(self, transition_classifier_filename=None, transition_classifier_path=None):
         """
@@ -51,18 +76,28 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
 
         1. Compute object features
         2. Run min-cost max-flow tracking to find the fate of all the de-merged objects
-        3. Export refined segmentation, update member variables `model` and `result`
-        4. Compute merger dictionary
+        3. Compute merger dictionary
+        4. Export refined segmentation, update member variables `model` and `result`
 
         **Returns** a nested dictionary, indexed first by time, then object Id, containing a list of new segmentIDs per merger
         """
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(self.model)
+        # all frames were fitted by now, so the worker processes are not needed anymore
+        self._shutdownFittingExecutor()
+
+        traxelIdPerTimestepToUniqueIdMap = self.model['traxelToUniqueId']
+        uuidToTraxelMap = self._getUuidTraxelMapping()
         # there might be empty frames. We want them as output too.
-        timesteps = [str(t) for t in range(int(min(traxelIdPerTimestepToUniqueIdMap.keys())), max([int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1)]
+        timesteps = [str(t) for t in range(min(uuidToTraxelMap.timesteps()), max(uuidToTraxelMap.timesteps()) + 1)]
                 
         # compute new object features
         objectFeatures = self._computeObjectFeatures(timesteps)
 
+        # keep the fits of the last frame as initializations for a run on the frames that are appended next
+        if self.timeRange is not None:
+            self._storeBorderFits(self.timeRange[1] - 1)
+        else:
+            self._storeBorderFits(int(timesteps[-1]))
+
         # load transition classifier if any
         if transition_classifier_filename is not None:
             getLogger().info("\tLoading transition classifier")
@@ -86,7 +121,7 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         def mergerNodeFilter(jsonNode):
             uuid = int(jsonNode['id'])
             traxels = uuidToTraxelMap[uuid]
-            return not any(t[1] in self.mergersPerTimestep[str(t[0])] for t in traxels)
+            return not any(self.resultIndex.isMerger(t[0], t[1]) for t in traxels)
 
         def mergerLinkFilter(jsonLink):
             srcUuid = int(jsonLink['src'])
@@ -94,13 +129,22 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
             srcTraxels = uuidToTraxelMap[srcUuid]
             destTraxels = uuidToTraxelMap[destUuid]
             # return True if there was no traxel in either source or target node that was a merger.
-            return not (any(t[1] in self.mergersPerTimestep[str(t[0])] for t in srcTraxels) or any(t[1] in self.mergersPerTimestep[str(t[0])] for t in destTraxels))
+            return not (any(self.resultIndex.isMerger(t[0], t[1]) for t in srcTraxels) or any(self.resultIndex.isMerger(t[0], t[1]) for t in destTraxels))
 
         self.model = self._refineModel(uuidToTraxelMap,
                                        traxelIdPerTimestepToUniqueIdMap,
                                        mergerNodeFilter,
                                        mergerLinkFilter)
 
+        # dictionary telling about which mergers were resolved into what. Collect it before the result is refined,
+        # because that removes the mergers from the hypotheses graph, which the unresolved graph might be an overlay of
+        mergerDict = {}
+        for node in self._getResolvedMergers():
+            # Save merger node info in merger dict (fits and new IDs used from within Ilastik)
+            time = node[0]
+            idx = node[1]
+            mergerDict.setdefault(time, {})[idx] = self.unresolvedGraph.node[node]
+
         # 2.) new result = union(old result, resolved mergers) - old mergers
         self.result = self._refineResult(nodeFlowMap,
                                          arcFlowMap,
@@ -108,18 +152,6 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
                                          mergerNodeFilter,
                                          mergerLinkFilter)
 
-        # return a dictionary telling about which mergers were resolved into what
-        mergerDict = {}
-        for node in self.unresolvedGraph.nodes_iter():
-            # skip non-mergers
-            if not 'newIds' in self.unresolvedGraph.node[node] or len(self.unresolvedGraph.node[node]['newIds']) < 2:
-                continue
-            
-            # Save merger node info in merger dict (fits and new IDs used from within Ilastik)
-            time = node[0]
-            idx = node[1]
-            mergerDict.setdefault(time, {})[idx] = self.unresolvedGraph.node[node]
-
         return mergerDict
  
     def getCoordinatesForObjectId(self, coordinatesForObjectIds, labelImage, timestep, objectId):
@@ -144,7 +176,13 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         
         # Compute coordinate for object ID
         if mergerIsPresent:
-            coordinatesForObjectIds[objectId] = np.transpose(np.vstack(np.where(labelImage == objectId)))
+            # the label image of a timestep does not change while resolving, but ilastik may pass a copy per object,
+            # so we only index it once per timestep and drop the index when the next timestep is processed
+            if timestep not in self.labelImageIndexCache:
+                self.labelImageIndexCache.invalidate()
+                self.labelImageIndexCache.getIndex(timestep, labelImage)
+            labelImageIndex = self.labelImageIndexCache.getIndex(timestep)
+            coordinatesForObjectIds[objectId] = labelImageIndex.coordinates(objectId)
  
     def fitAndRefineNodesForTimestep(self, coordinatesForObjectIds, maxObjectId, timestep):
         '''
@@ -153,16 +191,18 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
  
         Uses the mergerResolver plugin to update the segmentations in the labelImages.
          
-        This function is used by Ilastik to fit and refine nodes per frame instead of
-        loading the full volume in _fitAndRefineNodes()
+        This function is used by Ilastik to fit and refine nodes per frame, with the pixel coordinates of the objects
+        given by `getCoordinatesForObjectId`, instead of reading the label images in the streaming pass of `run`.
         '''
  
         # use image provider plugin to load labelimage
         nextObjectId = maxObjectId + 1
  
-        t = str(timestep)
-        detections = self.detectionsPerTimestep[t]
+        mergers = self.resultIndex.mergers(timestep)
  
+        nodes = []
+        counts = []
+        fittingJobs = []
         for idx, coordinates in coordinatesForObjectIds.items():            
             node = (timestep, idx)
             if node not in self.resolvedGraph:
@@ -172,45 +212,43 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
             count = 1
             initializations = []
             
-            if idx in self.mergersPerTimestep[t]:
-                count = self.mergersPerTimestep[t][idx]
+            if idx in mergers:
+                count = mergers[idx]
                 
+                # predecessors before the time range of this run may not have fits
                 for predecessor, _ in self.unresolvedGraph.in_edges(node):
-                    initializations.extend(self.unresolvedGraph.node[predecessor]['fits'])
+                    initializations.extend(self.unresolvedGraph.node[predecessor].get('fits', []))
                 # TODO: what shall we do if e.g. a 2-merger and a single object merge to 2 + 1,
                 # so there are 3 initializations for the 2-merger, and two initializations for the 1 merger?
                 # What does pgmlink do in that case?
                 
-            getLogger().debug("Looking at node {} in timestep {} with count {}".format(idx, t, count))         
+            getLogger().debug("Looking at node {} in timestep {} with count {}".format(idx, timestep, count))         
  
-            # use merger resolving plugin to fit `count` objects
-            fittedObjects = list(self.mergerResolverPlugin.resolveMergerForCoords(coordinates, count, initializations))
-            
-            assert(len(fittedObjects) == count)
+            nodes.append(node)
+            counts.append(count)
+            fittingJobs.append((coordinates, count, initializations))
  
-            # split up node if count > 1, duplicate incoming and outgoing arcs
-            if count > 1:
-                for idx in range(nextObjectId, nextObjectId + count):
-                    newNode = (timestep, idx)
-                    self.resolvedGraph.add_node(newNode, division=False, count=1, origin=node)
+        # use merger resolving plugin to fit `count` objects, in parallel if `useMultiprocessing` is set
+        fittedObjectsPerNode = self._fitObjects(self._getFittingExecutor(), fittingJobs)
  
-                    for e in self.unresolvedGraph.out_edges(node):
-                        self.resolvedGraph.add_edge(newNode, e[1])
-                    for e in self.unresolvedGraph.in_edges(node):
-                        if 'newIds' in self.unresolvedGraph.node[e[0]]:
-                            for newId in self.unresolvedGraph.node[e[0]]['newIds']:
-                                self.resolvedGraph.add_edge((e[0][0], newId), newNode)
-                        else:
-                            self.resolvedGraph.add_edge(e[0], newNode)
- 
-                self.resolvedGraph.remove_node(node)
-                self.unresolvedGraph.node[node]['newIds'] = range(nextObjectId, nextObjectId + count)
-                nextObjectId += count
- 
-            # each unresolved node stores its fitted shape(s) to be used
-            # as initialization in the next frame, this way division duplicates
-            # and de-merged nodes in the resolved graph do not need to store a fit as well
-            self.unresolvedGraph.node[node]['fits'] = fittedObjects
+        # split up nodes in the order in which they were given, so the new IDs are deterministic
+        for node, count, fittedObjects in zip(nodes, counts, fittedObjectsPerNode):
+            nextObjectId = self._refineNode(node, count, fittedObjects, nextObjectId)
+
+    def _getFittingExecutor(self):
+        '''
+        **returns** the executor used by `fitAndRefineNodesForTimestep`, which is created on first use
+        and kept for all frames until `run` is called
+        '''
+        if self._fittingExecutor is None:
+            self._fittingExecutor = self._createFittingExecutor()
+        return self._fittingExecutor
+
+    def _shutdownFittingExecutor(self):
+        ''' stop the worker processes of the executor used by `fitAndRefineNodesForTimestep`, if any '''
+        if self._fittingExecutor is not None:
+            self._fittingExecutor.shutdown()
+            self._fittingExecutor = None
 
     def _computeObjectFeatures(self, timesteps):
         '''
@@ -240,6 +278,13 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
 
         return objectFeatures
     
+    def _getResolvedMergers(self):
+        """
+        **returns** a list of all nodes of the unresolved graph that were split into at least two objects
+        """
+        return [n for n in self.unresolvedGraph.nodes_iter()
+                if 'newIds' in self.unresolvedGraph.node[n] and len(self.unresolvedGraph.node[n]['newIds']) >= 2]
+
     def _fitToRegionCenter(self, fit):
         """
         Extract the region center from a GMM fit
@@ -271,15 +316,16 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
         This also stores the new solution (`value` property) in the new nodes and links
         """
         
+        # the unresolved and resolved graph might be overlays of the hypotheses graph (see `withFullGraph`),
+        # so we collect the mergers and links before modifying the hypotheses graph
+        resolvedMergers = [(n, self.unresolvedGraph.node[n]) for n in self._getResolvedMergers()]
+        resolvedEdges = list(self.resolvedGraph.edges_iter())
+
         # update nodes
-        for n in self.unresolvedGraph.nodes_iter():
-            # skip non-mergers
-            if not 'newIds' in self.unresolvedGraph.node[n] or len(self.unresolvedGraph.node[n]['newIds']) < 2:
-                continue
-            
+        for n, attributes in resolvedMergers:
             # for this merger, insert all new nodes into the HG
-            assert(len(self.unresolvedGraph.node[n]['newIds']) == self.unresolvedGraph.node[n]['count'])
-            for newId, fit in zip(self.unresolvedGraph.node[n]['newIds'], self.unresolvedGraph.node[n]['fits']):
+            assert(len(attributes['newIds']) == attributes['count'])
+            for newId, fit in zip(attributes['newIds'], attributes['fits']):
                 traxel = Traxel()
                 traxel.Id = newId
                 traxel.Timestep = n[0]
@@ -291,7 +337,7 @@ class IlastikMergerResolver(hytra.core.mergerresolver.MergerResolver):
             self.hypothesesGraph._graph.remove_node(n)
 
         # add new links only for merger nodes
-        for edge in self.resolvedGraph.edges_iter(): 
+        for edge in resolvedEdges:
             # Add new edges that are connected to new merger nodes
             if 'mergerValue' in self.hypothesesGraph._graph.node[edge[0]] or 'mergerValue' in self.hypothesesGraph._graph.node[edge[1]]:
                 srcId = self.resolvedGraph.node[edge[0]]['id']
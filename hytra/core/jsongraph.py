@@ -5,6 +5,7 @@ hypotheses graphs stored in our json (or python dictionary) format.
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
 import copy
 import logging
+import numbers
 import numpy as np
 try:
     import commentjson as json
@@ -30,6 +31,27 @@ def writeToFormattedJSON(filename, dictionary):
     with open(filename, 'w') as f:
         json.dump(dictionary, f, indent=4, separators=(',', ': '))
 
+def readFromFile(filename):
+    '''
+    Read a dictionary (model, weights or result) from a JSON file, or from our compact
+    HDF5 layout (see `hytra.core.binarygraph`) if the filename ends with `.h5` or `.hdf5`.
+    '''
+    import hytra.core.binarygraph
+    if hytra.core.binarygraph.isHDF5Filename(filename):
+        return hytra.core.binarygraph.readFromHDF5(filename)
+    return readFromJSON(filename)
+
+def writeToFile(filename, dictionary):
+    '''
+    Write a dictionary (model, weights or result) to formatted JSON, or to our compact
+    HDF5 layout (see `hytra.core.binarygraph`) if the filename ends with `.h5` or `.hdf5`.
+    '''
+    import hytra.core.binarygraph
+    if hytra.core.binarygraph.isHDF5Filename(filename):
+        hytra.core.binarygraph.writeToHDF5(filename, dictionary)
+    else:
+        writeToFormattedJSON(filename, dictionary)
+
 def getMappingsBetweenUUIDsAndTraxels(model):
     '''
     From a dictionary encoded model, load the "traxelToUniqueId" mapping,
@@ -53,6 +75,169 @@ def getMappingsBetweenUUIDsAndTraxels(model):
 
     return traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap
 
+class UuidTraxelMapping(object):
+    """
+    Mapping between the unique IDs (UUIDs) of the nodes in a tracking model and the traxels `(timestep, labelimageId)`
+    they represent, in both directions. Instead of nested dictionaries, it is backed by sorted integer arrays,
+    so both lookup directions take O(log n).
+
+    For convenience it behaves like the `uuidToTraxelMap` dictionary returned by `getMappingsBetweenUUIDsAndTraxels`:
+    `mapping[uuid]` gives the list of traxels of that UUID sorted by timestep, and `keys()`, `values()`, `items()`
+    work as expected. Use `toTraxelToUniqueId()` to obtain the `traxelToUniqueId` layout of our JSON models.
+    """
+
+    def __init__(self, timesteps, ids, uuids, allTimesteps=None):
+        """
+        Set up the mapping from three equally long sequences, such that traxel `(timesteps[i], ids[i])` belongs to `uuids[i]`.
+        `allTimesteps` can list further timesteps that should show up (empty) when converting back to `traxelToUniqueId`.
+        """
+        timesteps = np.asarray(timesteps, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        uuids = np.asarray(uuids, dtype=np.int64)
+        assert(timesteps.shape == ids.shape == uuids.shape)
+
+        # traxel -> uuid: sorted by the combined key (timestep, id)
+        order = np.lexsort((ids, timesteps))
+        self._timesteps = timesteps[order]
+        self._ids = ids[order]
+        self._uuids = uuids[order]
+        self._traxelKeys = self._traxelKey(self._timesteps, self._ids)
+
+        # uuid -> traxels: positions in the arrays above, sorted by uuid and then timestep
+        self._uuidOrder = np.lexsort((self._timesteps, self._uuids))
+        sortedUuids = self._uuids[self._uuidOrder]
+        self._uniqueUuids, self._uuidOffsets = np.unique(sortedUuids, return_index=True)
+        self._uuidOffsets = np.append(self._uuidOffsets, len(sortedUuids))
+
+        if allTimesteps is None:
+            allTimesteps = []
+        self._allTimesteps = sorted(set([int(t) for t in allTimesteps]) | set(self._timesteps.tolist()))
+
+    @staticmethod
+    def _traxelKey(timesteps, ids):
+        ''' combine timestep and label image id into one sortable integer key '''
+        return (np.asarray(timesteps, dtype=np.int64) << 32) + np.asarray(ids, dtype=np.int64)
+
+    @staticmethod
+    def fromTraxelToUniqueId(traxelIdPerTimestepToUniqueIdMap):
+        ''' create the mapping from a `traxelToUniqueId` dictionary `{str(timestep): {str(id): uuid}}` as stored in our models '''
+        timesteps = []
+        ids = []
+        uuids = []
+        for t, idMap in traxelIdPerTimestepToUniqueIdMap.items():
+            intT = int(t)
+            for i, uuid in idMap.items():
+                timesteps.append(intT)
+                ids.append(int(i))
+                uuids.append(uuid)
+        return UuidTraxelMapping(timesteps, ids, uuids, allTimesteps=[int(t) for t in traxelIdPerTimestepToUniqueIdMap.keys()])
+
+    @staticmethod
+    def fromModel(model):
+        ''' create the mapping from the `traxelToUniqueId` entry of a model dictionary '''
+        return UuidTraxelMapping.fromTraxelToUniqueId(model['traxelToUniqueId'])
+
+    @staticmethod
+    def fromUuidToTraxelMap(uuidToTraxelMap):
+        ''' create the mapping from a dictionary `{uuid: [(timestep, id), ...]}` '''
+        timesteps = []
+        ids = []
+        uuids = []
+        for uuid, traxels in uuidToTraxelMap.items():
+            for t, i in traxels:
+                timesteps.append(t)
+                ids.append(i)
+                uuids.append(uuid)
+        return UuidTraxelMapping(timesteps, ids, uuids)
+
+    def getUuid(self, timestep, objectId):
+        ''' **returns** the uuid of the traxel `(timestep, objectId)`, raises a `KeyError` if there is no such traxel '''
+        key = (int(timestep) << 32) + int(objectId)
+        pos = np.searchsorted(self._traxelKeys, key)
+        if pos == len(self._traxelKeys) or self._traxelKeys[pos] != key:
+            raise KeyError((timestep, objectId))
+        return int(self._uuids[pos])
+
+    def getUuids(self, timesteps, objectIds):
+        ''' vectorized version of `getUuid`, **returns** an array of uuids, or -1 where the traxel is unknown '''
+        keys = self._traxelKey(timesteps, objectIds)
+        if len(self._traxelKeys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._traxelKeys, keys), len(self._traxelKeys) - 1)
+        result = self._uuids[positions]
+        result[self._traxelKeys[positions] != keys] = -1
+        return result
+
+    def hasTraxel(self, timestep, objectId):
+        key = (int(timestep) << 32) + int(objectId)
+        pos = np.searchsorted(self._traxelKeys, key)
+        return pos < len(self._traxelKeys) and self._traxelKeys[pos] == key
+
+    def getTraxels(self, uuid):
+        ''' **returns** the list of traxels `(timestep, id)` represented by `uuid`, sorted by timestep '''
+        pos = np.searchsorted(self._uniqueUuids, uuid)
+        if pos == len(self._uniqueUuids) or self._uniqueUuids[pos] != uuid:
+            raise KeyError(uuid)
+        indices = self._uuidOrder[self._uuidOffsets[pos]:self._uuidOffsets[pos + 1]]
+        return list(zip(self._timesteps[indices].tolist(), self._ids[indices].tolist()))
+
+    def getFirstTraxels(self, uuids):
+        '''
+        Vectorized lookup of the first traxel (in time) of each of the given `uuids`.
+
+        **returns** a tuple of two arrays holding the timesteps and the label image ids of these traxels
+        '''
+        uuids = np.asarray(uuids, dtype=np.int64)
+        positions = np.searchsorted(self._uniqueUuids, uuids)
+        if np.any(positions == len(self._uniqueUuids)) or np.any(self._uniqueUuids[positions] != uuids):
+            raise KeyError("Not all uuids are contained in this mapping")
+        indices = self._uuidOrder[self._uuidOffsets[positions]]
+        return self._timesteps[indices], self._ids[indices]
+
+    def numTraxels(self):
+        return len(self._traxelKeys)
+
+    def maxUuid(self):
+        return int(self._uniqueUuids[-1])
+
+    def timesteps(self):
+        ''' **returns** the sorted list of all timesteps known to this mapping '''
+        return self._allTimesteps
+
+    # dictionary-like access uuid -> list of traxels, as the `uuidToTraxelMap`
+    def __getitem__(self, uuid):
+        return self.getTraxels(uuid)
+
+    def __contains__(self, uuid):
+        pos = np.searchsorted(self._uniqueUuids, uuid)
+        return pos < len(self._uniqueUuids) and self._uniqueUuids[pos] == uuid
+
+    def __len__(self):
+        return len(self._uniqueUuids)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self._uniqueUuids.tolist()
+
+    def values(self):
+        return [self.getTraxels(uuid) for uuid in self._uniqueUuids]
+
+    def items(self):
+        return [(uuid, self.getTraxels(uuid)) for uuid in self._uniqueUuids.tolist()]
+
+    def toUuidToTraxelMap(self):
+        ''' **returns** the mapping as dictionary `{int(uuid): [(int(timestep), int(id)), ...]}` '''
+        return dict(self.items())
+
+    def toTraxelToUniqueId(self):
+        ''' **returns** the mapping in the layout used for `traxelToUniqueId` in our models: `{str(timestep): {str(id): int(uuid)}}` '''
+        traxelIdPerTimestepToUniqueIdMap = dict((str(t), {}) for t in self._allTimesteps)
+        for t, i, uuid in zip(self._timesteps.tolist(), self._ids.tolist(), self._uuids.tolist()):
+            traxelIdPerTimestepToUniqueIdMap[str(t)][str(i)] = uuid
+        return traxelIdPerTimestepToUniqueIdMap
+
 def getMergersDetectionsLinksDivisions(result, uuidToTraxelMap):
     # load results and map indices
     mergers = [timestepIdTuple + (entry['value'],) for entry in result['detectionResults'] if entry['value'] > 1 for timestepIdTuple in uuidToTraxelMap[int(entry['id'])]]
@@ -159,21 +344,153 @@ def getMergerLinks(linksPerTimestep, mergersPerTimestep, timesteps):
 def getDivisionsPerTimestep(divisions, linksPerTimestep, timesteps):
     ''' returns divisionsPerTimestep = { "<timestep>": {<parentIdx>: [<childIdx>, <childIdx>], ...}, "<timestep>": {...}, ... } '''
     if divisions is not None:
+        # group the dividing mother cells by the timestep of their children
+        parentsPerTimestep = {}
+        for div_timestep, div_idx in divisions:
+            parentsPerTimestep.setdefault(div_timestep + 1, []).append(div_idx)
+
         # find children of divisions by looking for the active links
         divisionsPerTimestep = {}
         for t in timesteps:
             divisionsPerTimestep[t] = {}
-            for div_timestep, div_idx in divisions:
-                if div_timestep == int(t) - 1:
-                    # we have an active division of the mother cell "div_idx" in the previous frame
-                    children = [b for a,b in linksPerTimestep[t] if a == div_idx]
-                    assert len(children) == 2, "Expected two children of {}, but found {}".format((div_timestep, div_idx), children)
-                    divisionsPerTimestep[t][div_idx] = children
+            if int(t) not in parentsPerTimestep:
+                continue
+            parents = parentsPerTimestep[int(t)]
+            parentSet = set(parents)
+            childrenPerParent = {}
+            for a, b in linksPerTimestep[t]:
+                if a in parentSet:
+                    childrenPerParent.setdefault(a, []).append(b)
+            for div_idx in parents:
+                # we have an active division of the mother cell "div_idx" in the previous frame
+                children = childrenPerParent.get(div_idx, [])
+                assert len(children) == 2, "Expected two children of {}, but found {}".format((int(t) - 1, div_idx), children)
+                divisionsPerTimestep[t][div_idx] = children
     else:
         divisionsPerTimestep = dict([(t,{}) for t in timesteps])
 
     return divisionsPerTimestep
 
+class ResultIndex(object):
+    """
+    Indexed view of a tracking result, decomposed per timestep. In contrast to the `get*PerTimestep` functions above,
+    everything is keyed by integer timesteps, the active links are kept in one array sorted by (timestep, source id),
+    and the children of all dividing cells are looked up once during construction.
+
+    Links are stored at the timestep of their target, as pairs of (id at t-1, id at t). Divisions are stored at
+    the timestep of the dividing parent.
+    """
+
+    def __init__(self, result, uuidToTraxelMap, timesteps=None, mergerTimeRange=None):
+        """
+        Build the index from a `result` dictionary and the `uuidToTraxelMap` of the corresponding model.
+        If no `timesteps` are given, all frames between the first and last one of the model are used.
+
+        If a `mergerTimeRange=(first, last)` is given, only mergers with `first <= t < last` are considered.
+        """
+        mergers, detections, links, divisions = getMergersDetectionsLinksDivisions(result, uuidToTraxelMap)
+        if mergerTimeRange is not None:
+            mergers = [m for m in mergers if mergerTimeRange[0] <= m[0] < mergerTimeRange[1]]
+
+        if timesteps is None:
+            allTimesteps = [t for traxels in uuidToTraxelMap.values() for t, _ in traxels]
+            if len(allTimesteps) > 0:
+                timesteps = range(min(allTimesteps), max(allTimesteps) + 1)
+            else:
+                timesteps = []
+        self.timesteps = sorted([int(t) for t in timesteps])
+
+        self.numMergers = len(mergers)
+        self._mergers = {}
+        for t, idx, count in mergers:
+            self._mergers.setdefault(t, {})[idx] = count
+
+        self._detections = {}
+        for t, idx in detections:
+            self._detections.setdefault(t, []).append(idx)
+
+        # link table with columns (timestep of target, source id, target id), sorted by timestep and source
+        if len(links) > 0:
+            linkTable = np.array([(b[0], a[1], b[1]) for a, b in links], dtype=np.int64)
+            order = np.lexsort((linkTable[:, 1], linkTable[:, 0]))
+            linkTable = linkTable[order]
+        else:
+            linkTable = np.zeros((0, 3), dtype=np.int64)
+        self._linkTimesteps = linkTable[:, 0]
+        self._linkSources = linkTable[:, 1]
+        self._linkTargets = linkTable[:, 2]
+
+        # map from dividing parent (t, id) to its children at t+1
+        self.hasDivisions = divisions is not None
+        self._children = {}
+        self._divisions = {}
+        if divisions is not None:
+            for t, idx in divisions:
+                children = self.linkTargets(t + 1, idx)
+                assert len(children) == 2, "Expected two children of {}, but found {}".format((t, idx), children)
+                self._children[(t, idx)] = children
+                self._divisions.setdefault(t, {})[idx] = children
+
+    def _linkRange(self, t):
+        ''' **returns** the start and stop index of all links in the table that end at timestep `t` '''
+        start = np.searchsorted(self._linkTimesteps, t, side='left')
+        stop = np.searchsorted(self._linkTimesteps, t, side='right')
+        return start, stop
+
+    def mergers(self, t):
+        ''' **returns** a dictionary `{id: count}` of all mergers in timestep `t` '''
+        return self._mergers.get(int(t), {})
+
+    def isMerger(self, t, idx):
+        return idx in self._mergers.get(int(t), {})
+
+    def detections(self, t):
+        ''' **returns** a list of the ids of all active detections in timestep `t` '''
+        return self._detections.get(int(t), [])
+
+    def linkArray(self, t):
+        ''' **returns** a `Nx2` array of all active links `(id at t-1, id at t)` that end at timestep `t` '''
+        start, stop = self._linkRange(int(t))
+        return np.column_stack((self._linkSources[start:stop], self._linkTargets[start:stop]))
+
+    def links(self, t):
+        ''' **returns** a list of all active links `(id at t-1, id at t)` that end at timestep `t` '''
+        start, stop = self._linkRange(int(t))
+        return list(zip(self._linkSources[start:stop].tolist(), self._linkTargets[start:stop].tolist()))
+
+    def linkTargets(self, t, source):
+        ''' **returns** a list of the ids at timestep `t` of all objects that are linked to `source` at `t-1` '''
+        start, stop = self._linkRange(int(t))
+        sources = self._linkSources[start:stop]
+        first = start + np.searchsorted(sources, source, side='left')
+        last = start + np.searchsorted(sources, source, side='right')
+        return self._linkTargets[first:last].tolist()
+
+    def divisions(self, t):
+        ''' **returns** a dictionary `{parentId: [childId, childId]}` of all cells dividing in timestep `t` '''
+        return self._divisions.get(int(t), {})
+
+    def isDividing(self, t, idx):
+        return (int(t), idx) in self._children
+
+    def children(self, t, idx):
+        ''' **returns** the ids of the two children at `t+1` of the dividing cell `(t, idx)` '''
+        return self._children[(int(t), idx)]
+
+    def mergerLinks(self):
+        """
+        **returns** all active links where at least one of the two incident nodes is a merger,
+        as a list of tuples `(t, (sourceIdAtTMinus1, destIdAtT))`
+        """
+        mergerLinks = []
+        for t in self.timesteps:
+            if t not in self._mergers and t - 1 not in self._mergers:
+                continue
+            previousMergers = self.mergers(t - 1)
+            currentMergers = self.mergers(t)
+            mergerLinks.extend([(t, (a, b)) for a, b in self.links(t) if a in previousMergers or b in currentMergers])
+        return mergerLinks
+
 def negLog(features):
     ''' compute the (clamped) negative log of every entry in the list/array '''
     fa = np.array(features)
@@ -226,6 +543,76 @@ def convexify(listOfNumbers, eps):
         getLogger().warning("Failed convexifying {}".format(features))
     return listify(features.flatten())
 
+def _convexifyMatrix(features, eps):
+    '''
+    Convexify every row of the given matrix in place, performing exactly the same arithmetic as `convexify`
+    does for a single vector, but stepping through the states of all rows at once.
+    '''
+    numRows, numStates = features.shape
+    bestStates = np.argmin(features, axis=1)
+    rows = np.arange(numRows)
+
+    for direction in [-1, 1]:
+        previousGradients = np.zeros(numRows)
+        if direction == 1:
+            positions = range(1, numStates)
+        else:
+            positions = range(numStates - 2, -1, -1)
+
+        for pos in positions:
+            # only rows whose best state lies on the other side of pos have reached this position
+            if direction == 1:
+                active = rows[bestStates < pos]
+            else:
+                active = rows[bestStates > pos]
+            if len(active) == 0:
+                continue
+
+            previous = features[active, pos - direction]
+            newGradients = features[active, pos] - previous
+            oldGradients = previousGradients[active]
+            # cost function's derivative is roughly constant or got too flat: continue with old slope + epsilon
+            tooFlat = (np.abs(newGradients - oldGradients) < eps) | (newGradients < oldGradients)
+            oldGradients[tooFlat] += eps
+            features[active[tooFlat], pos] = previous[tooFlat] + oldGradients[tooFlat]
+            oldGradients[~tooFlat] = newGradients[~tooFlat]
+            previousGradients[active] = oldGradients
+
+    # same check as checkForConvexity, for all rows at once
+    gradients = features[:, 1:] - features[:, :-1]
+    convex = np.all(gradients[:, 1:] > gradients[:, :-1], axis=1)
+    for row in np.flatnonzero(~convex):
+        getLogger().warning("Failed convexifying {}".format(features[row].reshape(-1, 1)))
+
+def convexifyBatch(listOfFeatureVectors, eps):
+    '''
+    Convexify many cost vectors (each in the listified format `[[c0], [c1], ...]`) at once.
+
+    All vectors of the same length and number type are stacked into a matrix and convexified together,
+    which yields exactly the same values as calling `convexify` on each vector separately.
+    Vectors that cannot be stacked (e.g. because they contain more than one feature per state)
+    are passed on to `convexify` individually.
+
+    **returns** a list containing the convexified version of each vector
+    '''
+    results = [None] * len(listOfFeatureVectors)
+    groups = {}
+    for i, vector in enumerate(listOfFeatureVectors):
+        if len(vector) == 0 or any(len(state) != 1 for state in vector) \
+                or all(isinstance(state[0], numbers.Integral) for state in vector):
+            # ragged, empty or integer valued vectors (which np.array would not turn into floats)
+            # are handled by `convexify` as before
+            results[i] = convexify(vector, eps)
+            continue
+        groups.setdefault(len(vector), []).append(i)
+
+    for indices in groups.values():
+        features = np.array([delistify(listOfFeatureVectors[i]) for i in indices], dtype=np.float64)
+        _convexifyMatrix(features, eps)
+        for row, i in enumerate(indices):
+            results[i] = listify(features[row])
+    return results
+
 # ----------------------------------------------------------------------------
 # helper class for graph-dictionaries
 
@@ -242,7 +629,12 @@ class JsonTrackingGraph(object):
                  model_filename=None, 
                  weights_filename=None, 
                  result_filename=None,
-                 progressVisitor=DefaultProgressVisitor()):
+                 progressVisitor=DefaultProgressVisitor(),
+                 uuidTraxelMapping=None):
+        '''
+        If the `UuidTraxelMapping` of the given `model` is already known, it can be passed in as `uuidTraxelMapping`
+        so that it does not need to be recomputed.
+        '''
         
         assert(weights is None or weights_filename is None)
         assert(model is None or model_filename is None)
@@ -276,22 +668,28 @@ class JsonTrackingGraph(object):
         # load from file if specified
         if model_filename is not None:
             getLogger().debug("Loading model file: " + model_filename)
-            self.model = readFromJSON(model_filename)
+            self.model = readFromFile(model_filename)
 
         if weights_filename is not None:
             getLogger().debug("Loading weights file: " + weights_filename)
-            self.weights = readFromJSON(weights_filename)
+            self.weights = readFromFile(weights_filename)
 
         if result_filename is not None:
             getLogger().debug("Loading result file: " + result_filename)
-            self.result = readFromJSON(result_filename)
+            self.result = readFromFile(result_filename)
 
         # further initializations
         if model is not None or model_filename is not None:
-            self.traxelIdPerTimestepToUniqueIdMap, self.uuidToTraxelMap = \
-                getMappingsBetweenUUIDsAndTraxels(self.model)
+            self.traxelIdPerTimestepToUniqueIdMap = self.model['traxelToUniqueId']
+            if uuidTraxelMapping is None:
+                uuidTraxelMapping = UuidTraxelMapping.fromModel(self.model)
+            # the mapping behaves like the dictionary `{uuid: [(timestep, id), ...]}`
+            self.uuidToTraxelMap = uuidTraxelMapping
         
+        # new hypotheses must not reuse the uuids of a loaded model
         self._nextUuid = 0
+        if len(self.model['segmentationHypotheses']) > 0:
+            self._nextUuid = max(int(d['id']) for d in self.model['segmentationHypotheses']) + 1
 
         self.progressVisitor = progressVisitor
 
@@ -311,6 +709,11 @@ class JsonTrackingGraph(object):
         '''
         assert(listOfTraxels is not None and len(listOfTraxels) > 0)
 
+        # The mapping of a loaded model is an immutable UuidTraxelMapping,
+        # while adding hypotheses we fall back to the dictionary it was built from
+        if isinstance(self.uuidToTraxelMap, UuidTraxelMapping):
+            self.uuidToTraxelMap = self.uuidToTraxelMap.toUuidToTraxelMap()
+
         # store mapping of all contained traxels to this detection uuid
         self.uuidToTraxelMap[self._nextUuid] = []
         for t in listOfTraxels:
@@ -385,6 +788,35 @@ class JsonTrackingGraph(object):
 
         self.model['linkingHypotheses'].append(link)
 
+    def addDetectionHypothesesBatch(self, listOfFeatures, **kwargs):
+        '''
+        Add many detections at once, equivalent to calling `addDetectionHypotheses` for each entry of `listOfFeatures`.
+        Every keyword argument must be a list with one value per detection, `None` values are skipped.
+
+        **Returns:** the list of unique IDs of the newly created nodes
+        '''
+        for k, values in kwargs.items():
+            assert(len(values) == len(listOfFeatures))
+        uuids = list(range(self._nextUuid, self._nextUuid + len(listOfFeatures)))
+
+        detections = [{'id': uuid, 'features': features} for uuid, features in zip(uuids, listOfFeatures)]
+        for k, values in kwargs.items():
+            for detection, v in zip(detections, values):
+                if v is not None:
+                    detection[k] = v
+
+        self.model['segmentationHypotheses'].extend(detections)
+        self._nextUuid += len(detections)
+        return uuids
+
+    def addLinkingHypothesesBatch(self, srcUuids, destUuids, listOfFeatures):
+        '''
+        Add many links at once, equivalent to calling `addLinkingHypotheses` for each triple of the given lists
+        '''
+        assert(len(srcUuids) == len(destUuids) == len(listOfFeatures))
+        self.model['linkingHypotheses'].extend({'src': src, 'dest': dest, 'features': features}
+                                               for src, dest, features in zip(srcUuids, destUuids, listOfFeatures))
+
     def getNumDetections(self):
         return len(self.model['segmentationHypotheses'])
 
@@ -418,6 +850,33 @@ class JsonTrackingGraph(object):
             divisionHypotheses = []
 
         self.progressVisitor.showState("Convexify costs")
+        # gather all cost vectors, such that those of equal length can be convexified together
+        featureLocations = []
+        for seg in segmentationHypotheses:
+            for f in ['features', 'appearanceFeatures', 'disappearanceFeatures']:
+                if f in seg:
+                    featureLocations.append((seg, f))
+            # division features are always convex (2 values defines just a line)
+        featureLocations.extend([(link, 'features') for link in linkingHypotheses])
+        featureLocations.extend([(division, 'features') for division in divisionHypotheses])
+        self.progressVisitor.showProgress(0.5)
+
+        try:
+            convexified = convexifyBatch([d[f] for d, f in featureLocations], epsilon)
+        except:
+            # run element by element to find out which hypothesis causes trouble
+            self._convexifyCostsElementwise(segmentationHypotheses, linkingHypotheses, divisionHypotheses, epsilon)
+            return
+
+        for (d, f), features in zip(featureLocations, convexified):
+            d[f] = features
+        self.progressVisitor.showProgress(1.0)
+
+    def _convexifyCostsElementwise(self, segmentationHypotheses, linkingHypotheses, divisionHypotheses, epsilon):
+        '''
+        Convexify the cost vectors one by one, which is much slower than `convexifyBatch`
+        but reports the hypothesis whose costs could not be convexified.
+        '''
         numElements = len(segmentationHypotheses) + len(linkingHypotheses) + len(divisionHypotheses)
         countElements = 0
         for seg in segmentationHypotheses:
@@ -442,44 +901,100 @@ class JsonTrackingGraph(object):
             self.progressVisitor.showProgress(countElements/float(numElements))
             division['features'] = convexify(division['features'], epsilon)
 
-    def toHypothesesGraph(self):
+    def toHypothesesGraph(self, withEnergies=False):
         '''
         From a json graph representation (and possibly a json result), 
         set up a hypotheses graph with the respective links.
 
-        WARNING: only builds the structure of the graph at the moment, 
-                 features/probabilities are not inserted!
+        All nodes and links are collected first and then inserted into the networkx graph in one go.
+        If a result is present, its values are inserted the same way `HypothesesGraph.insertSolution` would do it.
+
+        If `withEnergies` is `True`, the energies (`features`, `appearanceFeatures`, ...) of all detections and links
+        are copied to the hypotheses graph as well, otherwise only the structure and the solution values are inserted.
+
         WARNING: builds the trackletgraph, not the full graph!
         '''
         from hytra.core.hypothesesgraph import HypothesesGraph
         from hytra.core.probabilitygenerator import Traxel
 
-        # set up graph
-        hypothesesGraph = HypothesesGraph()
-        for s in self.model['segmentationHypotheses']:
-            tracklet = self.uuidToTraxelMap[s['id']]
-            assert(len(tracklet) > 0)
+        if isinstance(self.uuidToTraxelMap, UuidTraxelMapping):
+            mapping = self.uuidToTraxelMap
+        else:
+            mapping = UuidTraxelMapping.fromUuidToTraxelMap(self.uuidToTraxelMap)
+
+        segmentationHypotheses = self.model['segmentationHypotheses']
+        uuids = [s['id'] for s in segmentationHypotheses]
+        firstTimesteps, firstIds = mapping.getFirstTraxels(uuids)
+        firstTimesteps = firstTimesteps.tolist()
+        firstIds = firstIds.tolist()
+        # if every uuid represents exactly one traxel, we don't need to look up the tracklets one by one
+        singleTraxels = mapping.numTraxels() == len(mapping)
+
+        # solution values, indexed by uuid
+        detectionValues = {}
+        divisionValues = {}
+        linkValues = {}
+        if self.result is not None:
+            detectionValues = dict((d['id'], d['value']) for d in self.result['detectionResults'])
+            if 'divisionResults' in self.result and self.result['divisionResults'] is not None:
+                divisionValues = dict((d['id'], d['value']) for d in self.result['divisionResults'])
+            if 'linkingResults' in self.result and self.result['linkingResults'] is not None:
+                linkValues = dict(((l['src'], l['dest']), l['value']) for l in self.result['linkingResults'])
+
+        nodeEnergyKeys = ['features', 'appearanceFeatures', 'disappearanceFeatures', 'divisionFeatures', 'timestep']
+        uuidToNode = {}
+        nodes = []
+        for s, timestep, objectId in zip(segmentationHypotheses, firstTimesteps, firstIds):
             traxel = Traxel()
-            traxel.Timestep = tracklet[0][0]
-            traxel.Id = tracklet[0][1]
-            hypothesesGraph.addNodeFromTraxel(traxel, tracklet=tracklet)
-            # adding nodes automatically assigns UUIDs, we replace them by the loaded one
-            hypothesesGraph._graph.node[(traxel.Timestep, traxel.Id)]['id'] = s['id']
+            traxel.Timestep = timestep
+            traxel.Id = objectId
+            node = (timestep, objectId)
+            if singleTraxels:
+                tracklet = [node]
+            else:
+                tracklet = mapping[s['id']]
+
+            attributes = {'traxel': traxel, 'tracklet': tracklet, 'id': s['id']}
+            if withEnergies:
+                for k in nodeEnergyKeys:
+                    if k in s:
+                        attributes[k] = s[k]
+            if self.result is not None:
+                attributes['value'] = detectionValues.get(s['id'], 0)
+                attributes['divisionValue'] = divisionValues.get(s['id'], False)
+
+            uuidToNode[s['id']] = node
+            nodes.append((node, attributes))
 
-        # insert edges
+        edges = []
         for l in self.model['linkingHypotheses']:
             try:
-                srcTracklet = self.uuidToTraxelMap[l['src']]
-                destTracklet = self.uuidToTraxelMap[l['dest']]
-            except:
+                src = uuidToNode[l['src']]
+                dest = uuidToNode[l['dest']]
+            except KeyError:
                 getLogger().warning("Failed finding {} from JSON['linkingHypotheses'] in uuidToTraxelMap".format((l['dest'], l['src'])))
-            hypothesesGraph._graph.add_edge((srcTracklet[0][0], srcTracklet[0][1]), 
-                                            ((destTracklet[0][0], destTracklet[0][1])))
+                continue
+
+            attributes = {}
+            if withEnergies:
+                attributes['src'] = l['src']
+                attributes['dest'] = l['dest']
+                if 'features' in l:
+                    attributes['features'] = l['features']
+            if self.result is not None:
+                attributes['value'] = 0
+                if (l['src'], l['dest']) in linkValues:
+                    attributes['value'] = linkValues[(l['src'], l['dest'])]
+                    attributes['gap'] = dest[0] - src[0]
+            edges.append((src, dest, attributes))
+
+        # set up graph
+        hypothesesGraph = HypothesesGraph()
+        hypothesesGraph._graph.add_nodes_from(nodes)
+        hypothesesGraph._graph.add_edges_from(edges)
+        if len(uuids) > 0:
+            hypothesesGraph._nextNodeUuid = max(uuids) + 1
 
-        # insert result
-        if self.result is not None:
-            hypothesesGraph.insertSolution(self.result)
-        
         return hypothesesGraph
     
     def setTraxelToUniqueId(self, traxelIdPerTimestepToUniqueIdMap):
@@ -1,11 +1,14 @@
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
 import copy
+import collections
 import logging
+import multiprocessing
 import h5py
 import numpy as np
 import os
 import hytra.core.mergerresolver
-from hytra.core.jsongraph import JsonTrackingGraph
+from hytra.core.mergerfitcache import relabelFrameInSeparateProcess
+from hytra.core.jsongraph import JsonTrackingGraph, UuidTraxelMapping
 
 def getLogger():
     ''' logger to be used in this module '''
@@ -25,8 +28,17 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
                  raw_path,
                  raw_axes,
                  pluginPaths=[os.path.abspath('../hytra/plugins')],
-                 verbose=False):
-        super(JsonMergerResolver, self).__init__(pluginPaths, verbose=verbose)
+                 verbose=False,
+                 useMultiprocessing=False,
+                 numWorkers=None,
+                 mergerResolverPluginName=None,
+                 solver='max-flow'):
+        super(JsonMergerResolver, self).__init__(pluginPaths,
+                                                 verbose=verbose,
+                                                 useMultiprocessing=useMultiprocessing,
+                                                 numWorkers=numWorkers,
+                                                 mergerResolverPluginName=mergerResolverPluginName,
+                                                 solver=solver)
 
         # copy model and result because we will modify it here
         assert(isinstance(jsonTrackingGraph, JsonTrackingGraph))
@@ -34,6 +46,8 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         assert(jsonTrackingGraph.result is not None and len(jsonTrackingGraph.result) > 0)
         self.model = copy.copy(jsonTrackingGraph.model)
         self.result = copy.copy(jsonTrackingGraph.result)
+        if isinstance(jsonTrackingGraph.uuidToTraxelMap, UuidTraxelMapping):
+            self.uuidTraxelMapping = jsonTrackingGraph.uuidToTraxelMap
 
         assert(self.result['detectionResults'] is not None)
         assert(self.result['linkingResults'] is not None)
@@ -47,73 +61,119 @@ class JsonMergerResolver(hytra.core.mergerresolver.MergerResolver):
         self.raw_axes = raw_axes
         self.pluginManager.setImageProvider('LocalImageLoader')
         self.imageProvider = self.pluginManager.getImageProvider()
+        self.ndims = None
     
 
-    def _computeObjectFeatures(self, timesteps):
+    def _getDataDimensionality(self):
+        '''
+        **returns** the number of spatial dimensions of the label image, determined once from its shape
+        '''
+        if self.ndims is None:
+            imageShape = self.imageProvider.getImageShape(self.label_image_filename, self.label_image_path)
+            getLogger().info("Found image of shape {}".format(imageShape))
+            # ndims = len(np.array(imageShape).squeeze()) - 1 # get rid of axes with length 1, and minus time axis
+            # there is no time axis...
+            self.ndims = len([i for i in imageShape if i != 1])
+            getLogger().info("Data has dimensionality {}".format(self.ndims))
+        return self.ndims
+
+    def _computeFrameFeatures(self, timestep, labelImage, objectIds):
         """
-        Computes object features for all nodes in the resolved graph because they
-        are needed for the transition classifier or to compute new distances.
+        Compute the features of all objects in the relabeled `labelImage` at once,
+        and extract those of the given `objectIds`.
 
         **returns:** a dictionary of feature-dicts per node
         """
-        rawImages = {}
-        labelImages = {}
-        for t in timesteps:
-            if self.raw_filename is not None:
-                rawImages[str(t)] = self.imageProvider.getImageDataAtTimeFrame(self.raw_filename, self.raw_path, self.raw_axes, int(t))
-            else:
-                rawImages[str(t)] = self.imageProvider.getLabelImageForFrame(self.label_image_filename, self.label_image_path, int(t)).astype(np.float32)
-            labelImages[str(t)] = self.imageProvider.getLabelImageForFrame(self.label_image_filename, self.label_image_path, int(t))
-            self.relabelMergers(labelImages[str(t)], int(t))
-
-        getLogger().info("Computing object features")
+        if self.raw_filename is not None:
+            rawImage = self.imageProvider.getImageDataAtTimeFrame(self.raw_filename, self.raw_path, self.raw_axes, timestep)
+        else:
+            rawImage = labelImage.astype(np.float32)
+
+        # compute features of all objects in this frame at once, transform to one dict for frame
+        frameFeatureDicts, ignoreNames = self.pluginManager.applyObjectFeatureComputationPlugins(
+            self._getDataDimensionality(), rawImage, labelImage, timestep, self.raw_filename)
+        frameFeatureItems = []
+        for f in frameFeatureDicts:
+            frameFeatureItems = frameFeatureItems + list(f.items())
+        frameFeatures = dict(frameFeatureItems)
+
+        # extract all features for the objects of the resolved graph
         objectFeatures = {}
-        imageShape = self.imageProvider.getImageShape(self.label_image_filename, self.label_image_path)
-        getLogger().info("Found image of shape {}".format(imageShape))
-        # ndims = len(np.array(imageShape).squeeze()) - 1 # get rid of axes with length 1, and minus time axis
-        # there is no time axis...
-        ndims = len([i for i in imageShape if i != 1])
-        getLogger().info("Data has dimensionality {}".format(ndims))
-        for node in self.resolvedGraph.nodes_iter():
-            intT, idx = node
+        for idx in objectIds:
             if str(idx).startswith('div-'):
                 continue
-
-            # mask out this object only and compute features
-            mask = labelImages[str(intT)].copy()
-            mask[mask != idx] = 0
-            mask[mask == idx] = 1
-
-            # compute features, transform to one dict for frame
-            frameFeatureDicts, ignoreNames = self.pluginManager.applyObjectFeatureComputationPlugins(
-                ndims, rawImages[str(intT)], mask, intT, self.raw_filename)
-            frameFeatureItems = []
-            for f in frameFeatureDicts:
-                frameFeatureItems = frameFeatureItems + list(f.items())
-            frameFeatures = dict(frameFeatureItems)
-
-            # extract all features for this one object
             objectFeatureDict = {}
             for k, v in frameFeatures.items():
                 if k in ignoreNames:
                     continue
                 elif 'Polygon' in k:
-                    objectFeatureDict[k] = v[1]
+                    objectFeatureDict[k] = v[idx]
                 else:
-                    objectFeatureDict[k] = v[1, ...]
-            objectFeatures[node] = objectFeatureDict
-
+                    objectFeatureDict[k] = v[idx, ...]
+            objectFeatures[(timestep, idx)] = objectFeatureDict
         return objectFeatures
-    
+
     def _readLabelImage(self, timeframe):
         '''
         Returns the labelimage for the given timeframe
         '''
         return self.imageProvider.getLabelImageForFrame(self.label_image_filename, self.label_image_path, timeframe)
 
-    def _exportRefinedSegmentation(self, timesteps):
-        h5py.File(self.out_label_image, 'w').close()
-        for t in timesteps:
-            labelImage = self._readLabelImage(int(t))
-            self.relabelMergers(labelImage, int(t))
-            self.imageProvider.exportLabelImage(labelImage, int(t), self.out_label_image, self.label_image_path)
\ No newline at end of file
+    def _readRefinedLabelImage(self, timeframe):
+        '''
+        Returns the labelimage for the given timeframe from the exported refined segmentation
+        '''
+        return self.imageProvider.getLabelImageForFrame(self.out_label_image, self.label_image_path, timeframe)
+
+    def _beginRefinedSegmentationExport(self, truncate=True):
+        '''
+        Truncate `out_label_image` (or create it if it does not exist yet), all frames are added by `_exportRefinedFrame`
+        '''
+        if truncate or not os.path.exists(self.out_label_image):
+            h5py.File(self.out_label_image, 'w').close()
+        # the image provider needs to know the image shape for exporting, even if all frames are read by the workers
+        self.imageProvider.getImageShape(self.label_image_filename, self.label_image_path)
+
+    def _exportRefinedFrame(self, timestep, labelImage):
+        self.imageProvider.exportLabelImage(labelImage, timestep, self.out_label_image, self.label_image_path)
+
+    def _exportRefinedSegmentation(self, timesteps, truncate=True):
+        """
+        Relabel the mergers in all frames and write the result to `out_label_image`.
+        With `useMultiprocessing`, frames are relabeled in parallel while they are written in order.
+        """
+        self._beginRefinedSegmentationExport(truncate)
+        mergerFitCache = self.getMergerFitCache()
+
+        if self.useMultiprocessing:
+            # keep only a few relabeled frames in memory at once
+            maxPendingFrames = 2 * (self.numWorkers or multiprocessing.cpu_count())
+        else:
+            maxPendingFrames = 0
+
+        def exportFrame(future):
+            self._exportRefinedFrame(*future.result())
+
+        with self._createFittingExecutor() as executor:
+            pendingFrames = collections.deque()
+            for t in timesteps:
+                pendingFrames.append(executor.submit(relabelFrameInSeparateProcess,
+                                                     self.label_image_filename,
+                                                     self.label_image_path,
+                                                     int(t),
+                                                     mergerFitCache.mergers(int(t)),
+                                                     self._workerPluginManager()))
+                if len(pendingFrames) > maxPendingFrames:
+                    exportFrame(pendingFrames.popleft())
+            while len(pendingFrames) > 0:
+                exportFrame(pendingFrames.popleft())
+
+    def exportFromMergerFits(self, mergerFitsFilename):
+        """
+        Export the refined segmentation using fits stored by `saveMergerFits` in a previous run,
+        without resolving the mergers again.
+        """
+        self.loadMergerFits(mergerFitsFilename)
+        uuidToTraxelMap = self._getUuidTraxelMapping()
+        timesteps = range(min(uuidToTraxelMap.timesteps()), max(uuidToTraxelMap.timesteps()) + 1)
+        self._exportRefinedSegmentation(timesteps)
\ No newline at end of file
@@ -0,0 +1,160 @@
+'''
+Persist the outcome of merger resolving, i.e. the fits of all resolved mergers and the IDs they were split into,
+to a compact HDF5 sidecar file. With that file, label images can be relabeled (e.g. for a re-export in a different format)
+without redoing the fitting and min-cost max-flow steps of merger resolving.
+
+All fits are expected in the layout of our merger resolver plugins: a tuple of
+(weight, covariance, mean, precision cholesky factor) per object.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import h5py
+import numpy as np
+from hytra.util.labelimageindex import LabelImageIndex
+from hytra.pluginsystem.plugin_manager import getWorkerPluginManager
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def relabelFrameInSeparateProcess(labelImageFilename, labelImagePath, timestep, mergerFits, pluginManager=None):
+    '''
+    Load the label image of the given `timestep` with the image provider of the `pluginManager`,
+    and relabel all mergers using the `mergerFits` of this frame (see `MergerFitCache.mergers`).
+
+    Meant to be run in its own process using a `concurrent.futures.ProcessPoolExecutor` that was created with
+    `initializeWorkerPluginManager` as initializer, whose plugin manager is used if no `pluginManager` is given.
+
+    **returns** a tuple of the timestep and the relabeled label image
+    '''
+    if pluginManager is None:
+        pluginManager = getWorkerPluginManager()
+    labelImage = pluginManager.getImageProvider().getLabelImageForFrame(labelImageFilename, labelImagePath, timestep)
+    MergerFitCache.relabelFrameWithFits(labelImage, mergerFits, pluginManager.getMergerResolver())
+    return timestep, labelImage
+
+class MergerFitCache(object):
+    '''
+    The fits and new IDs of all resolved mergers, indexed by timestep and object ID of the merger.
+    '''
+
+    def __init__(self, mergerResolverName=None):
+        self.mergerResolverName = mergerResolverName
+        self._mergersPerTimestep = {}
+
+    @staticmethod
+    def fromUnresolvedGraph(unresolvedGraph, mergerResolverName=None):
+        '''
+        Collect the fits and new IDs of all nodes of the `unresolvedGraph` of a `MergerResolver`
+        that were split into at least two objects.
+        '''
+        cache = MergerFitCache(mergerResolverName)
+        if unresolvedGraph is None:
+            return cache
+        for node in unresolvedGraph.nodes_iter():
+            attributes = unresolvedGraph.node[node]
+            if 'newIds' not in attributes or len(attributes['newIds']) < 2:
+                continue
+            cache.addMerger(node[0], node[1], attributes['fits'], attributes['newIds'])
+        return cache
+
+    def addMerger(self, timestep, objectId, fits, newIds):
+        assert(len(fits) == len(newIds))
+        self._mergersPerTimestep.setdefault(int(timestep), {})[int(objectId)] = (list(fits), [int(i) for i in newIds])
+
+    def timesteps(self):
+        ''' **returns** the sorted list of timesteps that contain resolved mergers '''
+        return sorted(self._mergersPerTimestep.keys())
+
+    def mergers(self, timestep):
+        ''' **returns** a dictionary `{objectId: (fits, newIds)}` of all mergers in the given timestep '''
+        return self._mergersPerTimestep.get(int(timestep), {})
+
+    def __len__(self):
+        return sum(len(m) for m in self._mergersPerTimestep.values())
+
+    @staticmethod
+    def relabelFrameWithFits(labelImage, mergerFits, mergerResolverPlugin, labelImageIndex=None):
+        '''
+        Relabel all mergers given as `{objectId: (fits, newIds)}` in the `labelImage` (in place),
+        each only within its bounding box. Pass a `labelImageIndex` of the unmodified `labelImage`
+        if one is at hand, otherwise it is built here.
+        '''
+        if len(mergerFits) == 0:
+            return labelImage
+        if labelImageIndex is None:
+            labelImageIndex = LabelImageIndex(labelImage)
+        for objectId, (fits, newIds) in mergerFits.items():
+            if objectId not in labelImageIndex:
+                getLogger().warning("Merger {} not found in label image, skipping".format(objectId))
+                continue
+            mergerResolverPlugin.updateLabelImage(labelImage,
+                                                  objectId,
+                                                  fits,
+                                                  newIds,
+                                                  boundingBox=labelImageIndex.boundingBox(objectId),
+                                                  coordinates=labelImageIndex.coordinates(objectId))
+        return labelImage
+
+    def relabelFrame(self, labelImage, timestep, mergerResolverPlugin):
+        ''' relabel all mergers of the given `timestep` in the `labelImage` (in place) '''
+        return self.relabelFrameWithFits(labelImage, self.mergers(timestep), mergerResolverPlugin)
+
+    def writeToHDF5(self, filename):
+        '''
+        Store all fits in one table: the mergers with their timestep, ID and number of fits,
+        and the flattened fits (weight, mean, covariance, precision cholesky factor) together with their new ID.
+        '''
+        timesteps = []
+        objectIds = []
+        counts = []
+        newIds = []
+        weights = []
+        means = []
+        covariances = []
+        precisionsCholesky = []
+        for t in self.timesteps():
+            for objectId, (fits, ids) in sorted(self.mergers(t).items()):
+                timesteps.append(t)
+                objectIds.append(objectId)
+                counts.append(len(fits))
+                newIds.extend(ids)
+                for weight, covariance, mean, precisionCholesky in fits:
+                    weights.append(weight)
+                    means.append(np.asarray(mean, dtype=np.float64))
+                    covariances.append(np.asarray(covariance, dtype=np.float64))
+                    precisionsCholesky.append(np.asarray(precisionCholesky, dtype=np.float64))
+
+        ndim = len(means[0]) if len(means) > 0 else 0
+        with h5py.File(filename, 'w') as f:
+            if self.mergerResolverName is not None:
+                f.attrs['mergerResolver'] = self.mergerResolverName
+            f.create_dataset('timesteps', data=np.array(timesteps, dtype=np.int64))
+            f.create_dataset('objectIds', data=np.array(objectIds, dtype=np.int64))
+            f.create_dataset('counts', data=np.array(counts, dtype=np.int64))
+            f.create_dataset('newIds', data=np.array(newIds, dtype=np.int64))
+            f.create_dataset('weights', data=np.array(weights, dtype=np.float64))
+            f.create_dataset('means', data=np.array(means, dtype=np.float64).reshape(-1, ndim))
+            f.create_dataset('covariances', data=np.array(covariances, dtype=np.float64).reshape(-1, ndim, ndim))
+            f.create_dataset('precisionsCholesky', data=np.array(precisionsCholesky, dtype=np.float64).reshape(-1, ndim, ndim))
+
+    @staticmethod
+    def readFromHDF5(filename):
+        with h5py.File(filename, 'r') as f:
+            mergerResolverName = f.attrs.get('mergerResolver', None)
+            cache = MergerFitCache(mergerResolverName)
+            timesteps = f['timesteps'][()]
+            objectIds = f['objectIds'][()]
+            counts = f['counts'][()]
+            newIds = f['newIds'][()].tolist()
+            weights = f['weights'][()]
+            means = f['means'][()]
+            covariances = f['covariances'][()]
+            precisionsCholesky = f['precisionsCholesky'][()]
+
+        offset = 0
+        for t, objectId, count in zip(timesteps.tolist(), objectIds.tolist(), counts.tolist()):
+            fits = [(weights[i], covariances[i], means[i], precisionsCholesky[i]) for i in range(offset, offset + count)]
+            cache.addMerger(t, objectId, fits, newIds[offset:offset + count])
+            offset += count
+        return cache
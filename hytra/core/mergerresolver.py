@@ -2,13 +2,19 @@ from __future__ import print_function, absolute_import, nested_scopes, generator
 import logging
 import itertools
 import os
+import concurrent.futures
+import multiprocessing
 import numpy as np
 import networkx as nx
-from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager, initializeWorkerPluginManager, getWorkerPluginManager
 import hytra.core.probabilitygenerator as probabilitygenerator
 import hytra.core.jsongraph
+import hytra.core.solvers
 from hytra.core.jsongraph import negLog, listify, JsonTrackingGraph
 from hytra.util.progressbar import DefaultProgressVisitor
+from hytra.util.labelimageindex import LabelImageIndex
+from hytra.core.mergerfitcache import MergerFitCache
+from hytra.core.overlaygraph import OverlayGraph
 from hytra.core.splittracking import SplitTracking
 
 
@@ -17,31 +23,90 @@ def getLogger():
     return logging.getLogger(__name__)
 
 
+def fitMergersInSeparateProcess(fittingJobs, pluginManager=None):
+    """
+    Fit the objects of all given `fittingJobs` with the merger resolver plugin chosen in the `pluginManager`.
+    Each job is a tuple `(offset, localCoordinates, count, initializations)`, where the pixel coordinates
+    of the object are given relative to the `offset` of its bounding box to keep the data that needs to be sent
+    to the worker process small.
+
+    Meant to be run in its own process using a `concurrent.futures.ProcessPoolExecutor` that was created with
+    `initializeWorkerPluginManager` as initializer, whose plugin manager is used if no `pluginManager` is given.
+
+    **returns** a list containing the list of fitted objects for each job
+    """
+    if pluginManager is None:
+        pluginManager = getWorkerPluginManager()
+    mergerResolverPlugin = pluginManager.getMergerResolver()
+    fittedObjectsPerJob = []
+    for offset, localCoordinates, count, initializations in fittingJobs:
+        coordinates = localCoordinates.astype(np.int64) + offset
+        fittedObjectsPerJob.append(list(mergerResolverPlugin.resolveMergerForCoords(coordinates, count, initializations)))
+    return fittedObjectsPerJob
+
 class MergerResolver(object):
     """
     Base class for all merger resolving implementations. Use one of the derived classes
     that handle reading/writing data to the respective sources.
     """
 
-    def __init__(self, pluginPaths=[os.path.abspath('../hytra/plugins')], numSplits=None, verbose=False, progressVisitor=DefaultProgressVisitor()):
+    def __init__(self,
+                 pluginPaths=[os.path.abspath('../hytra/plugins')],
+                 numSplits=None,
+                 verbose=False,
+                 progressVisitor=DefaultProgressVisitor(),
+                 useMultiprocessing=False,
+                 numWorkers=None,
+                 mergerResolverPluginName=None,
+                 solver='max-flow'):
+        '''
+        If `useMultiprocessing=True`, all objects of a frame are fitted in parallel using
+        `numWorkers` processes (defaults to the number of CPU cores).
+
+        `mergerResolverPluginName` selects the merger resolver plugin, `GMMMergerResolver` is used by default.
+
+        `solver` is the name of the max flow solver (see `hytra.core.solvers`) used to find the new links,
+        e.g. `python-max-flow` if `dpct` is not available.
+        '''
         self.unresolvedGraph = None
         self.resolvedGraph = None
-        self.mergersPerTimestep = None
-        self.detectionsPerTimestep = None
+        self.resultIndex = None
+        self.uuidTraxelMapping = None
+        self.mergerFitCache = None
+        # fits of the objects in the last frame of the previous run with a `timeRange`, keyed by their (new) node ID
+        self.borderFits = {}
+        self.pluginPaths = pluginPaths
         self.pluginManager = TrackingPluginManager(
             verbose=verbose, pluginPaths=pluginPaths)
+        if mergerResolverPluginName is not None:
+            self.pluginManager.setMergerResolver(mergerResolverPluginName)
         self.mergerResolverPlugin = self.pluginManager.getMergerResolver()
         self.numSplits = numSplits
+        self.useMultiprocessing = useMultiprocessing
+        self.numWorkers = numWorkers
+        self.solver = solver
 
         # should be filled by constructors of derived classes!
         self.model = None
         self.result = None
         self.progressVisitor = progressVisitor
 
-    def _createUnresolvedGraph(self, divisionsPerTimestep, mergersPerTimestep, mergerLinks, withFullGraph=False):
+    def _getUuidTraxelMapping(self):
+        '''
+        **returns** the `hytra.core.jsongraph.UuidTraxelMapping` of `self.model`, which is only computed
+        if it was not set before (e.g. by the constructor of a derived class).
+        '''
+        if self.uuidTraxelMapping is None:
+            self.uuidTraxelMapping = hytra.core.jsongraph.UuidTraxelMapping.fromModel(self.model)
+        return self.uuidTraxelMapping
+
+    def _createUnresolvedGraph(self, resultIndex, withFullGraph=False):
         """
         Set up a networkx graph consisting of mergers that need to be resolved (not resolved yet!)
-        and their direct neighbors.
+        and their direct neighbors, as given by the `resultIndex` (a `hytra.core.jsongraph.ResultIndex`).
+
+        If `withFullGraph=True`, the unresolved graph is a `hytra.core.overlaygraph.OverlayGraph` on top of
+        the full hypotheses graph instead, which must not be modified until merger resolving is done.
 
         ** returns ** the `unresolvedGraph`
         """
@@ -52,30 +117,27 @@ class MergerResolver(object):
 
         def target(timestep, link):
             return int(timestep), link[1]
+
+        mergerLinks = resultIndex.mergerLinks()
         
-        # Recompute full graph
+        # Work on the full graph
         if withFullGraph:
-            self.unresolvedGraph = self.hypothesesGraph._graph.copy()
+            # instead of copying the whole hypotheses graph, only the changes are stored in an overlay on top of it
+            self.unresolvedGraph = OverlayGraph(self.hypothesesGraph._graph, division=False)
             
-            # Add division parameter to nodes
-            # TODO: Add the division parameter only to nodes that contain divisions (we're already doing these with 'count')
-            lastframe = max(divisionsPerTimestep.keys(), key=int)
-            for node in self.unresolvedGraph.nodes_iter(): 
-                timestep, idx = node
-
-                if divisionsPerTimestep is not None and int(timestep) < int(lastframe):
-                    division = idx in divisionsPerTimestep[str(timestep + 1)] # +1 screams for lastframe condition.
-                else:
-                    division = False  
-                    
-                self.unresolvedGraph.node[node]['division'] = division          
+            # Add division parameter to the dividing nodes, all others default to no division
+            for timestep in resultIndex.timesteps:
+                for idx in resultIndex.divisions(timestep):
+                    node = (timestep, idx)
+                    if node in self.unresolvedGraph:
+                        self.unresolvedGraph.node[node]['division'] = True
             
             # Add count parameter to nodes 
             for t, link in mergerLinks:
                 for node in [source(t, link), target(t, link)]:
                     timestep, idx = node
-                    if idx in mergersPerTimestep[str(timestep)]:
-                        count = mergersPerTimestep[str(timestep)][idx]
+                    if resultIndex.isMerger(timestep, idx):
+                        count = resultIndex.mergers(timestep)[idx]
                         self.unresolvedGraph.node[node]['count'] = count
         
         # Recompute graph only with merger nodes and neighbors                
@@ -83,16 +145,11 @@ class MergerResolver(object):
             def addNode(node):
                 ''' add a node to the unresolved graph and fill in the properties `division` and `count` '''
                 intT, idx = node
-    
-                lastframe = max(divisionsPerTimestep.keys(), key=int)
-                if divisionsPerTimestep is not None and int(intT) < int(lastframe):
-                    division = idx in divisionsPerTimestep[str(intT + 1)] # +1 screams for lastframe condition.
-                else:
-                    division = False
+                division = resultIndex.isDividing(intT, idx)
                 count = 1
-                if idx in mergersPerTimestep[str(intT)]:
+                if resultIndex.isMerger(intT, idx):
                     assert(not division)
-                    count = mergersPerTimestep[str(intT)][idx]
+                    count = resultIndex.mergers(intT)[idx]
                 self.unresolvedGraph.add_node(node, division=division, count=count)
     
             # add nodes
@@ -106,7 +163,8 @@ class MergerResolver(object):
 
     def _prepareResolvedGraph(self):
         """
-        
+        Start the resolved graph as a copy of the unresolved graph (for an `OverlayGraph`, only its delta is copied)
+
         ** returns ** the `resolvedGraph`
         """
         self.resolvedGraph = self.unresolvedGraph.copy()
@@ -119,80 +177,235 @@ class MergerResolver(object):
         '''
         raise NotImplementedError()
 
-    def _fitAndRefineNodes(self,
-                            detectionsPerTimestep,
-                            mergersPerTimestep,
-                            timesteps):
+    def _createFittingExecutor(self):
         '''
-        Update segmentation of mergers (nodes in unresolvedGraph) from first timeframe to last
-        and create new nodes in `resolvedGraph`. Links to merger nodes are duplicated to all new nodes.
+        **returns** a `concurrent.futures.ProcessPoolExecutor` if multiprocessing is enabled, otherwise a `DummyExecutor`
+        that runs the fitting in this process. Use it in a `with` statement.
 
-        Uses the mergerResolver plugin to update the segmentations in the labelImages.
+        Each worker process sets up its own plugin manager with the currently chosen plugins once when it starts,
+        so tasks submitted to the workers must not pass `self.pluginManager` (see `_workerPluginManager`).
         '''
+        if self.useMultiprocessing:
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.numWorkers,
+                initializer=initializeWorkerPluginManager,
+                initargs=(self.pluginPaths, self.pluginManager.chosen_merger_resolver, self.pluginManager.chosen_data_provider))
+        else:
+            return probabilitygenerator.DummyExecutor()
 
-        intTimesteps = [int(t) for t in timesteps]
-        intTimesteps.sort()
+    def _workerPluginManager(self):
+        '''
+        **returns** the plugin manager to pass to the tasks of the executor returned by `_createFittingExecutor`:
+        None if they run in worker processes that have their own, otherwise `self.pluginManager`
+        '''
+        return None if self.useMultiprocessing else self.pluginManager
 
-        for intT in intTimesteps:
-            t = str(intT)
-            # use image provider plugin to load labelimage
-            labelImage = self._readLabelImage(int(t))
-            nextObjectId = labelImage.max() + 1
+    @staticmethod
+    def _cropCoordinates(coordinates):
+        '''
+        **returns** the offset of the bounding box of the given pixel `coordinates`,
+        and the coordinates relative to that offset in the smallest unsigned integer type that can hold them
+        '''
+        if len(coordinates) == 0:
+            return np.zeros(coordinates.shape[1], dtype=np.int64), coordinates
+        offset = coordinates.min(axis=0)
+        localCoordinates = coordinates - offset
+        return offset, localCoordinates.astype(np.min_scalar_type(localCoordinates.max()))
 
-            for idx in detectionsPerTimestep[t]:
-                node = (intT, idx)
-                if node not in self.resolvedGraph:
-                    continue
+    def _fitObjects(self, executor, fittingJobs):
+        '''
+        Fit all `fittingJobs` of one frame, given as tuples `(coordinates, count, initializations)`,
+        with the merger resolver plugin. The jobs are split into one chunk per worker and dispatched to the `executor`.
 
-                count = 1
-                if idx in mergersPerTimestep[t]:
-                    count = mergersPerTimestep[t][idx]
-                getLogger().debug("Looking at node {} in timestep {} with count {}".format(idx, t, count))
-                
-                # collect initializations from incoming
-                initializations = []
-                for predecessor, _ in self.unresolvedGraph.in_edges(node):
-                    initializations.extend(self.unresolvedGraph.node[predecessor]['fits'])
-                # TODO: what shall we do if e.g. a 2-merger and a single object merge to 2 + 1,
-                # so there are 3 initializations for the 2-merger, and two initializations for the 1 merger?
-                # What does pgmlink do in that case?
-
-                # use merger resolving plugin to fit `count` objects, also updates labelimage!
-                fittedObjects = list(self.mergerResolverPlugin.resolveMerger(labelImage, idx, nextObjectId, count, initializations))
-                assert(len(fittedObjects) == count)
-
-                # split up node if count > 1, duplicate incoming and outgoing arcs
-                if count > 1:
-                    for idx in range(nextObjectId, nextObjectId + count):
-                        newNode = (intT, idx)
-                        self.resolvedGraph.add_node(newNode, division=False, count=1, origin=node)
-
-                        for e in self.unresolvedGraph.out_edges(node):
-                            self.resolvedGraph.add_edge(newNode, e[1])
-                        for e in self.unresolvedGraph.in_edges(node):
-                            if 'newIds' in self.unresolvedGraph.node[e[0]]:
-                                for newId in self.unresolvedGraph.node[e[0]]['newIds']:
-                                    self.resolvedGraph.add_edge((e[0][0], newId), newNode)
-                            else:
-                                self.resolvedGraph.add_edge(e[0], newNode)
-
-                    self.resolvedGraph.remove_node(node)
-                    self.unresolvedGraph.node[node]['newIds'] = range(nextObjectId, nextObjectId + count)
-                    nextObjectId += count
-
-                # each unresolved node stores its fitted shape(s) to be used
-                # as initialization in the next frame, this way division duplicates
-                # and de-merged nodes in the resolved graph do not need to store a fit as well
-                self.unresolvedGraph.node[node]['fits'] = fittedObjects
-
-        # import matplotlib.pyplot as plt
-        # nx.draw_networkx(resolvedGraph)
-        # plt.savefig("/Users/chaubold/test.pdf")
+        **returns** the list of fitted objects for each job, in the order of the jobs
+        '''
+        croppedJobs = []
+        for coordinates, count, initializations in fittingJobs:
+            offset, localCoordinates = self._cropCoordinates(coordinates)
+            croppedJobs.append((offset, localCoordinates, count, initializations))
+
+        if self.useMultiprocessing:
+            numChunks = min(len(croppedJobs), self.numWorkers or multiprocessing.cpu_count())
+        else:
+            numChunks = 1
+        chunkBorders = np.linspace(0, len(croppedJobs), numChunks + 1).astype(int)
+
+        futures = []
+        for begin, end in zip(chunkBorders[:-1], chunkBorders[1:]):
+            if end > begin:
+                futures.append(executor.submit(fitMergersInSeparateProcess, croppedJobs[begin:end], self._workerPluginManager()))
+
+        fittedObjectsPerJob = []
+        for f in futures:
+            fittedObjectsPerJob.extend(f.result())
+        return fittedObjectsPerJob
+
+    def _refineNode(self, node, count, fittedObjects, nextObjectId):
+        '''
+        Split up the `node` into `count` new nodes with IDs starting at `nextObjectId` if it is a merger,
+        and store the `fittedObjects` in the unresolved graph.
+
+        **returns** the next free object ID
+        '''
+        assert(len(fittedObjects) == count)
+        timestep = node[0]
+
+        # split up node if count > 1, duplicate incoming and outgoing arcs
+        if count > 1:
+            for idx in range(nextObjectId, nextObjectId + count):
+                newNode = (timestep, idx)
+                self.resolvedGraph.add_node(newNode, division=False, count=1, origin=node)
+
+                for e in self.unresolvedGraph.out_edges(node):
+                    self.resolvedGraph.add_edge(newNode, e[1])
+                for e in self.unresolvedGraph.in_edges(node):
+                    if 'newIds' in self.unresolvedGraph.node[e[0]]:
+                        for newId in self.unresolvedGraph.node[e[0]]['newIds']:
+                            self.resolvedGraph.add_edge((e[0][0], newId), newNode)
+                    else:
+                        self.resolvedGraph.add_edge(e[0], newNode)
+
+            self.resolvedGraph.remove_node(node)
+            self.unresolvedGraph.node[node]['newIds'] = range(nextObjectId, nextObjectId + count)
+            nextObjectId += count
+
+        # each unresolved node stores its fitted shape(s) to be used
+        # as initialization in the next frame, this way division duplicates
+        # and de-merged nodes in the resolved graph do not need to store a fit as well
+        self.unresolvedGraph.node[node]['fits'] = fittedObjects
+        return nextObjectId
+
+    def _fitAndRefineFrame(self, executor, resultIndex, intT, labelImageIndex):
+        '''
+        Fit all nodes of the unresolved graph in timestep `intT`, using the fits of their predecessors as initializations,
+        and refine the mergers in the `resolvedGraph`. The pixels of each object are looked up in the `labelImageIndex`.
+
+        All objects of one frame are fitted in parallel if `useMultiprocessing` is enabled. The nodes are refined
+        in a fixed order afterwards, such that the new object IDs do not depend on the order in which the fits finished.
+        '''
+        nextObjectId = labelImageIndex.maxLabel() + 1
+        mergers = resultIndex.mergers(intT)
+
+        nodes = []
+        counts = []
+        fittingJobs = []
+        for idx in resultIndex.detections(intT):
+            node = (intT, idx)
+            if node not in self.resolvedGraph:
+                continue
+
+            count = mergers.get(idx, 1)
+            getLogger().debug("Looking at node {} in timestep {} with count {}".format(idx, intT, count))
+            
+            # collect initializations from incoming, predecessors before the time range of this run may not have fits
+            initializations = []
+            for predecessor, _ in self.unresolvedGraph.in_edges(node):
+                initializations.extend(self.unresolvedGraph.node[predecessor].get('fits', []))
+            # TODO: what shall we do if e.g. a 2-merger and a single object merge to 2 + 1,
+            # so there are 3 initializations for the 2-merger, and two initializations for the 1 merger?
+            # What does pgmlink do in that case?
+
+            nodes.append(node)
+            counts.append(count)
+            fittingJobs.append((labelImageIndex.coordinates(idx), count, initializations))
+
+        # use merger resolving plugin to fit `count` objects
+        fittedObjectsPerNode = self._fitObjects(executor, fittingJobs)
+
+        for node, count, fittedObjects in zip(nodes, counts, fittedObjectsPerNode):
+            nextObjectId = self._refineNode(node, count, fittedObjects, nextObjectId)
+
+    def _resolveFramesStreaming(self, resultIndex, timesteps, truncate=True):
+        '''
+        Resolve the mergers in a single forward pass over all `timesteps`: each label image is read once,
+        the objects are fitted and the mergers refined (see `_fitAndRefineFrame`), the mergers are relabeled
+        in place using the fits that were just found, the object features of the refined frame are computed
+        (see `_computeFrameFeatures`), and the frame is exported (see `_exportRefinedFrame`).
+
+        Only one label image is kept in memory at a time. Fits of single objects are needed as initializations
+        for their successors only, so they are released as soon as all successors are fitted. The fits of
+        resolved mergers and of objects without successors are kept, see `getMergerFitCache` and `borderFits`.
+
+        If `truncate=False`, frames that were exported before are kept (see `_beginRefinedSegmentationExport`).
+
+        **returns** a dictionary of feature-dicts for all nodes in the resolved graph within the `timesteps`
+        '''
+        # group the nodes of the resolved graph by frame, before the mergers get replaced by their refined nodes
+        nodesPerTimestep = {}
+        for node in self.resolvedGraph.nodes_iter():
+            nodesPerTimestep.setdefault(node[0], []).append(node)
+
+        objectFeatures = {}
+        releaseFitsAtTimestep = {}
+        self._beginRefinedSegmentationExport(truncate)
+
+        with self._createFittingExecutor() as executor:
+            for t in timesteps:
+                intT = int(t)
+                labelImage = self._readLabelImage(intT)
+                labelImageIndex = LabelImageIndex(labelImage)
+                self._fitAndRefineFrame(executor, resultIndex, intT, labelImageIndex)
+
+                # relabel the mergers of this frame right away, reusing the index of the unmodified label image
+                mergerFits = {}
+                objectIds = []
+                for node in nodesPerTimestep.get(intT, []):
+                    attributes = self.unresolvedGraph.node[node]
+                    if 'newIds' in attributes:
+                        mergerFits[node[1]] = (attributes['fits'], attributes['newIds'])
+                        objectIds.extend(attributes['newIds'])
+                    else:
+                        objectIds.append(node[1])
+                        successors = self.unresolvedGraph.successors(node)
+                        if 'fits' in attributes and len(successors) > 0:
+                            lastSuccessorTimestep = max(s[0] for s in successors)
+                            releaseFitsAtTimestep.setdefault(lastSuccessorTimestep, []).append(node)
+                MergerFitCache.relabelFrameWithFits(labelImage, mergerFits, self.mergerResolverPlugin, labelImageIndex)
+
+                if len(objectIds) > 0:
+                    objectFeatures.update(self._computeFrameFeatures(intT, labelImage, objectIds))
+                self._exportRefinedFrame(intT, labelImage)
+
+                for node in releaseFitsAtTimestep.pop(intT, []):
+                    del self.unresolvedGraph.node[node]['fits']
+
+        return objectFeatures
+
+    def _computeTransitionProbabilities(self, edges, objectFeatures, transitionClassifier=None, transitionParameter=5.0):
+        """
+        Compute the transition probabilities of all given `edges` of the resolved graph, either by predicting
+        them with the `transitionClassifier` for all edges at once, or from the distances of the region centers.
+
+        **returns** a `(numEdges, 2)` array with the probabilities for the link being inactive and active
+        """
+        if len(edges) == 0:
+            return np.zeros((0, 2))
+
+        if transitionClassifier is not None:
+            featureVectors = []
+            for edge in edges:
+                featuresAtSrc = objectFeatures[edge[0]]
+                featuresAtDest = objectFeatures[edge[1]]
+                try:
+                    featureVectors.append(self.pluginManager.applyTransitionFeatureVectorConstructionPlugins(
+                        featuresAtSrc, featuresAtDest, transitionClassifier.selectedFeatures))
+                except:
+                    getLogger().error("Could not compute transition features of link {}->{}:".format(edge[0], edge[1]))
+                    getLogger().error(featuresAtSrc)
+                    getLogger().error(featuresAtDest)
+                    raise
+            return transitionClassifier.predictProbabilities(np.array(featureVectors))
+        else:
+            srcCenters = np.array([np.ravel(objectFeatures[e[0]]['RegionCenter']) for e in edges], dtype=np.float64)
+            destCenters = np.array([np.ravel(objectFeatures[e[1]]['RegionCenter']) for e in edges], dtype=np.float64)
+            distances = np.linalg.norm(destCenters - srcCenters, axis=1)
+            prob = np.exp(-distances / transitionParameter)
+            return np.column_stack([1.0 - prob, prob])
 
     def _minCostMaxFlowMergerResolving(self, objectFeatures, transitionClassifier=None, transitionParameter=5.0):
         """
-        Find the optimal assignments within the `resolvedGraph` by running min-cost max-flow from the
-        `dpct` module.
+        Find the optimal assignments within the `resolvedGraph` by running min-cost max-flow with
+        the chosen solver (`dpct` by default).
 
         Converts the `resolvedGraph` to our JSON model structure, predicts the transition probabilities
         either using the given transitionClassifier, or using distance-based probabilities.
@@ -203,74 +416,65 @@ class MergerResolver(object):
         """
 
         trackingGraph = JsonTrackingGraph(progressVisitor=self.progressVisitor)
-        for node in self.resolvedGraph.nodes_iter():
-            additionalFeatures = {}
-            additionalFeatures['nid'] = node
 
+        # set up all detections at once
+        nodes = list(self.resolvedGraph.nodes_iter())
+        listOfFeatures = []
+        appearanceFeatures = []
+        disappearanceFeatures = []
+        for node in nodes:
             # nodes with no in/out
             numStates = 2
+            appearance = None
+            disappearance = None
             
             if len(self.resolvedGraph.in_edges(node)) == 0:
                 # division nodes with no incoming arcs offer 2 units of flow without the need to de-merge
-                if node in self.unresolvedGraph.nodes() and self.unresolvedGraph.node[node]['division'] and len(self.unresolvedGraph.out_edges(node)) == 2:
+                if node in self.unresolvedGraph and self.unresolvedGraph.node[node]['division'] and len(self.unresolvedGraph.out_edges(node)) == 2:
                     numStates = 3
-                additionalFeatures['appearanceFeatures'] = [[i**2 * 0.01] for i in range(numStates)]
+                appearance = [[i**2 * 0.01] for i in range(numStates)]
             if len(self.resolvedGraph.out_edges(node)) == 0:
                 assert(numStates == 2) # division nodes with no incoming should have outgoing, or they shouldn't show up in resolved graph
-                additionalFeatures['disappearanceFeatures'] = [[i**2 * 0.01] for i in range(numStates)]
-
-            features = [[i**2] for i in range(numStates)]
-            uuid = trackingGraph.addDetectionHypotheses(features, **additionalFeatures)
-            self.resolvedGraph.node[node]['id'] = uuid
+                disappearance = [[i**2 * 0.01] for i in range(numStates)]
 
-        for edge in self.resolvedGraph.edges_iter():
-            src = self.resolvedGraph.node[edge[0]]['id']
-            dest = self.resolvedGraph.node[edge[1]]['id']
-
-            featuresAtSrc = objectFeatures[edge[0]]
-            featuresAtDest = objectFeatures[edge[1]]
+            listOfFeatures.append([[i**2] for i in range(numStates)])
+            appearanceFeatures.append(appearance)
+            disappearanceFeatures.append(disappearance)
 
-            if transitionClassifier is not None:
-                try:
-                    featVec = self.pluginManager.applyTransitionFeatureVectorConstructionPlugins(
-                        featuresAtSrc, featuresAtDest, transitionClassifier.selectedFeatures)
-                except:
-                    getLogger().error("Could not compute transition features of link {}->{}:".format(src, dest))
-                    getLogger().error(featuresAtSrc)
-                    getLogger().error(featuresAtDest)
-                    raise
-                featVec = np.expand_dims(np.array(featVec), axis=0)
-                probs = transitionClassifier.predictProbabilities(featVec)[0]
-            else:
-                dist = np.linalg.norm(featuresAtDest['RegionCenter'] - featuresAtSrc['RegionCenter'])
-                prob = np.exp(-dist / transitionParameter)
-                probs = [1.0 - prob, prob]
+        uuids = trackingGraph.addDetectionHypothesesBatch(listOfFeatures,
+                                                          nid=nodes,
+                                                          appearanceFeatures=appearanceFeatures,
+                                                          disappearanceFeatures=disappearanceFeatures)
+        for node, uuid in zip(nodes, uuids):
+            self.resolvedGraph.node[node]['id'] = uuid
 
-            trackingGraph.addLinkingHypotheses(src, dest, listify(negLog(probs)))
+        # predict the transition probabilities of all links in one go
+        edges = list(self.resolvedGraph.edges_iter())
+        probabilities = self._computeTransitionProbabilities(edges, objectFeatures, transitionClassifier, transitionParameter)
+        costs = np.array(negLog(probabilities)).reshape(probabilities.shape)
+        trackingGraph.addLinkingHypothesesBatch([self.resolvedGraph.node[e[0]]['id'] for e in edges],
+                                                [self.resolvedGraph.node[e[1]]['id'] for e in edges],
+                                                [listify(c) for c in costs.tolist()])
             
         # Set TraxelToUniqueId on resolvedGraph's json graph        
-        uuidToTraxelMap = {}
         traxelIdPerTimestepToUniqueIdMap = {}
-
-        for node in self.resolvedGraph.nodes_iter():
-            uuid = self.resolvedGraph.node[node]['id']
-            uuidToTraxelMap[uuid] = [node]
-
-            for t in uuidToTraxelMap[uuid]:
-                traxelIdPerTimestepToUniqueIdMap.setdefault(str(t[0]), {})[str(t[1])] = uuid
+        for node, uuid in zip(nodes, uuids):
+            traxelIdPerTimestepToUniqueIdMap.setdefault(str(node[0]), {})[str(node[1])] = uuid
         
         trackingGraph.setTraxelToUniqueId(traxelIdPerTimestepToUniqueIdMap)
 
         # track
-        import dpct
-        
         weights = {"weights": [1, 1, 1, 1]}
         
         if not self.numSplits:
-            mergerResult = dpct.trackMaxFlow(trackingGraph.model, weights)
+            mergerResult = hytra.core.solvers.solve(trackingGraph.model, weights, self.solver)
         else:
             getLogger().info("Running split tracking with {} splits.".format(self.numSplits))
-            mergerResult = SplitTracking.trackFlowBasedWithSplits(trackingGraph.model, weights, numSplits=self.numSplits, withMergerResolver=True)
+            mergerResult = SplitTracking.trackFlowBasedWithSplits(trackingGraph.model,
+                                                                  weights,
+                                                                  numSplits=self.numSplits,
+                                                                  withMergerResolver=True,
+                                                                  solver=self.solver)
 
         # transform results to dictionaries that can be indexed by id or (src,dest)
         nodeFlowMap = dict([(int(d['id']), int(d['value'])) for d in mergerResult['detectionResults']])
@@ -373,7 +577,7 @@ class MergerResolver(object):
 
         return self.result
 
-    def _exportRefinedSegmentation(self, timesteps):
+    def _exportRefinedSegmentation(self, timesteps, truncate=True):
         """
         Store the resulting label images, if needed.
 
@@ -388,54 +592,135 @@ class MergerResolver(object):
         '''
         pass
 
+    def _computeFrameFeatures(self, timestep, labelImage, objectIds):
+        '''
+        Compute the features of the given `objectIds` in the already relabeled `labelImage` of one frame,
+        in the same format as `_computeObjectFeatures`. Used by the streaming pass in `run`.
+        '''
+        raise NotImplementedError()
+
+    def _beginRefinedSegmentationExport(self, truncate=True):
+        '''
+        Prepare the output of the refined segmentation before the first frame is passed to `_exportRefinedFrame`.
+        With `truncate=False`, previously exported frames are kept.
+        '''
+        pass
+
+    def _readRefinedLabelImage(self, timeframe):
+        '''
+        Should return the refined labelimage of the given timeframe that was exported in a previous run
+        '''
+        raise NotImplementedError()
+
+    def _computeBorderFeatures(self, timeRange):
+        '''
+        Compute the features of all nodes of the resolved graph outside of the `timeRange=(first, last)`,
+        i.e. the neighbors of the mergers at the borders of the time range. The objects before `first` were resolved
+        in a previous run, so their features are computed on the refined label image of that run,
+        while the objects from `last` on are not resolved yet.
+        '''
+        nodesPerTimestep = {}
+        for node in self.resolvedGraph.nodes_iter():
+            if node[0] < timeRange[0] or node[0] >= timeRange[1]:
+                nodesPerTimestep.setdefault(node[0], []).append(node[1])
+
+        objectFeatures = {}
+        for timestep, objectIds in nodesPerTimestep.items():
+            if timestep < timeRange[0]:
+                labelImage = self._readRefinedLabelImage(timestep)
+            else:
+                labelImage = self._readLabelImage(timestep)
+            objectFeatures.update(self._computeFrameFeatures(timestep, labelImage, objectIds))
+        return objectFeatures
+
+    def _insertBorderFits(self, firstTimestep):
+        '''
+        Use the fits stored in `borderFits` by a previous run as initializations for the first frame of the time range
+        '''
+        for node, fits in self.borderFits.items():
+            if node[0] < firstTimestep and node in self.unresolvedGraph:
+                self.unresolvedGraph.node[node]['fits'] = fits
+
+    def _storeBorderFits(self, lastTimestep):
+        '''
+        Remember the fits of all objects in `lastTimestep`, such that a subsequent run on the following frames
+        can use them as initializations. Mergers are stored by their new IDs, with one fit each.
+        '''
+        self.borderFits = {}
+        for node in self.unresolvedGraph.nodes_iter():
+            attributes = self.unresolvedGraph.node[node]
+            if node[0] != lastTimestep or 'fits' not in attributes:
+                continue
+            if 'newIds' in attributes:
+                for newId, fit in zip(attributes['newIds'], attributes['fits']):
+                    self.borderFits[(node[0], newId)] = [fit]
+            else:
+                self.borderFits[node] = attributes['fits']
+
+    def _exportRefinedFrame(self, timestep, labelImage):
+        '''
+        Store the relabeled `labelImage` of one frame, if needed
+        '''
+        pass
+
     # ------------------------------------------------------------
-    def run(self, transition_classifier_filename=None, transition_classifier_path=None):
+    def run(self, transition_classifier_filename=None, transition_classifier_path=None, timeRange=None):
         """
         Run merger resolving
 
+        If a `timeRange=(first, last)` is given, only the mergers in the frames `first <= t < last` are resolved
+        and only these frames are exported, e.g. when new frames were appended to the `model` and `result`
+        in a live tracking setup. The mergers before `first` must have been resolved in a previous run
+        of this resolver, whose fits in the last frame are used as initializations, and whose exported
+        refined segmentation is used to compute the features of the objects at the left border.
+
+        **Note:** only the label images of the time range (and of the objects at its borders) are read and fitted,
+        but finding the mergers (`ResultIndex`) and refining `model` and `result` still scan the full model once.
+        So the cost of a run per appended frame grows slowly (linearly) with the length of the movie.
+
         1. find mergers in the given model and result
         2. build graph of the unresolved (merger) nodes and their direct neighbors
-        3. use a mergerResolving plugin to refine the merger nodes and their segmentation
+        3. in one pass over all frames, use a mergerResolving plugin to refine the merger nodes and their segmentation,
+           compute the features of the refined objects and export the refined segmentation
         4. run min-cost max-flow tracking to find the fate of all the de-merged objects
-        5. export refined segmentation, update member variables `model` and `result`
+        5. update member variables `model` and `result`
 
         **Returns** a nested dictionary, indexed first by time, then object Id, containing a list of new segmentIDs per merger
         """
 
-        traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(self.model)
-        # timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
+        traxelIdPerTimestepToUniqueIdMap = self.model['traxelToUniqueId']
+        uuidToTraxelMap = self._getUuidTraxelMapping()
         # there might be empty frames. We want them as output too.
-        timesteps = [str(t) for t in range(int(min(traxelIdPerTimestepToUniqueIdMap.keys())), max(
-            [int(idx) for idx in traxelIdPerTimestepToUniqueIdMap.keys()]) + 1)]
-
-        mergers, detections, links, divisions = hytra.core.jsongraph.getMergersDetectionsLinksDivisions(self.result, uuidToTraxelMap)
+        allTimesteps = [str(t) for t in range(min(uuidToTraxelMap.timesteps()), max(uuidToTraxelMap.timesteps()) + 1)]
+        if timeRange is None:
+            timesteps = allTimesteps
+        else:
+            timesteps = [str(t) for t in range(timeRange[0], timeRange[1])]
 
+        # the links of the mergers in the time range to their neighbors outside of it are needed as well
+        self.resultIndex = hytra.core.jsongraph.ResultIndex(self.result, uuidToTraxelMap, allTimesteps, mergerTimeRange=timeRange)
 
         # ------------------------------------------------------------
 
         # it may be, that there are no mergers, so do basically nothing, just copy all the ingoing data
-        if len(mergers) == 0:
+        if self.resultIndex.numMergers == 0:
             getLogger().info("The maximum number of objects is 1, so nothing to be done. Writing the output...")
-            self._exportRefinedSegmentation(timesteps)
+            self._exportRefinedSegmentation(timesteps, truncate=timeRange is None)
+            self.borderFits = {}
 
         else:
-            self.mergersPerTimestep = hytra.core.jsongraph.getMergersPerTimestep(mergers, timesteps)
-            self.detectionsPerTimestep = hytra.core.jsongraph.getDetectionsPerTimestep(detections, timesteps)
-            
-            linksPerTimestep = hytra.core.jsongraph.getLinksPerTimestep(links, timesteps)
-            divisionsPerTimestep = hytra.core.jsongraph.getDivisionsPerTimestep(divisions, linksPerTimestep, timesteps)
-            mergerLinks = hytra.core.jsongraph.getMergerLinks(linksPerTimestep, self.mergersPerTimestep, timesteps)
-
             # set up unresolved graph and then refine the nodes to get the resolved graph
-            self._createUnresolvedGraph(divisionsPerTimestep, self.mergersPerTimestep, mergerLinks)
+            self._createUnresolvedGraph(self.resultIndex)
             self._prepareResolvedGraph()
-            self._fitAndRefineNodes(self.detectionsPerTimestep,
-                                    self.mergersPerTimestep,
-                                    timesteps)
+            if timeRange is not None:
+                self._insertBorderFits(timeRange[0])
 
             # ------------------------------------------------------------
-            # compute new object features
-            objectFeatures = self._computeObjectFeatures(timesteps)
+            # fit, relabel, compute new object features and export frame by frame
+            objectFeatures = self._resolveFramesStreaming(self.resultIndex, timesteps, truncate=timeRange is None)
+            if timeRange is not None:
+                objectFeatures.update(self._computeBorderFeatures(timeRange))
+            self._storeBorderFits(int(timesteps[-1]))
 
             # ------------------------------------------------------------
             # load transition classifier if any
@@ -464,7 +749,7 @@ class MergerResolver(object):
             def mergerNodeFilter(jsonNode):
                 uuid = int(jsonNode['id'])
                 traxels = uuidToTraxelMap[uuid]
-                return not any(t[1] in self.mergersPerTimestep[str(t[0])] for t in traxels)
+                return not any(self.resultIndex.isMerger(t[0], t[1]) for t in traxels)
 
             def mergerLinkFilter(jsonLink):
                 srcUuid = int(jsonLink['src'])
@@ -473,7 +758,7 @@ class MergerResolver(object):
                 destTraxels = uuidToTraxelMap[destUuid]
 
                 # return True if there was no traxel in either source or target node that was a merger.
-                return not (any(t[1] in self.mergersPerTimestep[str(t[0])] for t in srcTraxels) or any(t[1] in self.mergersPerTimestep[str(t[0])] for t in destTraxels))
+                return not (any(self.resultIndex.isMerger(t[0], t[1]) for t in srcTraxels) or any(self.resultIndex.isMerger(t[0], t[1]) for t in destTraxels))
 
             self.model = self._refineModel(uuidToTraxelMap,
                                            traxelIdPerTimestepToUniqueIdMap,
@@ -488,8 +773,8 @@ class MergerResolver(object):
                                              mergerNodeFilter,
                                              mergerLinkFilter)
 
-            # 3.) export refined segmentation
-            self._exportRefinedSegmentation(timesteps)
+            # the refined model contains new objects, so the mapping has to be recomputed in subsequent runs
+            self.uuidTraxelMapping = None
 
             # return a dictionary telling about which mergers were resolved into what
             mergerDict = {}
@@ -501,25 +786,58 @@ class MergerResolver(object):
 
             return mergerDict
     
+    def getMergerFitCache(self):
+        """
+        **returns** a `MergerFitCache` holding the fits and new IDs of all resolved mergers.
+        Unless fits were loaded with `loadMergerFits`, it is created from the unresolved graph, so call this after fitting.
+        """
+        if self.mergerFitCache is None:
+            return MergerFitCache.fromUnresolvedGraph(self.unresolvedGraph, self.pluginManager.chosen_merger_resolver)
+        return self.mergerFitCache
+
+    def saveMergerFits(self, filename):
+        """
+        Store the fits and new IDs of all resolved mergers in a HDF5 sidecar file,
+        such that the segmentation can be relabeled later without resolving the mergers again.
+        """
+        self.getMergerFitCache().writeToHDF5(filename)
+
+    def loadMergerFits(self, filename):
+        """
+        Load fits and new IDs of resolved mergers that were stored with `saveMergerFits`.
+        Afterwards `relabelMergers` uses these fits instead of the unresolved graph.
+        """
+        self.mergerFitCache = MergerFitCache.readFromHDF5(filename)
+        if self.mergerFitCache.mergerResolverName is not None:
+            self.pluginManager.setMergerResolver(self.mergerFitCache.mergerResolverName)
+            self.mergerResolverPlugin = self.pluginManager.getMergerResolver()
+
     def relabelMergers(self, labelImage, time):
         """
         Calls the merger resolving plugin to relabel the mergers based on a previously found fit,
-        which is stored in the hypotheses graph node
+        which is stored in the hypotheses graph node, or was loaded using `loadMergerFits`.
         """
-        t = str(time)
-        
-        if self.detectionsPerTimestep is not None and t in self.detectionsPerTimestep:
-            for idx in self.detectionsPerTimestep[t]:
+        if self.mergerFitCache is not None:
+            self.mergerFitCache.relabelFrame(labelImage, time, self.mergerResolverPlugin)
+        elif self.resultIndex is not None:
+            mergers = self.resultIndex.mergers(time)
+            if len(mergers) > 0:
+                # index the objects once, so that each merger is only relabeled within its bounding box
+                labelImageIndex = LabelImageIndex(labelImage)
+
+            for idx in mergers:
                 node = (time, idx)
-
-                if idx not in self.mergersPerTimestep[t]:
-                    continue
                 
                 # use fits stored in graph
                 fits = self.unresolvedGraph.node[node]['fits']
                 newIds = self.unresolvedGraph.node[node]['newIds']
                 
                 # use merger resolving plugin to update labelImage with merger IDs
-                self.mergerResolverPlugin.updateLabelImage(labelImage, idx, fits, newIds)
+                self.mergerResolverPlugin.updateLabelImage(labelImage,
+                                                           idx,
+                                                           fits,
+                                                           newIds,
+                                                           boundingBox=labelImageIndex.boundingBox(idx),
+                                                           coordinates=labelImageIndex.coordinates(idx))
           
         return labelImage
\ No newline at end of file
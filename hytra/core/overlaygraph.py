@@ -0,0 +1,195 @@
+'''
+A lightweight, writable view on a (large) `networkx.DiGraph`. All modifications, i.e. added and removed nodes,
+added edges and node attributes, are stored in a sparse delta on top of the base graph, which is never copied
+nor modified. Merger resolving uses this to work on the full hypotheses graph, where only the neighborhood
+of the mergers is changed.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import itertools
+
+
+class _NodeAttributes(dict):
+    '''
+    Attribute dictionary of a node in an `OverlayGraph` that only gets stored in the overlay once it is written to
+    '''
+
+    def __init__(self, store, node, defaults):
+        super(_NodeAttributes, self).__init__(defaults)
+        self._store = store
+        self._node = node
+
+    def _register(self):
+        '''
+        store these attributes in the overlay, **returns** the attributes that were stored before
+        if another attribute dictionary of this node was written to in the meantime
+        '''
+        stored = self._store.setdefault(self._node, self)
+        return None if stored is self else stored
+
+    def __setitem__(self, key, value):
+        stored = self._register()
+        super(_NodeAttributes, self).__setitem__(key, value)
+        if stored is not None:
+            stored[key] = value
+
+    def __delitem__(self, key):
+        stored = self._register()
+        super(_NodeAttributes, self).__delitem__(key)
+        if stored is not None:
+            del stored[key]
+
+    def update(self, *args, **kwargs):
+        stored = self._register()
+        super(_NodeAttributes, self).update(*args, **kwargs)
+        if stored is not None:
+            stored.update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        stored = self._register()
+        if stored is not None:
+            return stored.setdefault(key, default)
+        return super(_NodeAttributes, self).setdefault(key, default)
+
+
+class _NodeAttributeView(object):
+    '''
+    Provides `overlayGraph.node[n]` like for `networkx` graphs. Nodes without attributes in the overlay
+    get the default attributes of the `OverlayGraph`, the attributes of the base graph are not exposed.
+    '''
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node):
+        if node not in self._graph:
+            raise KeyError(node)
+        attributes = self._graph._nodeAttributes.get(node)
+        if attributes is None:
+            attributes = _NodeAttributes(self._graph._nodeAttributes, node, self._graph._defaultNodeAttributes)
+        return attributes
+
+    def __contains__(self, node):
+        return node in self._graph
+
+    def __iter__(self):
+        return self._graph.nodes_iter()
+
+
+class OverlayGraph(object):
+    '''
+    Directed graph that behaves like a `networkx.DiGraph` (1.x API) for the methods used during merger resolving,
+    backed by a `baseGraph` that must not be modified while the overlay is in use.
+
+    Edges are only given by their end points, and node attributes live in the overlay: nodes of the base graph
+    start out with the given `defaultNodeAttributes`.
+    '''
+
+    def __init__(self, baseGraph, **defaultNodeAttributes):
+        self._base = baseGraph
+        self._defaultNodeAttributes = defaultNodeAttributes
+        self._nodeAttributes = {}
+        self._addedNodes = set()
+        self._removedNodes = set()
+        self._addedSuccessors = {}
+        self._addedPredecessors = {}
+        self.node = _NodeAttributeView(self)
+
+    def copy(self):
+        '''
+        **returns** a new `OverlayGraph` on the same base graph, with a copy of this overlay's delta
+        '''
+        other = OverlayGraph(self._base, **self._defaultNodeAttributes)
+        for node, attributes in self._nodeAttributes.items():
+            other._nodeAttributes[node] = _NodeAttributes(other._nodeAttributes, node, attributes)
+        other._addedNodes = set(self._addedNodes)
+        other._removedNodes = set(self._removedNodes)
+        other._addedSuccessors = dict((n, set(s)) for n, s in self._addedSuccessors.items())
+        other._addedPredecessors = dict((n, set(p)) for n, p in self._addedPredecessors.items())
+        return other
+
+    def __contains__(self, node):
+        return node in self._addedNodes or (node not in self._removedNodes and node in self._base)
+
+    def has_node(self, node):
+        return node in self
+
+    def __len__(self):
+        return len(self._base) - len(self._removedNodes) + len([n for n in self._addedNodes if n not in self._base])
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def __iter__(self):
+        return self.nodes_iter()
+
+    def nodes_iter(self):
+        baseNodes = (n for n in self._base.nodes_iter() if n not in self._removedNodes and n not in self._addedNodes)
+        return itertools.chain(baseNodes, iter(self._addedNodes))
+
+    def nodes(self):
+        return list(self.nodes_iter())
+
+    def add_node(self, node, **attributes):
+        if node not in self:
+            self._addedNodes.add(node)
+            self._removedNodes.discard(node)
+        if len(attributes) > 0:
+            self.node[node].update(attributes)
+
+    def remove_node(self, node):
+        if node not in self:
+            raise KeyError("Node {} is not in the graph".format(node))
+        if node in self._base:
+            self._removedNodes.add(node)
+        self._addedNodes.discard(node)
+        self._nodeAttributes.pop(node, None)
+        # drop all edges to this node that were added in the overlay
+        for successor in self._addedSuccessors.pop(node, set()):
+            self._addedPredecessors[successor].discard(node)
+        for predecessor in self._addedPredecessors.pop(node, set()):
+            self._addedSuccessors[predecessor].discard(node)
+
+    def add_edge(self, source, target):
+        for node in [source, target]:
+            if node not in self:
+                self.add_node(node)
+        if self.has_edge(source, target):
+            return
+        self._addedSuccessors.setdefault(source, set()).add(target)
+        self._addedPredecessors.setdefault(target, set()).add(source)
+
+    def has_edge(self, source, target):
+        if source not in self or target not in self:
+            return False
+        return target in self._addedSuccessors.get(source, ()) or \
+            (source not in self._addedNodes and target not in self._addedNodes and self._base.has_edge(source, target))
+
+    def successors(self, node):
+        if node not in self:
+            raise KeyError("Node {} is not in the graph".format(node))
+        successors = list(self._addedSuccessors.get(node, ()))
+        if node not in self._addedNodes and node in self._base:
+            successors.extend(n for n in self._base.successors(node) if n in self and n not in self._addedNodes)
+        return successors
+
+    def predecessors(self, node):
+        if node not in self:
+            raise KeyError("Node {} is not in the graph".format(node))
+        predecessors = list(self._addedPredecessors.get(node, ()))
+        if node not in self._addedNodes and node in self._base:
+            predecessors.extend(n for n in self._base.predecessors(node) if n in self and n not in self._addedNodes)
+        return predecessors
+
+    def out_edges(self, node):
+        return [(node, s) for s in self.successors(node)]
+
+    def in_edges(self, node):
+        return [(p, node) for p in self.predecessors(node)]
+
+    def edges_iter(self):
+        for node in self.nodes_iter():
+            for successor in self.successors(node):
+                yield (node, successor)
+
+    def edges(self):
+        return list(self.edges_iter())
@@ -205,6 +205,10 @@ class DummyExecutor(object):
         ''' Returning false means exceptions are propagated as always '''
         return False
 
+    def shutdown(self, wait=True):
+        ''' nothing to clean up, the tasks were already run by `submit` '''
+        pass
+
     def submit(self, func, *args, **kwargs):
         # create a concurrent.futures.Future to store result
         f = concurrent.futures.Future()
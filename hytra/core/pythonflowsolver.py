@@ -0,0 +1,438 @@
+'''
+A pure Python min-cost flow solver for hypotheses graphs in our JSON format, following the ideas of
+[dpct](https://github.com/chaubold/dpct): every detection becomes a pair of nodes in a flow network,
+and the flow is increased unit by unit along shortest augmenting paths (successive shortest paths).
+
+It is much slower than dpct, but good enough for small and medium models, and does not need any compiled
+dependencies. Like dpct, it expects convex costs (see `hytra.core.jsongraph.JsonTrackingGraph.convexifyCosts`),
+and treats divisions greedily: a division can only be added to a detection that carries exactly one object,
+its children must be different detections, and while it is active the detection's value cannot change.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import heapq
+from collections import deque
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+_SOURCE = 0
+_TARGET = 1
+
+# arc types, needed to check the division constraints while searching for augmenting paths
+_OTHER_ARC = 0
+_DETECTION_ARC = 1
+_LINK_ARC = 2
+_DIVISION_ARC = 3
+
+def _hasDivisions(model):
+    return any('divisionFeatures' in d and d['divisionFeatures'] for d in model['segmentationHypotheses'])
+
+def _weightCategories(model):
+    ''' **returns** a list of `(category, numWeights)` tuples in the order of the weight vector '''
+    def dimension(key, hypotheses):
+        for h in hypotheses:
+            if key in h and h[key]:
+                return len(h[key][0])
+        return 1
+
+    categories = [('linking', dimension('features', model['linkingHypotheses'])),
+                  ('detection', dimension('features', model['segmentationHypotheses']))]
+    if _hasDivisions(model):
+        categories.append(('division', dimension('divisionFeatures', model['segmentationHypotheses'])))
+    categories.append(('appearance', dimension('appearanceFeatures', model['segmentationHypotheses'])))
+    categories.append(('disappearance', dimension('disappearanceFeatures', model['segmentationHypotheses'])))
+    return categories
+
+def statesShareWeights(model, weights):
+    '''
+    **returns** True if all states of a hypothesis share the same weights in the `model`, and `weights` contains
+    one weight per feature dimension of each category, such that it can be split by `splitWeights`
+    '''
+    if not model.get('settings', {}).get('statesShareWeights', True):
+        return False
+    return len(weights['weights']) == sum(d for _, d in _weightCategories(model))
+
+def splitWeights(model, weights):
+    '''
+    Split the weight vector into the weights of the transition, detection, (division,) appearance
+    and disappearance features, where each category gets as many weights as its features have dimensions.
+    Raises a `ValueError` if the weights cannot be split, see `statesShareWeights`.
+
+    **returns** a dictionary of weight lists by category
+    '''
+    if not model.get('settings', {}).get('statesShareWeights', True):
+        raise ValueError("The python flow solver only supports models where states share weights")
+
+    categories = _weightCategories(model)
+    w = list(weights['weights'])
+    if len(w) != sum(d for _, d in categories):
+        raise ValueError("Expected {} weights for this model, got {}".format(sum(d for _, d in categories), len(w)))
+
+    weightsPerCategory = {}
+    for name, d in categories:
+        weightsPerCategory[name] = w[:d]
+        w = w[d:]
+    return weightsPerCategory
+
+def stateEnergies(features, weights):
+    ''' **returns** the energy of each state, given its features and the weights of the respective category '''
+    return [sum(wi * fi for wi, fi in zip(weights, f)) for f in features]
+
+def _incrementalCosts(features, weights):
+    ''' **returns** the cost of each additional unit of flow, given the features of all states '''
+    stateCosts = stateEnergies(features, weights)
+    return [c - p for p, c in zip(stateCosts[:-1], stateCosts[1:])]
+
+class _FlowNetwork(object):
+    '''
+    Residual graph with unit capacity arcs, stored as flat lists. Arc `a ^ 1` is the reverse arc of arc `a`.
+    '''
+
+    def __init__(self):
+        self.numNodes = 2
+        self.outArcs = [[], []]
+        self.target = []
+        self.capacity = []
+        self.cost = []
+        self.arcType = []
+        # the detection (or link for link arcs) this arc belongs to
+        self.owner = []
+
+    def addNode(self):
+        self.outArcs.append([])
+        self.numNodes += 1
+        return self.numNodes - 1
+
+    def addArc(self, source, target, cost, arcType=_OTHER_ARC, owner=None, capacity=1):
+        for s, t, c, cap in [(source, target, cost, capacity), (target, source, -cost, 0)]:
+            self.outArcs[s].append(len(self.target))
+            self.target.append(t)
+            self.capacity.append(cap)
+            self.cost.append(c)
+            self.arcType.append(arcType)
+            self.owner.append(owner)
+        return len(self.target) - 2
+
+    def flow(self, arc):
+        ''' flow along the forward `arc` equals the residual capacity of its reverse arc '''
+        return self.capacity[arc ^ 1]
+
+class _Solver(object):
+    def __init__(self, model, weights):
+        self.model = model
+        w = splitWeights(model, weights)
+        self.network = _FlowNetwork()
+        net = self.network
+
+        self.detectionArcs = {}
+        self.appearanceArcs = {}
+        self.disappearanceArcs = {}
+        self.divisionArcs = {}
+        self.outNodes = {}
+        inNodes = {}
+        for d in model['segmentationHypotheses']:
+            uuid = d['id']
+            inNode = net.addNode()
+            outNode = net.addNode()
+            inNodes[uuid] = inNode
+            self.outNodes[uuid] = outNode
+            self.detectionArcs[uuid] = [net.addArc(inNode, outNode, c, _DETECTION_ARC, uuid)
+                                        for c in _incrementalCosts(d['features'], w['detection'])]
+            if d.get('appearanceFeatures'):
+                self.appearanceArcs[uuid] = [net.addArc(_SOURCE, inNode, c)
+                                             for c in _incrementalCosts(d['appearanceFeatures'], w['appearance'])]
+            if d.get('disappearanceFeatures'):
+                self.disappearanceArcs[uuid] = [net.addArc(outNode, _TARGET, c)
+                                                for c in _incrementalCosts(d['disappearanceFeatures'], w['disappearance'])]
+            if d.get('divisionFeatures'):
+                self.divisionArcs[uuid] = net.addArc(_SOURCE, outNode, _incrementalCosts(d['divisionFeatures'], w['division'])[0],
+                                                     _DIVISION_ARC, uuid)
+
+        self.linkArcs = []
+        for i, l in enumerate(model['linkingHypotheses']):
+            self.linkArcs.append([net.addArc(self.outNodes[l['src']], inNodes[l['dest']], c, _LINK_ARC, i)
+                                  for c in _incrementalCosts(l['features'], w['linking'])])
+
+        if len(model.get('divisionHypotheses', [])) > 0:
+            getLogger().warning("The python flow solver ignores explicit division hypotheses")
+
+    def _detectionValue(self, uuid):
+        return sum(self.network.flow(a) for a in self.detectionArcs[uuid])
+
+    def _linkValue(self, linkIndex):
+        return sum(self.network.flow(a) for a in self.linkArcs[linkIndex])
+
+    def _isDividing(self, uuid):
+        return uuid in self.divisionArcs and self.network.flow(self.divisionArcs[uuid]) > 0
+
+    def _isUsable(self, arc):
+        ''' check the division constraints for the residual `arc` with the current flow '''
+        net = self.network
+        arcType = net.arcType[arc]
+        if arcType == _OTHER_ARC:
+            return True
+        owner = net.owner[arc]
+        forward = arc % 2 == 0
+        if arcType == _DETECTION_ARC:
+            return not self._isDividing(owner)
+        if arcType == _DIVISION_ARC:
+            return not forward or self._detectionValue(owner) == 1
+        # link arcs: the children of a division must be different detections
+        src = self.model['linkingHypotheses'][owner]['src']
+        return not forward or not self._isDividing(src) or self._linkValue(owner) == 0
+
+    def _initializePotentials(self):
+        '''
+        The initial network is acyclic, so we get the shortest distances from the source by processing the nodes
+        in topological order. These serve as node potentials, which make (almost) all reduced arc costs non-negative.
+        '''
+        net = self.network
+        numIncomingArcs = [0] * net.numNodes
+        for a in range(0, len(net.target), 2):
+            numIncomingArcs[net.target[a]] += 1
+        self.potentials = [0.0] * net.numNodes
+        reached = [False] * net.numNodes
+        reached[_SOURCE] = True
+        queue = deque(n for n in range(net.numNodes) if numIncomingArcs[n] == 0)
+        while queue:
+            node = queue.popleft()
+            for a in net.outArcs[node]:
+                if a % 2 == 1:
+                    continue
+                t = net.target[a]
+                if reached[node] and (not reached[t] or self.potentials[node] + net.cost[a] < self.potentials[t]):
+                    self.potentials[t] = self.potentials[node] + net.cost[a]
+                    reached[t] = True
+                numIncomingArcs[t] -= 1
+                if numIncomingArcs[t] == 0:
+                    queue.append(t)
+
+    def _shortestAugmentingPath(self):
+        '''
+        Find the cheapest path from source to target in the residual graph using Dijkstra's algorithm on the reduced costs.
+        Arcs that become usable due to a division can still have negative reduced costs, so nodes may be visited again
+        if their distance improves.
+
+        **returns** a tuple of the path's cost and its list of arcs, or `(None, None)` if there is no path
+        '''
+        net = self.network
+        potentials = self.potentials
+        distance = [None] * net.numNodes
+        predecessorArc = [None] * net.numNodes
+        numUpdates = [0] * net.numNodes
+        distance[_SOURCE] = 0.0
+        heap = [(0.0, _SOURCE)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > distance[node]:
+                continue
+            for a in net.outArcs[node]:
+                if net.capacity[a] == 0:
+                    continue
+                t = net.target[a]
+                newDistance = d + net.cost[a] + potentials[node] - potentials[t]
+                if (distance[t] is None or newDistance < distance[t] - 1e-12) and \
+                        (net.arcType[a] == _OTHER_ARC or self._isUsable(a)):
+                    numUpdates[t] += 1
+                    if numUpdates[t] > net.numNodes:
+                        getLogger().warning("Found a negative cycle in the residual graph, stopping early")
+                        return None, None
+                    distance[t] = newDistance
+                    predecessorArc[t] = a
+                    heapq.heappush(heap, (newDistance, t))
+
+        if distance[_TARGET] is None:
+            return None, None
+        cost = distance[_TARGET] - potentials[_SOURCE] + potentials[_TARGET]
+
+        # update the potentials such that the reduced costs of the new residual graph are non-negative again
+        for n in range(net.numNodes):
+            if distance[n] is None or distance[n] > distance[_TARGET]:
+                potentials[n] += distance[_TARGET]
+            else:
+                potentials[n] += distance[n]
+
+        path = []
+        node = _TARGET
+        while node != _SOURCE:
+            a = predecessorArc[node]
+            path.append(a)
+            node = net.target[a ^ 1]
+        return cost, path
+
+    def solve(self, maxFlow=False):
+        '''
+        Augment flow along shortest paths as long as this decreases the cost, or, if `maxFlow=True`,
+        as long as there is any augmenting path, which yields the cheapest of all maximum flows.
+        '''
+        net = self.network
+        self._initializePotentials()
+        numAugmentations = 0
+        while True:
+            cost, path = self._shortestAugmentingPath()
+            if path is None or (not maxFlow and cost >= 0):
+                break
+            for a in path:
+                net.capacity[a] -= 1
+                net.capacity[a ^ 1] += 1
+            numAugmentations += 1
+        getLogger().debug("Found solution after {} augmentations".format(numAugmentations))
+        return self._getResult()
+
+    def _pushFlow(self, arcs, value):
+        ''' send `value` units along the given parallel unit arcs, cheapest first, **returns** False if that is not possible '''
+        if value < 0 or value > len(arcs):
+            return False
+        for a in arcs[:value]:
+            self.network.capacity[a] -= 1
+            self.network.capacity[a ^ 1] += 1
+        return True
+
+    def setInitialFlow(self, initialResult):
+        '''
+        Use the detection, link and division values of `initialResult` as initial flow. Hypotheses that are not part
+        of `initialResult` start with value zero.
+
+        **returns** False if the values do not form a valid flow in this model, then the flow is left in an undefined state
+        '''
+        detectionValues = dict((d['id'], d['value']) for d in initialResult['detectionResults'])
+        linkValues = dict(((l['src'], l['dest']), l['value']) for l in initialResult['linkingResults'])
+        divisionValues = dict((d['id'], d['value']) for d in (initialResult.get('divisionResults') or []))
+
+        inflow = {}
+        outflow = {}
+        for i, l in enumerate(self.model['linkingHypotheses']):
+            value = int(linkValues.get((l['src'], l['dest']), 0))
+            if not self._pushFlow(self.linkArcs[i], value):
+                return False
+            outflow[l['src']] = outflow.get(l['src'], 0) + value
+            inflow[l['dest']] = inflow.get(l['dest'], 0) + value
+
+        totalFlow = 0
+        for d in self.model['segmentationHypotheses']:
+            uuid = d['id']
+            value = int(detectionValues.get(uuid, 0))
+            dividing = 0
+            if divisionValues.get(uuid, False) and uuid in self.divisionArcs and value == 1:
+                dividing = 1
+                self._pushFlow([self.divisionArcs[uuid]], 1)
+            numAppearing = value - inflow.get(uuid, 0)
+            if not self._pushFlow(self.detectionArcs[uuid], value) \
+                    or not self._pushFlow(self.appearanceArcs.get(uuid, []), numAppearing) \
+                    or not self._pushFlow(self.disappearanceArcs.get(uuid, []), value + dividing - outflow.get(uuid, 0)):
+                return False
+            totalFlow += numAppearing + dividing
+
+        # close the flow to a circulation, such that the optimal solution has no negative cycles in the residual graph
+        capacity = sum(len(a) for a in self.appearanceArcs.values()) + len(self.divisionArcs)
+        a = self.network.addArc(_TARGET, _SOURCE, 0.0, capacity=capacity)
+        self.network.capacity[a] -= totalFlow
+        self.network.capacity[a ^ 1] += totalFlow
+        return True
+
+    def _findPredecessorCycle(self, predecessorArc):
+        ''' **returns** the arcs of a cycle in the graph spanned by the predecessor arcs, or None '''
+        net = self.network
+        visitedBy = [None] * net.numNodes
+        for start in range(net.numNodes):
+            node = start
+            while node is not None and visitedBy[node] is None:
+                visitedBy[node] = start
+                node = None if predecessorArc[node] is None else net.target[predecessorArc[node] ^ 1]
+            if node is not None and visitedBy[node] == start:
+                cycle = []
+                current = node
+                while True:
+                    a = predecessorArc[current]
+                    cycle.append(a)
+                    current = net.target[a ^ 1]
+                    if current == node:
+                        return cycle
+        return None
+
+    def _findNegativeCycle(self):
+        '''
+        Run Bellman-Ford from all nodes at once, and regularly check whether the predecessor arcs contain a cycle,
+        which must then have negative cost.
+
+        **returns** the arcs of a negative cycle in the residual graph, or None
+        '''
+        net = self.network
+        distance = [0.0] * net.numNodes
+        predecessorArc = [None] * net.numNodes
+        inQueue = [True] * net.numNodes
+        queue = deque(range(net.numNodes))
+        numRelaxations = 0
+        while queue:
+            node = queue.popleft()
+            inQueue[node] = False
+            for a in net.outArcs[node]:
+                if net.capacity[a] == 0:
+                    continue
+                t = net.target[a]
+                newDistance = distance[node] + net.cost[a]
+                if newDistance < distance[t] - 1e-9 and (net.arcType[a] == _OTHER_ARC or self._isUsable(a)):
+                    distance[t] = newDistance
+                    predecessorArc[t] = a
+                    numRelaxations += 1
+                    if numRelaxations % net.numNodes == 0:
+                        cycle = self._findPredecessorCycle(predecessorArc)
+                        if cycle is not None:
+                            return cycle
+                    if not inQueue[t]:
+                        inQueue[t] = True
+                        queue.append(t)
+        return self._findPredecessorCycle(predecessorArc)
+
+    def solveFromInitialFlow(self):
+        '''
+        Improve the flow set by `setInitialFlow` by canceling negative cycles until there are none left,
+        which is fast if only few values change.
+        '''
+        net = self.network
+        numCanceledCycles = 0
+        while True:
+            cycle = self._findNegativeCycle()
+            if cycle is None or sum(net.cost[a] for a in cycle) > -1e-9:
+                break
+            for a in cycle:
+                net.capacity[a] -= 1
+                net.capacity[a ^ 1] += 1
+            numCanceledCycles += 1
+        getLogger().info("Warm start: improved the initial solution by canceling {} negative cycles".format(numCanceledCycles))
+        return self._getResult()
+
+    def _getResult(self):
+        result = {
+            'detectionResults': [{'id': d['id'], 'value': self._detectionValue(d['id'])} for d in self.model['segmentationHypotheses']],
+            'linkingResults': [{'src': l['src'], 'dest': l['dest'], 'value': self._linkValue(i)}
+                               for i, l in enumerate(self.model['linkingHypotheses'])],
+            'divisionResults': None
+        }
+        if len(self.divisionArcs) > 0:
+            result['divisionResults'] = [{'id': uuid, 'value': self._isDividing(uuid)} for uuid in self.divisionArcs]
+        return result
+
+def trackFlowBased(model, weights, initialResult=None):
+    '''
+    Find the minimum cost solution of the `model` with the given `weights`, drop-in replacement for `dpct.trackFlowBased`.
+
+    If a result of a previous run is given as `initialResult`, it is used as initial flow,
+    which is a lot faster than starting from scratch if only few values change.
+    '''
+    solver = _Solver(model, weights)
+    if initialResult is not None:
+        if solver.setInitialFlow(initialResult):
+            return solver.solveFromInitialFlow()
+        getLogger().warning("The initial result is not a valid solution of the model, solving from scratch")
+        solver = _Solver(model, weights)
+    return solver.solve()
+
+def trackMaxFlow(model, weights):
+    '''
+    Find the cheapest maximum flow through the `model`, drop-in replacement for `dpct.trackMaxFlow`
+    as used during merger resolving
+    '''
+    return _Solver(model, weights).solve(maxFlow=True)
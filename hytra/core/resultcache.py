@@ -0,0 +1,126 @@
+'''
+On-disk cache of tracking results, such that re-running the tracking on the same model and weights
+(e.g. while only changing export settings) does not solve the model again.
+
+Results are stored as HDF5 files (see `hytra.core.binarygraph`) named after a fingerprint of everything that
+determines the solution: the hypotheses, exclusions, divisions and settings of the model, the weights and the solver.
+The cache is bounded in size, if it grows too large the least recently used results are removed.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import hashlib
+import json
+import logging
+import os
+import time
+from hytra.core.binarygraph import writeToHDF5, readFromHDF5
+import hytra.core.solvers
+
+# the parts of a model that influence the tracking result
+_MODEL_SECTIONS = ['segmentationHypotheses', 'linkingHypotheses', 'exclusions', 'divisionHypotheses', 'settings']
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def _canonical(value):
+    # sets (e.g. the detections contained in a tracklet of the stitching model) are sorted,
+    # numpy scalars and arrays get the same representation as the numbers and lists they compare equal to
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return value.tolist()
+
+def _toJson(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), default=_canonical)
+
+def fingerprint(model, weights, solver):
+    '''
+    Hash the relevant sections of the `model`, the `weights` and the name of the `solver`,
+    independent of the order of dictionary keys. Hypotheses are hashed one by one so that
+    we never need the JSON string of the whole model in memory.
+
+    **returns** the hexadecimal SHA-256 digest
+    '''
+    h = hashlib.sha256()
+    h.update(_toJson(solver).encode('utf-8'))
+    h.update(_toJson(weights).encode('utf-8'))
+    for section in _MODEL_SECTIONS:
+        value = model.get(section)
+        h.update(_toJson(section).encode('utf-8'))
+        if isinstance(value, list):
+            h.update(_toJson(len(value)).encode('utf-8'))
+            for entry in value:
+                h.update(_toJson(entry).encode('utf-8'))
+        else:
+            h.update(_toJson(value).encode('utf-8'))
+    return h.hexdigest()
+
+class ResultCache(object):
+    '''
+    A directory of cached results that holds at most `maxSizeInBytes`. The modification time of each file
+    records when it was last used, so several processes can share one cache directory.
+    '''
+    def __init__(self, directory, maxSizeInBytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.maxSizeInBytes = maxSizeInBytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + '.h5')
+
+    def get(self, key):
+        ''' **returns** the result stored under `key`, or None if there is none '''
+        filename = self._filename(key)
+        try:
+            result = readFromHDF5(filename)
+            os.utime(filename, None)
+        except (IOError, OSError):
+            # not cached, or evicted by another process in the meantime
+            return None
+        return result
+
+    def put(self, key, result):
+        ''' store the `result` under `key` and evict the least recently used results if the cache is too large '''
+        filename = self._filename(key)
+        temporaryFilename = '{}.{}.tmp'.format(filename, os.getpid())
+        writeToHDF5(temporaryFilename, result)
+        os.replace(temporaryFilename, filename)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.h5'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        totalSize = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if totalSize <= self.maxSizeInBytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                getLogger().debug("Evicted cached result {}".format(name))
+            except OSError:
+                pass
+            totalSize -= size
+
+    def solve(self, model, weights, solver='flow-based', warmStart=None):
+        '''
+        Return the cached result for this model, weights and solver, or solve it with `hytra.core.solvers.solve`
+        and store the result.
+        '''
+        start = time.time()
+        key = fingerprint(model, weights, solver)
+        result = self.get(key)
+        if result is not None:
+            getLogger().info("Using cached result {} for {} detections, lookup took {:.3f} seconds".format(
+                key[:12], len(model['segmentationHypotheses']), time.time() - start))
+            return result
+        result = hytra.core.solvers.solve(model, weights, solver, warmStart)
+        self.put(key, result)
+        return result
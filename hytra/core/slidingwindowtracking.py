@@ -0,0 +1,185 @@
+'''
+Track long movies in overlapping windows of frames, directly on a hypotheses graph in our JSON format.
+
+Window `i+1` starts `overlap` frames before window `i` ends. All detections, links and divisions in the overlap
+were already decided in window `i`, and are fixed to these values in window `i+1` by making all other states
+prohibitively expensive. Thus the tracks of consecutive windows connect, while window `i+1` can still decide
+how the tracks continue after the overlap.
+
+Windows are solved one after another, and the result of each window is yielded as soon as it is final,
+so that only one window model and the fixed values of one overlap are kept in memory besides the input model.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import hytra.core.jsongraph
+from hytra.core.componentdecomposition import mergeResults
+from hytra.core.solvers import solve
+
+# cost per object that a state differs from the fixed one, assuming positive weights
+_FIXED_VARIABLE_COST = 1e6
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def getWindows(firstFrame, lastFrame, windowLength, overlap):
+    '''
+    Cover the frames `firstFrame` to `lastFrame` (inclusive) by windows of `windowLength` frames,
+    where consecutive windows share `overlap` frames.
+
+    **returns** a list of `(start, end)` tuples, where `end` is exclusive
+    '''
+    assert 0 < overlap < windowLength, "The overlap must contain at least one frame and be shorter than a window"
+    windows = []
+    start = firstFrame
+    while True:
+        end = min(start + windowLength, lastFrame + 1)
+        windows.append((start, end))
+        if end > lastFrame:
+            break
+        start = end - overlap
+    return windows
+
+def _fixedFeatures(features, value):
+    '''
+    **returns** features where the cost of every state grows with its distance to `value`, such that all other states
+    are prohibitively expensive while the costs stay convex (as required by the flow-based solvers)
+    '''
+    return [[_FIXED_VARIABLE_COST * abs(state - value)] * len(f) for state, f in enumerate(features)]
+
+def _freeBoundaryFeatures(numStates):
+    ''' appearance or disappearance features that are (almost) free, like at the borders of `SplitTracking` submodels '''
+    return [[0.0000001 * sum(range(i+1))] for i in range(numStates)]
+
+class SlidingWindowTracking(object):
+    '''
+    Tracks a `model` in overlapping windows with the given `weights` and `solver`
+    (see `hytra.core.solvers`).
+
+    Use `track()` to get the results window by window, or `trackWithSlidingWindow` to get the full result at once.
+    '''
+
+    def __init__(self, model, weights, windowLength, overlap=1, solver='flow-based'):
+        self.model = model
+        self.weights = weights
+        self.solver = solver
+
+        # index detections and links by frame, such that building a window model never needs to scan the full model
+        uuidToTraxelMap = hytra.core.jsongraph.UuidTraxelMapping.fromModel(model)
+        self._frameOfDetection = {}
+        self._detectionsPerFrame = {}
+        for d in model['segmentationHypotheses']:
+            frame = int(uuidToTraxelMap[d['id']][0][0])
+            self._frameOfDetection[d['id']] = frame
+            self._detectionsPerFrame.setdefault(frame, []).append(d)
+        self._linksPerSourceFrame = {}
+        for l in model['linkingHypotheses']:
+            self._linksPerSourceFrame.setdefault(self._frameOfDetection[l['src']], []).append(l)
+        # explicit division hypotheses and exclusions are indexed by the last frame of the detections they contain
+        self._divisionsPerLastFrame = {}
+        for d in model.get('divisionHypotheses', []):
+            lastFrame = max(self._frameOfDetection[u] for u in [d['parent']] + list(d['children']))
+            self._divisionsPerLastFrame.setdefault(lastFrame, []).append(d)
+        self._exclusionsPerLastFrame = {}
+        for e in model.get('exclusions', []):
+            if len(e) > 0:
+                self._exclusionsPerLastFrame.setdefault(max(self._frameOfDetection[u] for u in e), []).append(e)
+
+        self.firstFrame = min(self._detectionsPerFrame.keys())
+        self.lastFrame = max(self._detectionsPerFrame.keys())
+        self.windows = getWindows(self.firstFrame, self.lastFrame, windowLength, overlap)
+
+    def _getWindowModel(self, start, end, fixedDetections, fixedLinks, fixedDivisions):
+        '''
+        Build the model of the window from frame `start` to `end` (exclusive), where the values of the
+        given detections, links (by `(src, dest)`) and divisions are fixed.
+        Explicit division hypotheses and exclusions are kept if all their detections are inside the window,
+        division hypotheses are not fixed as they follow from the fixed links to the children.
+        '''
+        segmentationHypotheses = []
+        linkingHypotheses = []
+        divisionHypotheses = []
+        exclusions = []
+        for f in range(start, end):
+            for d in self._detectionsPerFrame.get(f, []):
+                newD = dict(d)
+                # tracks may continue before and after the window
+                if f == start and f != self.firstFrame:
+                    newD['appearanceFeatures'] = _freeBoundaryFeatures(len(d['features']))
+                if f + 1 == end and f != self.lastFrame:
+                    newD['disappearanceFeatures'] = _freeBoundaryFeatures(len(d['features']))
+                if d['id'] in fixedDetections:
+                    newD['features'] = _fixedFeatures(d['features'], fixedDetections[d['id']])
+                if d['id'] in fixedDivisions and 'divisionFeatures' in d:
+                    newD['divisionFeatures'] = _fixedFeatures(d['divisionFeatures'], int(fixedDivisions[d['id']]))
+                segmentationHypotheses.append(newD)
+
+            for l in self._linksPerSourceFrame.get(f, []):
+                if self._frameOfDetection[l['dest']] < end:
+                    if (l['src'], l['dest']) in fixedLinks:
+                        l = dict(l)
+                        l['features'] = _fixedFeatures(l['features'], fixedLinks[(l['src'], l['dest'])])
+                    linkingHypotheses.append(l)
+
+            divisionHypotheses.extend(d for d in self._divisionsPerLastFrame.get(f, [])
+                                      if self._frameOfDetection[d['parent']] >= start)
+            exclusions.extend(e for e in self._exclusionsPerLastFrame.get(f, [])
+                              if min(self._frameOfDetection[u] for u in e) >= start)
+
+        return {'segmentationHypotheses': segmentationHypotheses,
+                'linkingHypotheses': linkingHypotheses,
+                'divisionHypotheses': divisionHypotheses,
+                'exclusions': exclusions,
+                'settings': self.model.get('settings', {})}
+
+    def track(self):
+        '''
+        Solve all windows one after another.
+
+        **returns** a generator of `(firstFrame, lastFrame, result)` tuples, one per window, where `result` contains
+        the final values of all detections and divisions from `firstFrame` to `lastFrame` (exclusive),
+        and of all links starting in these frames
+        '''
+        fixedDetections = {}
+        fixedLinks = {}
+        fixedDivisions = {}
+
+        for i, (start, end) in enumerate(self.windows):
+            getLogger().info("Tracking window {}/{} from t={} to t={}".format(i + 1, len(self.windows), start, end))
+            windowModel = self._getWindowModel(start, end, fixedDetections, fixedLinks, fixedDivisions)
+            result = solve(windowModel, self.weights, self.solver)
+            del windowModel
+
+            # values in the overlap with the next window are fixed there, and become final in the next window
+            commitEnd = self.windows[i + 1][0] if i + 1 < len(self.windows) else end
+            isCommitted = lambda uuid: self._frameOfDetection[uuid] < commitEnd
+            isInOverlap = lambda uuid: self._frameOfDetection[uuid] >= commitEnd
+
+            detectionValues = dict((d['id'], d['value']) for d in result['detectionResults'])
+            fixedDetections = dict((uuid, v) for uuid, v in detectionValues.items() if isInOverlap(uuid))
+            fixedLinks = dict(((l['src'], l['dest']), l['value']) for l in result['linkingResults'] if isInOverlap(l['src']))
+            # the children of divisions in the last frame of the window are not part of the window yet
+            divisionResults = result.get('divisionResults') or []
+            fixedDivisions = dict((d['id'], d['value']) for d in divisionResults
+                                  if isInOverlap(d['id']) and self._frameOfDetection[d['id']] + 1 < end)
+
+            committedResult = {
+                'detectionResults': [d for d in result['detectionResults'] if isCommitted(d['id'])],
+                'linkingResults': [l for l in result['linkingResults'] if isCommitted(l['src'])],
+                'divisionResults': [d for d in divisionResults if isCommitted(d['id'])] if result.get('divisionResults') is not None else None
+            }
+            # links that skip more frames than the overlap are not part of any window
+            for f in range(start, commitEnd):
+                for l in self._linksPerSourceFrame.get(f, []):
+                    if self._frameOfDetection[l['dest']] >= end:
+                        committedResult['linkingResults'].append({'src': l['src'], 'dest': l['dest'], 'value': 0})
+            yield start, commitEnd, committedResult
+
+def trackWithSlidingWindow(model, weights, windowLength, overlap=1, solver='flow-based'):
+    '''
+    Track the `model` in overlapping windows of `windowLength` frames, see `SlidingWindowTracking`.
+
+    **returns** the result for the full model
+    '''
+    slidingWindowTracking = SlidingWindowTracking(model, weights, windowLength, overlap, solver)
+    return mergeResults(result for _, _, result in slidingWindowTracking.track())
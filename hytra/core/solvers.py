@@ -0,0 +1,111 @@
+'''
+Registry of the tracking solvers that can be used by name throughout hytra, e.g. by the pipeline scripts,
+`SplitTracking` and merger resolving. Each solver is a function `solve(model, weights)` that returns
+a result dictionary in our JSON format.
+
+The built-in solvers are
+
+* `flow-based`: `dpct.trackFlowBased`
+* `max-flow`: `dpct.trackMaxFlow`, used for merger resolving
+* `ilp`: `multiHypoTracking` with CPLEX or Gurobi
+* `python-flow` and `python-max-flow`: the pure Python equivalents of the two dpct solvers
+  in `hytra.core.pythonflowsolver`, which need no compiled dependencies but are slower.
+
+Solvers are imported lazily, so all solvers are listed even if their modules are not installed.
+
+Solvers that support warm starts take the result of a previous run as third argument `initialResult`,
+see `hytra.core.warmstart`. Of the built-in solvers, only `python-flow` does.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import time
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+_solvers = {}
+_warmStartSolvers = set()
+
+def registerSolver(name, solveFunction, supportsWarmStart=False):
+    '''
+    Make `solveFunction(model, weights)` available under the given `name`, replacing any solver of that name.
+    If `supportsWarmStart=True`, the function must accept a previous result as third argument.
+    Worker processes look up solvers by name, so solvers registered at runtime are only known to them
+    if the processes are forked after registering.
+    '''
+    _solvers[name] = solveFunction
+    if supportsWarmStart:
+        _warmStartSolvers.add(name)
+    else:
+        _warmStartSolvers.discard(name)
+
+def getSolverNames():
+    ''' **returns** the sorted names of all registered solvers '''
+    return sorted(_solvers.keys())
+
+def getSolver(name):
+    ''' **returns** the solve function registered under `name` '''
+    try:
+        return _solvers[name]
+    except KeyError:
+        raise ValueError("Unknown solver {}, choose one of {}".format(name, getSolverNames()))
+
+def supportsWarmStart(name):
+    ''' **returns** whether the solver registered under `name` can start from a previous result '''
+    getSolver(name)
+    return name in _warmStartSolvers
+
+def solve(model, weights, solver='flow-based', warmStart=None, cache=None):
+    '''
+    Track the `model` with the given `weights` using the solver registered under the name `solver`,
+    and log how long it took. If a `hytra.core.warmstart.WarmStart` is given, it is used to
+    only re-solve what changed since the previous run. If a `hytra.core.resultcache.ResultCache` is given,
+    the result is taken from there if this model was solved before.
+
+    **returns** the result dictionary
+    '''
+    if cache is not None:
+        return cache.solve(model, weights, solver, warmStart)
+    if warmStart is not None:
+        return warmStart.solve(model, weights, solver)
+    solveFunction = getSolver(solver)
+    start = time.time()
+    result = solveFunction(model, weights)
+    getLogger().info("Solver {} took {:.3f} seconds for {} detections and {} links".format(solver,
+                                                                                         time.time() - start,
+                                                                                         len(model['segmentationHypotheses']),
+                                                                                         len(model['linkingHypotheses'])))
+    return result
+
+def _trackFlowBasedWithDpct(model, weights):
+    import dpct
+    return dpct.trackFlowBased(model, weights)
+
+def _trackMaxFlowWithDpct(model, weights):
+    import dpct
+    return dpct.trackMaxFlow(model, weights)
+
+def _trackWithIlp(model, weights):
+    try:
+        import multiHypoTracking_with_cplex as mht
+    except ImportError:
+        try:
+            import multiHypoTracking_with_gurobi as mht
+        except ImportError:
+            raise ImportError("Could not find multi hypotheses tracking ilp solver")
+    return mht.track(model, weights)
+
+def _trackFlowBasedWithPython(model, weights, initialResult=None):
+    from hytra.core.pythonflowsolver import trackFlowBased
+    return trackFlowBased(model, weights, initialResult)
+
+def _trackMaxFlowWithPython(model, weights):
+    from hytra.core.pythonflowsolver import trackMaxFlow
+    return trackMaxFlow(model, weights)
+
+registerSolver('flow-based', _trackFlowBasedWithDpct)
+registerSolver('max-flow', _trackMaxFlowWithDpct)
+registerSolver('ilp', _trackWithIlp)
+registerSolver('python-flow', _trackFlowBasedWithPython, supportsWarmStart=True)
+registerSolver('python-max-flow', _trackMaxFlowWithPython)
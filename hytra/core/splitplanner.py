@@ -0,0 +1,129 @@
+'''
+Chooses the frames at which `hytra.core.splittracking.SplitTracking` cuts a hypotheses graph into submodels.
+
+A cut after frame `t` is cheap if few links cross it, and if these links are unlikely to be active,
+because every active link across the cut splits a tracklet that has to be stitched together again.
+Cutting right next to a division is expensive as well, as the stitching model contains no divisions.
+Submodels are balanced by their number of detections and links instead of their number of frames,
+such that all workers get a similar amount of work.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import numpy as np
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def _hypothesisScore(features):
+    '''
+    Every hypothesis counts once, plus the amount by which using it is cheaper than not using it
+    (looking at the first feature of the states 0 and 1, like the rest of split tracking does)
+    '''
+    return 1.0 + max(0.0, features[0][0] - features[1][0])
+
+class SplitPlanner(object):
+    '''
+    Scores all possible cut frames of a model once, and then plans split points for any number of splits.
+
+    A split point `t` means that one submodel ends with frame `t` and the next one starts at `t+1`.
+    '''
+
+    def __init__(self, model, uuidToTraxelMap, crossingLinkWeight=1.0, divisionWeight=1.0, divisionRadius=1, border=10):
+        '''
+        Set up the planner for a `model` in our JSON format, where `uuidToTraxelMap` is its
+        `hytra.core.jsongraph.UuidTraxelMapping`.
+
+        `crossingLinkWeight` and `divisionWeight` weigh the crossing links and the divisions whose parent
+        is at most `divisionRadius` frames away from a cut. Split points are searched within `border` frames
+        around the location that would balance the submodels perfectly.
+        '''
+        self.crossingLinkWeight = crossingLinkWeight
+        self.divisionWeight = divisionWeight
+        self.divisionRadius = divisionRadius
+        self.border = border
+
+        frameOfDetection = {}
+        for d in model['segmentationHypotheses']:
+            frameOfDetection[d['id']] = int(uuidToTraxelMap[d['id']][0][0])
+        self.firstFrame = min(frameOfDetection.values())
+        self.lastFrame = max(frameOfDetection.values())
+        numFrames = self.lastFrame - self.firstFrame + 1
+
+        # the work per frame: detections in this frame and links starting here
+        self._loadPerFrame = np.zeros(numFrames)
+        # the score of cutting between frame t and t+1 is stored at index t - firstFrame
+        self._crossingLinkScores = np.zeros(numFrames)
+        self._divisionScoresPerFrame = np.zeros(numFrames)
+        self._crossingLinkIndices = {}
+
+        for d in model['segmentationHypotheses']:
+            t = frameOfDetection[d['id']] - self.firstFrame
+            self._loadPerFrame[t] += 1
+            if 'divisionFeatures' in d:
+                self._divisionScoresPerFrame[t] += _hypothesisScore(d['divisionFeatures'])
+
+        for d in model.get('divisionHypotheses', []):
+            self._divisionScoresPerFrame[frameOfDetection[d['parent']] - self.firstFrame] += _hypothesisScore(d['features'])
+
+        for i, l in enumerate(model['linkingHypotheses']):
+            srcFrame = frameOfDetection[l['src']]
+            destFrame = frameOfDetection[l['dest']]
+            self._loadPerFrame[srcFrame - self.firstFrame] += 1
+            score = _hypothesisScore(l['features'])
+            # links that span several frames cross all cuts in between
+            for t in range(srcFrame, destFrame):
+                self._crossingLinkScores[t - self.firstFrame] += score
+                self._crossingLinkIndices.setdefault(t, []).append(i)
+
+    def cutScore(self, t):
+        '''
+        **returns** the score of cutting between frame `t` and `t+1`, lower is better
+        '''
+        idx = t - self.firstFrame
+        lo = max(0, idx - self.divisionRadius)
+        hi = min(len(self._divisionScoresPerFrame), idx + self.divisionRadius + 1)
+        return self.crossingLinkWeight * self._crossingLinkScores[idx] \
+            + self.divisionWeight * np.sum(self._divisionScoresPerFrame[lo:hi])
+
+    def crossingLinkIndices(self, t):
+        '''
+        **returns** the indices (in the `linkingHypotheses` of the model) of all links crossing the cut between
+        frame `t` and `t+1`, including links that skip frames
+        '''
+        return self._crossingLinkIndices.get(t, [])
+
+    def planSplits(self, numSplits, minFramesPerSplit=3):
+        '''
+        Find `numSplits - 1` split points such that all submodels contain roughly the same number of detections
+        and links, and the cuts have low scores. Fewer split points are returned if there are not enough frames
+        to give each submodel at least `minFramesPerSplit` frames.
+
+        **returns** a sorted list of split points, which is empty if the model should not be split at all
+        '''
+        numFrames = self.lastFrame - self.firstFrame + 1
+        numSplits = min(numSplits, numFrames // minFramesPerSplit)
+        if numSplits < 2:
+            return []
+
+        cumulativeLoad = np.cumsum(self._loadPerFrame)
+        loadPerSplit = cumulativeLoad[-1] / numSplits
+        border = min(self.border, max(1, (numFrames // numSplits) // 4))
+
+        splitPoints = []
+        previousSplitPoint = self.firstFrame - 1
+        for s in range(1, numSplits):
+            targetLoad = s * loadPerSplit
+            desiredSplitPoint = self.firstFrame + int(np.searchsorted(cumulativeLoad, targetLoad))
+            # leave enough frames for the previous and all remaining submodels
+            lo = max(previousSplitPoint + minFramesPerSplit, desiredSplitPoint - border)
+            hi = min(self.lastFrame - (numSplits - s) * minFramesPerSplit, desiredSplitPoint + border)
+            if lo > hi:
+                continue
+            splitPoint = min(range(lo, hi + 1),
+                             key=lambda t: (self.cutScore(t), abs(cumulativeLoad[t - self.firstFrame] - targetLoad)))
+            splitPoints.append(splitPoint)
+            previousSplitPoint = splitPoint
+
+        getLogger().debug("Planned split points {} with scores {}".format(splitPoints, [self.cutScore(t) for t in splitPoints]))
+        return splitPoints
@@ -13,15 +13,34 @@ except ImportError:
     import json
 import logging
 import copy
+import concurrent.futures
+import multiprocessing
 import numpy as np
 import networkx as nx
 import hytra.core.jsongraph
-import dpct
+from hytra.core.binarygraph import writeToBytes, readFromBytes
+from hytra.core.splitplanner import SplitPlanner
+from hytra.core.solvers import solve
 
 def _getLogger():
     ''' logger to be used in this module '''
     return logging.getLogger("split-track-stitch")
 
+def trackSubmodelInSeparateProcess(serializedSubmodel, serializedWeights, solver, warmStart=None, cache=None):
+    '''
+    Track one submodel with the given `solver` (see `hytra.core.solvers`). Submodel, weights and result are passed in the compact binary format
+    of `hytra.core.binarygraph.writeToBytes`, which is much faster to send between processes than pickled dictionaries.
+    An optional `hytra.core.warmstart.WarmStart` should be restricted to the submodel before sending it,
+    an optional `hytra.core.resultcache.ResultCache` can be shared by all processes.
+
+    Meant to be run in its own process using `concurrent.futures.ProcessPoolExecutor`
+
+    **returns** the serialized result
+    '''
+    submodel = readFromBytes(serializedSubmodel)
+    weights = readFromBytes(serializedWeights)
+    return writeToBytes(solve(submodel, weights, solver, warmStart, cache))
+
 class SplitTracking:
     '''
     Run DPCT flow-based tracking solveron sub-sections of video in order to parallelize tracking and speed up processing.
@@ -31,13 +50,36 @@ class SplitTracking:
         pass
      
     @staticmethod
-    def trackFlowBasedWithSplits(model, weights, numFramesPerSplit, numThreads=None, withMergerResolver=None):   
+    def trackFlowBasedWithSplits(model, weights, numFramesPerSplit=None, numThreads=None, withMergerResolver=None, useMultiprocessing=False, numSplits=None, solver=None, warmStart=None, cache=None):
         '''
         Splits video and runs tracking separately for each sub-section, followed by stitching together the results.
+
+        `model` and `weights` can be given as dictionaries or as filenames (JSON or HDF5, see `hytra.core.jsongraph.readFromFile`).
+
+        The video is split into `numSplits` parts, or into parts of roughly `numFramesPerSplit` frames.
+        If neither is given, we use one part per worker. The split points are chosen by a `hytra.core.splitplanner.SplitPlanner`,
+        such that all parts contain a similar number of detections and links, and few links and divisions are cut.
+
+        If `useMultiprocessing=True`, the submodels are tracked in parallel in `numThreads` processes
+        (defaults to the number of CPU cores), otherwise `numThreads` threads are used if given.
+
+        The submodels and the stitching model are tracked with the given `solver` from `hytra.core.solvers`,
+        by default `max-flow` if `withMergerResolver=True` and `flow-based` otherwise.
+        If a `hytra.core.warmstart.WarmStart` from a previous run is given, the submodels are re-solved starting from it.
+        The stitching model is always solved from scratch, as its tracklets change with the submodel results.
+        With a `hytra.core.resultcache.ResultCache`, the results of unchanged submodels and of the stitching model are reused.
         '''     
         logging.basicConfig(level=logging.INFO)
 
-        _ , uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(model)
+        if solver is None:
+            solver = 'max-flow' if withMergerResolver else 'flow-based'
+
+        if not isinstance(model, dict):
+            model = hytra.core.jsongraph.readFromFile(model)
+        if not isinstance(weights, dict):
+            weights = hytra.core.jsongraph.readFromFile(weights)
+
+        uuidToTraxelMap = hytra.core.jsongraph.UuidTraxelMapping.fromModel(model)
         
         detectionTimestepTuples = [(timestepIdTuple, entry) for entry in model['segmentationHypotheses'] for timestepIdTuple in uuidToTraxelMap[int(entry['id'])]]
         detectionsPerTimestep = {}
@@ -47,52 +89,39 @@ class SplitTracking:
         firstFrame = min(detectionsPerTimestep.keys())
         lastFrame = max(detectionsPerTimestep.keys())
 
+        if numSplits is None:
+            if numFramesPerSplit is not None:
+                # Check that number of frames per split is more than 2
+                assert numFramesPerSplit > 2 , "The number of splits is too large; submodel has less than 2 frames"
+                numSplits = (lastFrame - firstFrame) // numFramesPerSplit
+            else:
+                numSplits = numThreads if numThreads else multiprocessing.cpu_count()
+
+        splitPlanner = SplitPlanner(model, uuidToTraxelMap)
+        splitPoints = splitPlanner.planSplits(numSplits)
+
         # Run tracking on full video if he have less splits than 2
-        if (lastFrame - firstFrame) <= numFramesPerSplit*2:
+        if len(splitPoints) == 0:
             _getLogger().info("WARNING: Running flow-based tracking without splits")
-            if withMergerResolver:
-                return dpct.trackMaxFlow(model, weights)
-            else:
-                return dpct.trackFlowBased(model, weights)
+            return solve(model, weights, solver, warmStart, cache)
 
-        numSplits = (lastFrame - firstFrame) // numFramesPerSplit 
-    
-        nonSingletonCostsPerFrame = []
         detectionsById = {}
         linksByIdTuple = {}
     
         for t in detectionsPerTimestep.keys():
-            nonSingletonCosts = []
             for d in detectionsPerTimestep[t]:
                 d['nid'] = uuidToTraxelMap[d['id']][0]
                 detectionsById[d['id']] = d
-                f = d['features'][:]
-                del f[1]
-                nonSingletonCosts.extend(f)
-            nonSingletonCostsPerFrame.append(min(nonSingletonCosts)[0])
     
-        for l in model['linkingHypotheses']:
+        # index the links by their end points and by the timesteps of their source, so that we never need to scan all links
+        outgoingLinksPerDetection = {}
+        linkIndicesPerSourceTimestep = {}
+        for i, l in enumerate(model['linkingHypotheses']):
             linksByIdTuple[(l['src'], l['dest'])] = l
+            outgoingLinksPerDetection.setdefault(l['src'], []).append(l)
+            for t in set(timestep for timestep, _ in uuidToTraxelMap[l['src']]):
+                linkIndicesPerSourceTimestep.setdefault(t, []).append(i)
     
-        # create a list of the sum of 2 neighboring elements (has len = len(nonSingletonCostsPerFrame) - 1)
-        nonSingletonCostsPerFrameGap = [i + j for i, j in zip(nonSingletonCostsPerFrame[:-1], nonSingletonCostsPerFrame[1:])]
-    
-        # Check that number of frames per split is more than 2
-        assert numFramesPerSplit > 2 , "The number of splits is too large; submodel has less than 2 frames"
-    
-        # find points where TWO consecutive frames have a low merger score together!
-        # find split points in a range of 10 frames before/after the desired split location
-        # TODO: also consider divisions!
-        splitPoints = []
-        border = 10 #TODO: Adjust border according to size of video and number of prames per split
-        if numFramesPerSplit < border*2:
-            border = 1
-    
-        for s in range(1, numSplits):
-            desiredSplitPoint = s * numFramesPerSplit
-            subrange = np.array(nonSingletonCostsPerFrameGap[desiredSplitPoint - border : desiredSplitPoint + border])
-            splitPoints.append(desiredSplitPoint - border + np.argmax(subrange))
-  
         _getLogger().info("Going to split hypotheses graph at frames {}".format(splitPoints))
 
         # split graph
@@ -100,32 +129,36 @@ class SplitTracking:
             # for each split: take detections from detectionsPerTimestep, store a list of the uuids, then add links by filtering for the uuids
             # also make sure that appearance/disappearance costs are zero at the beginning/end of each submodel
     
-            # TODO: tracklets that reach over the gap must be split into two!
             submodel = {}
             segmentationHypotheses = []
             for f in range(startTime, endTime):
                 if f == startTime:
-                    for d in detectionsPerTimestep[f]:
+                    for d in detectionsPerTimestep.get(f, []):
                         newD = copy.deepcopy(d)
                         newD['appearanceFeatures'] = [[0.0000001 * sum(range(i+1))] for i in range(len(d['features']))]
                         segmentationHypotheses.append(newD)
                 elif f+1 == endTime:
-                    for d in detectionsPerTimestep[f]:
+                    for d in detectionsPerTimestep.get(f, []):
                         newD = copy.deepcopy(d)
                         newD['disappearanceFeatures'] = [[0.0000001 * sum(range(i+1))] for i in range(len(d['features']))]
                         segmentationHypotheses.append(newD)
                 else:
-                    segmentationHypotheses.extend(detectionsPerTimestep[f])
+                    segmentationHypotheses.extend(detectionsPerTimestep.get(f, []))
     
             submodel['segmentationHypotheses'] = segmentationHypotheses
-            uuidsInSubmodel = set([d['id'] for f in range(startTime, endTime) for d in detectionsPerTimestep[f]]) # TODO: This line can be optimized 
-            submodel['linkingHypotheses'] = [l for l in model['linkingHypotheses'] if (l['src'] in uuidsInSubmodel) and (l['dest'] in uuidsInSubmodel)]
+            uuidsInSubmodel = set([d['id'] for f in range(startTime, endTime) for d in detectionsPerTimestep.get(f, [])])
+            # only look at the links starting within the submodel, and keep them in the order of the model
+            linkIndices = set()
+            for f in range(startTime, endTime):
+                linkIndices.update(linkIndicesPerSourceTimestep.get(f, []))
+            submodel['linkingHypotheses'] = [model['linkingHypotheses'][i] for i in sorted(linkIndices)
+                                             if model['linkingHypotheses'][i]['dest'] in uuidsInSubmodel]
             submodel['divisionHypotheses'] = []
             submodel['settings'] = model['settings']
             return submodel
     
         submodels = []
-        lastSplit = 0
+        lastSplit = firstFrame
         splitPoints.append(lastFrame) # so that we get the last split as well
         for splitPoint in splitPoints:
             _getLogger().info("Creating submodel from t={} to t={}...".format(lastSplit, splitPoint + 1))
@@ -133,10 +166,30 @@ class SplitTracking:
             _getLogger().info("\t contains {} nodes and {} edges".format(len(submodels[-1]['segmentationHypotheses']), len(submodels[-1]['linkingHypotheses'])))
             lastSplit = splitPoint + 1
             
-        # Will store submodel results
+        # Will store submodel results, in the order of the submodels
         results = []
+        submodelWarmStarts = [None] * len(submodels)
+        if warmStart is not None:
+            submodelWarmStarts = [warmStart.restrictTo(submodel) for submodel in submodels]
         
-        if numThreads:
+        if useMultiprocessing:
+            _getLogger().info("Using {} processes for solver".format(numThreads if numThreads else "all available"))
+
+            # the solver wrappers do not release the GIL, so we need processes to solve submodels in parallel
+            serializedWeights = writeToBytes(weights)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=numThreads) as executor:
+                futures = []
+                for i, submodel in enumerate(submodels):
+                    _getLogger().info("Tracking submodel {}/{}".format(i, len(submodels)))
+                    futures.append(executor.submit(trackSubmodelInSeparateProcess,
+                                                   writeToBytes(submodel),
+                                                   serializedWeights,
+                                                   solver,
+                                                   submodelWarmStarts[i],
+                                                   cache))
+                results = [readFromBytes(f.result()) for f in futures]
+
+        elif numThreads:
             _getLogger().info("Using {} threads for solver".format(numThreads))
         
             # dummy replicates the multiprocessing API using the threading module
@@ -144,23 +197,17 @@ class SplitTracking:
             # see: http://stackoverflow.com/questions/8804830/python-multiprocessing-pickling-error
             from multiprocessing.dummy import Pool 
         
-            # callback function
-            def result_callback(result):
-                results.append(result)
-            
             pool = Pool(numThreads)
+            asyncResults = []
             for i, submodel in enumerate(submodels):
                 # TODO: be robust against changes of num weights!
                 # TODO: release GIL in tracking python wrappers to allow parallel solving!!
                 _getLogger().info("Tracking submodel {}/{}".format(i, len(submodels)))
-    
-                if withMergerResolver:
-                    pool.apply_async(dpct.trackMaxFlow, args=(submodel, weights), callback=result_callback)
-                else:
-                    pool.apply_async(dpct.trackFlowBased, args=(submodel, weights), callback=result_callback)
+                asyncResults.append(pool.apply_async(solve, args=(submodel, weights, solver, submodelWarmStarts[i], cache)))
                 
-            # Close pool and run async tasks    
+            # Close pool and collect the results in submission order, they are zipped with the submodels below
             pool.close()
+            results = [r.get() for r in asyncResults]
             pool.join()
         
         else:
@@ -168,11 +215,7 @@ class SplitTracking:
                 # TODO: be robust against changes of num weights!
                 # TODO: release GIL in tracking python wrappers to allow parallel solving!!
                 _getLogger().info("Tracking submodel {}/{}".format(i, len(submodels)))
-                
-                if withMergerResolver:
-                    results.append(dpct.trackMaxFlow(submodel, weights))
-                else:
-                    results.append(dpct.trackFlowBased(submodel, weights))
+                results.append(solve(submodel, weights, solver, submodelWarmStarts[i], cache))
             
         # merge results
         # make detection weight higher, or accumulate energy over tracks (but what to do with mergers then?),
@@ -184,6 +227,7 @@ class SplitTracking:
         stitchingModel = {'segmentationHypotheses': tracklets, 'linkingHypotheses': links, 'divisionHypotheses' : [], 'settings' : model['settings']}
         nodeIdRemapping = {}
         valuePerDetection = {}
+        stitchingLinkCandidates = []
     
         modelIdx = 0
         for submodel, result in zip(submodels, results):            
@@ -210,7 +254,7 @@ class SplitTracking:
     
             for c in connectedComponents:
                 # sum over features of dets + links
-                linkFeatures = [link['features'] for idTuple, link in linksByIdTuple.items() if idTuple[0] in c and idTuple[1] in c]
+                linkFeatures = [link['features'] for n in c for link in outgoingLinksPerDetection.get(n, []) if link['dest'] in c]
                 detFeatures = [detectionsById[i]['features'] for i in c]
                 accumulatedFeatures = np.sum([hytra.core.jsongraph.delistify(f) for f in linkFeatures + detFeatures], axis=0)
     
@@ -250,40 +294,45 @@ class SplitTracking:
                 for n in c:
                     nodeIdRemapping[n] = minTrackletId
     
-            # add the remaining links to the stitching graph with adjusted source and destination
+            # remember the remaining active links, they are added to the stitching graph below
             for l in result['linkingResults']:
                 s, d = l['src'], l['dest']
                 if l['value'] > 0 and (valuePerDetection[s] != l['value'] or valuePerDetection[d] != l['value'] or divisionsPerDetection[s]):
-                    newL = {
-                        'src' : nodeIdRemapping[s],
-                        'dest' : nodeIdRemapping[d],
-                        'features' : linksByIdTuple[(s, d)]['features']
-                    }
-    
-                    links.append(newL)
+                    stitchingLinkCandidates.append((s, d))
             modelIdx += 1
-        _getLogger().info("\tgot {} links from within the submodels".format(len(links)))
+        _getLogger().info("\tgot {} links from within the submodels".format(len(stitchingLinkCandidates)))
     
-        # insert all edges crossing the splits that connect active detections
-        detectionIdsPerTimestep = dict( [(k, [d['id'] for d in v]) for k, v in detectionsPerTimestep.items()])
+        # insert all edges crossing the splits that connect active detections,
+        # a link skipping frames can cross several splits but must only be inserted once
+        crossingLinkIndices = set()
         for splitPoint in splitPoints[:-1]:
-            for idTuple, link in linksByIdTuple.items():
-                s, d = idTuple
-                if s in detectionIdsPerTimestep[splitPoint] and d in detectionIdsPerTimestep[splitPoint + 1] and valuePerDetection[s] > 0 and valuePerDetection[d] > 0:
-                    newL = copy.deepcopy(link)
-                    newL['src'] = nodeIdRemapping[s]
-                    newL['dest'] = nodeIdRemapping[d]
-                    links.append(newL)
+            crossingLinkIndices.update(splitPlanner.crossingLinkIndices(splitPoint))
+        for i in sorted(crossingLinkIndices):
+            link = model['linkingHypotheses'][i]
+            s, d = link['src'], link['dest']
+            if valuePerDetection[s] > 0 and valuePerDetection[d] > 0:
+                stitchingLinkCandidates.append((s, d))
+
+        # Contract the links onto the tracklets. Only links from the end of one tracklet to the start of another can be used,
+        # any other link (e.g. one skipping frames from the middle of a tracklet) would give a detection a second active
+        # incoming or outgoing link when expanding the result, and there must be at most one arc between two tracklets.
+        trackletsById = dict([(t['id'], t) for t in tracklets])
+        originalLinkPerTrackletPair = {}
+        for s, d in stitchingLinkCandidates:
+            src, dest = nodeIdRemapping[s], nodeIdRemapping[d]
+            if trackletsById[src]['maxUid'] != s or trackletsById[dest]['minUid'] != d or (src, dest) in originalLinkPerTrackletPair:
+                continue
+            originalLinkPerTrackletPair[(src, dest)] = (s, d)
+            newL = copy.deepcopy(linksByIdTuple[(s, d)])
+            newL['src'] = src
+            newL['dest'] = dest
+            links.append(newL)
     
         # Running solver for compressed tracklet model
         _getLogger().info("\t contains {} nodes and {} edges".format(len(tracklets), len(links)))
-        if withMergerResolver:
-            stitchingResult = dpct.trackMaxFlow(stitchingModel, weights)
-        else:
-            stitchingResult = dpct.trackFlowBased(stitchingModel, weights)
+        stitchingResult = solve(stitchingModel, weights, solver, cache=cache)
         
         # Extracting full result
-        trackletsById = dict([(t['id'], t) for t in tracklets])
         fullResult = {'detectionResults' : [], 'linkingResults' : [], 'divisionResults' : []}
         
         for dr in stitchingResult['detectionResults']:
@@ -292,19 +341,17 @@ class SplitTracking:
             if v > 0:
                 for originalUuid in t['contains']:
                     fullResult['detectionResults'].append({'id': originalUuid, 'value': v})
-                for s, d in linksByIdTuple.keys():
-                    if s in t['contains'] and d in t['contains']:
-                        fullResult['linkingResults'].append({'src': s, 'dest' : d, 'value': v})
+                    for link in outgoingLinksPerDetection.get(originalUuid, []):
+                        if link['dest'] in t['contains']:
+                            fullResult['linkingResults'].append({'src': originalUuid, 'dest' : link['dest'], 'value': v})
             else:
                 _getLogger().warning("Skipped detection {} while stitching!".format(t))
     
         for lr in stitchingResult['linkingResults']:
             v = lr['value'] 
-            st = trackletsById[lr['src']]
-            dt = trackletsById[lr['dest']]
-
             if v > 0:
-                fullResult['linkingResults'].append({'src': st['maxUid'], 'dest' : dt['minUid'], 'value': v})
+                s, d = originalLinkPerTrackletPair[(lr['src'], lr['dest'])]
+                fullResult['linkingResults'].append({'src': s, 'dest' : d, 'value': v})
 
         # Adding missing links with value set to 0 to the final result
         nodeFlowMap = dict([(int(d['id']), int(d['value'])) for d in fullResult['detectionResults']])
@@ -0,0 +1,131 @@
+'''
+Checkpointing for multi-stage pipelines: a JSON manifest records for every stage that finished successfully
+a fingerprint of its inputs and the fingerprints of the files it wrote.
+
+A stage is up to date, and can be skipped when the pipeline is restarted, if its input fingerprint is the same
+and its outputs were not modified since. The input fingerprint covers the configuration values of the stage,
+its input files, and the recorded outputs of all upstream stages, such that re-running a stage whose outputs
+change invalidates everything downstream. Upstream stages that do not write any files (because they hand their
+results on in memory) contribute their input fingerprint instead.
+
+Files are fingerprinted by size and modification time, or by a hash of their contents if `hashContents=True`,
+in which case a stage that re-runs but produces identical outputs does not invalidate downstream stages.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import hashlib
+import json
+import logging
+import os
+import time
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def _hashFile(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def fileFingerprint(filename, hashContents=False):
+    '''
+    Fingerprint a file, or all files within a directory.
+
+    **returns** a JSON serializable fingerprint, or None if the file does not exist
+    '''
+    if os.path.isdir(filename):
+        return dict((name, fileFingerprint(os.path.join(filename, name), hashContents))
+                    for name in sorted(os.listdir(filename)))
+    if not os.path.isfile(filename):
+        return None
+    if hashContents:
+        return _hashFile(filename)
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime]
+
+class StageManifest(object):
+    '''
+    The checkpoints of all stages of a pipeline, stored in the JSON file `filename`.
+    Stages listed in `forcedStages` are never considered up to date.
+    '''
+    def __init__(self, filename, forcedStages=(), hashContents=False):
+        self.filename = filename
+        self.forcedStages = set(forcedStages)
+        self.hashContents = hashContents
+        self._stages = {}
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                self._stages = json.load(f)
+
+    def _save(self):
+        temporaryFilename = self.filename + '.tmp'
+        with open(temporaryFilename, 'w') as f:
+            json.dump(self._stages, f, indent=4, sort_keys=True)
+        os.replace(temporaryFilename, self.filename)
+
+    def _outputFingerprints(self, outputFiles):
+        return dict((f, fileFingerprint(f, self.hashContents)) for f in outputFiles)
+
+    def inputFingerprint(self, config, inputFiles=(), upstreamStages=()):
+        '''
+        Hash the `config` dictionary, the contents or modification times of the `inputFiles`,
+        and the checkpoints of the `upstreamStages`.
+
+        **returns** the hexadecimal SHA-256 digest
+        '''
+        upstream = {}
+        for stage in upstreamStages:
+            entry = self._stages.get(stage)
+            if entry is None:
+                upstream[stage] = None
+            elif len(entry['outputs']) > 0:
+                upstream[stage] = entry['outputs']
+            else:
+                upstream[stage] = entry['inputFingerprint']
+        description = {
+            'config': config,
+            'inputs': dict((f, fileFingerprint(f, self.hashContents)) for f in inputFiles),
+            'upstream': upstream
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def isUpToDate(self, stage, inputFingerprint):
+        ''' **returns** True if `stage` finished before with the same inputs, and its outputs are unchanged '''
+        if stage in self.forcedStages:
+            return False
+        entry = self._stages.get(stage)
+        if entry is None or entry['inputFingerprint'] != inputFingerprint:
+            return False
+        return self._outputFingerprints(entry['outputs'].keys()) == entry['outputs']
+
+    def record(self, stage, inputFingerprint, outputFiles=()):
+        ''' store the checkpoint of a successfully finished `stage` together with the fingerprints of its outputs '''
+        self._stages[stage] = {'inputFingerprint': inputFingerprint,
+                               'outputs': self._outputFingerprints(outputFiles),
+                               'finished': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self._save()
+
+    def invalidate(self, stage):
+        ''' forget the checkpoint of `stage`, e.g. because it failed '''
+        if self._stages.pop(stage, None) is not None:
+            self._save()
+
+    def runStage(self, stage, run, config, inputFiles=(), outputFiles=(), upstreamStages=(), force=False):
+        '''
+        Call `run()` unless the `stage` is up to date, and record its checkpoint afterwards.
+        If `run` raises, the old checkpoint of the stage is removed, so that it runs again on restart.
+        Stages whose outputs only live in memory must be run with `force=True`, their checkpoint is recorded
+        nevertheless so that downstream stages can compare against it.
+
+        **returns** True if the stage was run, False if it was skipped
+        '''
+        fingerprint = self.inputFingerprint(config, inputFiles, upstreamStages)
+        if not force and self.isUpToDate(stage, fingerprint):
+            getLogger().info("Skipping stage {}, its inputs and outputs are unchanged".format(stage))
+            return False
+        self.invalidate(stage)
+        run()
+        self.record(stage, fingerprint, outputFiles)
+        return True
@@ -0,0 +1,208 @@
+'''
+The stages of the tracking pipeline as a library: weight extraction, hypotheses graph creation, convexification,
+tracking, merger resolving and export to the ilastik events format.
+
+A `TrackingPipeline` runs all stages in one process and hands the `HypothesesGraph`, the model and the result
+from stage to stage in memory, instead of writing them to JSON files and parsing them again in the next script.
+Intermediate results are only written to disk if that is requested explicitly.
+
+Modules with heavy dependencies (plugins, classifiers, ilastik projects) are imported by the stages that need them.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import os
+import hytra.core.jsongraph
+import hytra.core.solvers
+from hytra.core.jsongraph import JsonTrackingGraph
+from hytra.core.fieldofview import FieldOfView
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def convertToDict(unknown):
+    '''
+    Turn the unknown command line parameters (e.g. from a shared config file) into a dictionary,
+    where parameters without value are set to `True`.
+    '''
+    indicesOfParameters = [i for i, p in enumerate(unknown) if p.startswith('--')]
+    keys = [u.replace('--', '') for u in [unknown[i] for i in indicesOfParameters]]
+    values = []
+    for i in indicesOfParameters:
+        if i + 1 >= len(unknown) or unknown[i + 1].startswith('--'):
+            values.append(True)
+        else:
+            values.append(unknown[i + 1])
+    return dict(zip(keys, values))
+
+def constructFov(shape, t0, t1, scale=[1, 1, 1]):
+    [xshape, yshape, zshape] = shape
+    [xscale, yscale, zscale] = scale
+
+    fov = FieldOfView(t0, 0, 0, 0, t1, xscale * (xshape - 1), yscale * (yshape - 1),
+                      zscale * (zshape - 1))
+    return fov
+
+def ilastikProjectOptionsFromParams(params, ilastikTrackingProject):
+    '''
+    Fill `IlastikProjectOptions` from the config file parameters in `params` (see `convertToDict`),
+    where the object count and division classifiers default to the ones in the `ilastikTrackingProject`.
+    '''
+    from hytra.core.ilastik_project_options import IlastikProjectOptions
+    ilpOptions = IlastikProjectOptions()
+    ilpOptions.labelImagePath = params.get(str('label-image-path'), ilpOptions.labelImagePath)
+    ilpOptions.labelImageFilename = params.get(str('label-image-file'), None)
+    ilpOptions.rawImagePath = params.get(str('raw-data-path'), ilpOptions.rawImagePath)
+    ilpOptions.rawImageFilename = params.get(str('raw-data-file'), None)
+    ilpOptions.rawImageAxes = params.get(str('raw-data-axes'), 'txyzc')
+    ilpOptions.sizeFilter = [int(params.get(str('min-size'), 0)), 100000]
+
+    ilpOptions.objectCountClassifierFilename = params.get(str('object-count-classifier-file'), ilastikTrackingProject)
+    if 'without-divisions' not in params:
+        ilpOptions.divisionClassifierFilename = params.get(str('division-classifier-file'), ilastikTrackingProject)
+    else:
+        ilpOptions.divisionClassifierFilename = None
+    return ilpOptions
+
+class TrackingPipeline(object):
+    '''
+    Holds the state that is passed between the pipeline stages. Each stage can also be started from data
+    that was computed before, by setting `weights`, `model` or `result` (or reading them with `readModel` etc.).
+
+    After merger resolving, `model` and `result` contain the refined graph and solution.
+    '''
+    def __init__(self, pluginPaths=[os.path.abspath('../hytra/plugins')], verbose=False):
+        self.pluginPaths = pluginPaths
+        self.verbose = verbose
+        self.weights = None
+        self.hypothesesGraph = None
+        self.model = None
+        self.result = None
+        self.mergerResolver = None
+
+    def readWeights(self, filename):
+        self.weights = hytra.core.jsongraph.readFromFile(filename)
+
+    def readModel(self, filename):
+        self.model = hytra.core.jsongraph.readFromFile(filename)
+
+    def readResult(self, filename):
+        self.result = hytra.core.jsongraph.readFromFile(filename)
+
+    def writeModel(self, filename):
+        hytra.core.jsongraph.writeToFile(filename, self.model)
+
+    def writeResult(self, filename):
+        hytra.core.jsongraph.writeToFile(filename, self.result)
+
+    def extractWeights(self, ilastikTrackingProject):
+        ''' use the weights that were chosen in the tracking applet of the given ilastik project '''
+        import hytra.core.ilastik_project_options
+        getLogger().info("Extracting weights from ilastik project...")
+        self.weights = hytra.core.ilastik_project_options.extractWeightDictFromIlastikProject(ilastikTrackingProject)
+
+    def createGraph(self, ilpOptions, maxNumObjects, numNearestNeighbors, withDivisions=True, withTracklets=True, divisionThreshold=0.1):
+        '''
+        Build the hypotheses graph from the segmentation and classifiers given by `ilpOptions`,
+        and keep it around such that the solution can be inserted to compute lineages after tracking.
+        '''
+        import hytra.core.probabilitygenerator as probabilitygenerator
+        from hytra.core.ilastikhypothesesgraph import IlastikHypothesesGraph
+        getLogger().info("Create hypotheses graph...")
+
+        probGenerator = probabilitygenerator.IlpProbabilityGenerator(ilpOptions,
+                                                                     pluginPaths=self.pluginPaths,
+                                                                     useMultiprocessing=False)
+        probGenerator.fillTraxels(usePgmlink=False)
+        fieldOfView = constructFov(probGenerator.shape,
+                                   probGenerator.timeRange[0],
+                                   probGenerator.timeRange[1],
+                                   [probGenerator.x_scale,
+                                    probGenerator.y_scale,
+                                    probGenerator.z_scale])
+
+        self.hypothesesGraph = IlastikHypothesesGraph(
+            probabilityGenerator=probGenerator,
+            timeRange=probGenerator.timeRange,
+            maxNumObjects=maxNumObjects,
+            numNearestNeighbors=numNearestNeighbors,
+            fieldOfView=fieldOfView,
+            withDivisions=withDivisions,
+            divisionThreshold=divisionThreshold
+        )
+
+        if withTracklets:
+            self.hypothesesGraph = self.hypothesesGraph.generateTrackletGraph()
+
+        self.hypothesesGraph.insertEnergies()
+        self.model = self.hypothesesGraph.toTrackingGraph().model
+
+    def convexify(self, epsilon=0.000001):
+        ''' (strictly) convexify the costs of the model in place, such that flow-based solvers can be used '''
+        getLogger().info("Convexifying graph energies...")
+        trackingGraph = JsonTrackingGraph(model=self.model)
+        trackingGraph.convexifyCosts(epsilon)
+        self.model = trackingGraph.model
+
+    def track(self, solver='flow-based', warmStart=None, cache=None, decomposeComponents=False, numWorkers=None,
+              minComponentBatchSize=1000, slidingWindowLength=None, slidingWindowOverlap=1):
+        '''
+        Solve the model with the given solver from `hytra.core.solvers`, either directly (optionally with warm start
+        and result cache), by connected components, or in sliding windows.
+        If the hypotheses graph was created in this pipeline, the solution is inserted and lineages are computed.
+        '''
+        getLogger().info("Run tracking...")
+        if decomposeComponents:
+            from hytra.core.componentdecomposition import trackWithComponentDecomposition
+            self.result = trackWithComponentDecomposition(self.model,
+                                                          self.weights,
+                                                          solver=solver,
+                                                          numWorkers=numWorkers,
+                                                          minBatchSize=minComponentBatchSize)
+        elif slidingWindowLength is not None:
+            from hytra.core.slidingwindowtracking import trackWithSlidingWindow
+            self.result = trackWithSlidingWindow(self.model,
+                                                 self.weights,
+                                                 slidingWindowLength,
+                                                 overlap=slidingWindowOverlap,
+                                                 solver=solver)
+        else:
+            self.result = hytra.core.solvers.solve(self.model, self.weights, solver, warmStart, cache)
+
+        if self.hypothesesGraph is not None:
+            # insert the solution into the hypotheses graph and from that deduce the lineages
+            self.hypothesesGraph.insertSolution(self.result)
+            self.hypothesesGraph.computeLineage()
+
+    def resolveMergers(self, labelImageFilename, labelImagePath, outLabelImageFilename, rawFilename, rawPath, rawAxes,
+                       transitionClassifierFilename=None, transitionClassifierPath='/', useMultiprocessing=False,
+                       numWorkers=None, mergerResolverPluginName='GMMMergerResolver', solver='max-flow'):
+        '''
+        Split all mergers of the current result, which writes the refined segmentation to `outLabelImageFilename`
+        and replaces `model` and `result` by the refined ones. The merger resolver is kept in `mergerResolver`,
+        e.g. to save the merger fits.
+        '''
+        from hytra.core.jsonmergerresolver import JsonMergerResolver
+        getLogger().info("Run merger resolving")
+        self.mergerResolver = JsonMergerResolver(JsonTrackingGraph(model=self.model, result=self.result),
+                                                 labelImageFilename,
+                                                 labelImagePath,
+                                                 outLabelImageFilename,
+                                                 rawFilename,
+                                                 rawPath,
+                                                 rawAxes,
+                                                 self.pluginPaths,
+                                                 self.verbose,
+                                                 useMultiprocessing=useMultiprocessing,
+                                                 numWorkers=numWorkers,
+                                                 mergerResolverPluginName=mergerResolverPluginName,
+                                                 solver=solver)
+        self.mergerResolver.run(transitionClassifierFilename, transitionClassifierPath)
+        self.model = self.mergerResolver.model
+        self.result = self.mergerResolver.result
+
+    def exportEvents(self, labelImageFilename, labelImagePath, outDirectory):
+        ''' write the current result as one ilastik events file per frame to `outDirectory` '''
+        from hytra.core.eventexport import exportEvents
+        getLogger().info("Export result to ilastik events in {}...".format(outDirectory))
+        exportEvents(self.model, self.result, labelImageFilename, labelImagePath, outDirectory, self.pluginPaths, self.verbose)
@@ -0,0 +1,200 @@
+'''
+Re-solve a hypotheses graph after small changes of the weights or features, e.g. while tuning parameters,
+starting from the result of a previous run instead of from scratch.
+
+Solvers that support it (see `hytra.core.solvers.registerSolver`) get the previous result as initial solution.
+For all other solvers we look at the independent connected components of the graph (see
+`hytra.core.componentdecomposition`), and only solve those again whose energies changed by more than a threshold.
+All other components keep their previous values, which is optimal as long as their energies are unchanged.
+'''
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import logging
+import time
+import hytra.core.jsongraph
+from hytra.core.componentdecomposition import findConnectedComponents, mergeResults
+from hytra.core.pythonflowsolver import splitWeights, stateEnergies, statesShareWeights
+import hytra.core.solvers
+
+def getLogger():
+    ''' logger to be used in this module '''
+    return logging.getLogger(__name__)
+
+def getHypothesisEnergies(model, weights):
+    '''
+    Compute the energies of all states of each detection, link and division in the `model`.
+    If states do not share their weights (see `statesShareWeights`), we cannot split the weight vector,
+    so we use the features and consider all hypotheses as changed if the weights change.
+
+    **returns** a dictionary from `('detection', uuid)`, `('appearance', uuid)`, `('disappearance', uuid)`,
+    `('division', uuid)` and `('link', src, dest)` to a list of state energies
+    '''
+    w = splitWeights(model, weights) if statesShareWeights(model, weights) else None
+
+    def energies(features, category):
+        if w is None:
+            return [list(f) for f in features]
+        return stateEnergies(features, w[category])
+
+    hypothesisEnergies = {}
+    for d in model['segmentationHypotheses']:
+        for key, category in [('features', 'detection'),
+                              ('appearanceFeatures', 'appearance'),
+                              ('disappearanceFeatures', 'disappearance'),
+                              ('divisionFeatures', 'division')]:
+            if d.get(key):
+                hypothesisEnergies[(category, d['id'])] = energies(d[key], category)
+    for l in model['linkingHypotheses']:
+        hypothesisEnergies[('link', l['src'], l['dest'])] = energies(l['features'], 'linking')
+    return hypothesisEnergies
+
+def _energiesDiffer(a, b, threshold):
+    if len(a) != len(b):
+        return True
+    if len(a) > 0 and isinstance(a[0], list):
+        return a != b
+    return any(abs(x - y) > threshold for x, y in zip(a, b))
+
+class WarmStart(object):
+    '''
+    Holds the result of a previous run, together with the model and weights it was computed for,
+    and solves new versions of that model starting from it.
+
+    The numbers of detections and components that were actually solved again in the last call to `solve`
+    are stored in `statistics`.
+    '''
+    def __init__(self, previousResult, previousModel=None, previousWeights=None, threshold=1e-6):
+        '''
+        Without `previousModel` only solvers that support warm starts can make use of the `previousResult`.
+        If `previousWeights` are not given, we assume that only the model changed.
+        '''
+        self.previousResult = previousResult
+        self.previousModel = previousModel
+        self.previousWeights = previousWeights
+        self.threshold = threshold
+        self._previousEnergies = None
+        self.statistics = {}
+
+    def restrictTo(self, model):
+        '''
+        **returns** a `WarmStart` that only contains the previous values of the detections in `model`,
+        e.g. to send less data to the processes that track submodels
+        '''
+        uuids = set(d['id'] for d in model['segmentationHypotheses'])
+        previousResult = {
+            'detectionResults': [d for d in self.previousResult['detectionResults'] if d['id'] in uuids],
+            'linkingResults': [l for l in self.previousResult['linkingResults'] if l['src'] in uuids and l['dest'] in uuids],
+            'divisionResults': None
+        }
+        if self.previousResult.get('divisionResults') is not None:
+            previousResult['divisionResults'] = [d for d in self.previousResult['divisionResults'] if d['id'] in uuids]
+
+        previousModel = None
+        if self.previousModel is not None:
+            previousModel = {
+                'segmentationHypotheses': [d for d in self.previousModel['segmentationHypotheses'] if d['id'] in uuids],
+                'linkingHypotheses': [l for l in self.previousModel['linkingHypotheses'] if l['src'] in uuids and l['dest'] in uuids],
+                'settings': self.previousModel.get('settings', {})
+            }
+        return WarmStart(previousResult, previousModel, self.previousWeights, self.threshold)
+
+    def solve(self, model, weights, solver='flow-based'):
+        '''
+        Track the `model` with the given `weights` and the `solver` registered in `hytra.core.solvers`,
+        reusing as much of the previous result as possible.
+
+        **returns** the result dictionary
+        '''
+        start = time.time()
+        if hytra.core.solvers.supportsWarmStart(solver):
+            result = hytra.core.solvers.getSolver(solver)(model, weights, self.previousResult)
+            previousValues = dict((d['id'], d['value']) for d in self.previousResult['detectionResults'])
+            numChanged = sum(1 for d in result['detectionResults'] if previousValues.get(d['id']) != d['value'])
+            self.statistics = {'numDetections': len(model['segmentationHypotheses']),
+                               'numChangedDetections': numChanged}
+            getLogger().info("Warm started solver {} took {:.3f} seconds, {} of {} detections changed their value".format(
+                solver, time.time() - start, numChanged, len(model['segmentationHypotheses'])))
+            return result
+
+        if self.previousModel is None:
+            getLogger().warning("Solver {} does not support warm starts and no previous model is given, "
+                                "solving from scratch".format(solver))
+            return hytra.core.solvers.solve(model, weights, solver)
+
+        components = findConnectedComponents(model)
+        changedComponents = self._findChangedComponents(model, weights, components)
+        changedUuids = set(u for i in changedComponents for u in components[i])
+        self.statistics = {'numComponents': len(components),
+                           'numResolvedComponents': len(changedComponents),
+                           'numDetections': len(model['segmentationHypotheses']),
+                           'numResolvedDetections': len(changedUuids)}
+        getLogger().info("Re-solving {} of {} components with {} of {} detections".format(
+            len(changedComponents), len(components), len(changedUuids), len(model['segmentationHypotheses'])))
+
+        results = [self._previousValues(model, changedUuids)]
+        if len(changedUuids) > 0:
+            submodel = {
+                'segmentationHypotheses': [d for d in model['segmentationHypotheses'] if d['id'] in changedUuids],
+                'linkingHypotheses': [l for l in model['linkingHypotheses'] if l['src'] in changedUuids],
+                'exclusions': [e for e in model.get('exclusions', []) if len(e) > 0 and e[0] in changedUuids],
+                'divisionHypotheses': [d for d in model.get('divisionHypotheses', []) if d['parent'] in changedUuids],
+                'settings': model.get('settings', {})
+            }
+            results.append(hytra.core.solvers.solve(submodel, weights, solver))
+        return mergeResults(results)
+
+    def _findChangedComponents(self, model, weights, components):
+        ''' **returns** the indices of all components that contain a new, removed or changed hypothesis '''
+        if self._previousEnergies is None:
+            self._previousEnergies = getHypothesisEnergies(self.previousModel, self.previousWeights or weights)
+        energies = getHypothesisEnergies(model, weights)
+        componentPerUuid = {}
+        for i, component in enumerate(components):
+            for u in component:
+                componentPerUuid[u] = i
+
+        changedComponents = set()
+        # a model that cannot share weights between states changes completely if the weights change
+        if self.previousWeights is not None and list(self.previousWeights['weights']) != list(weights['weights']) \
+                and not statesShareWeights(model, weights):
+            return set(range(len(components)))
+
+        solvedUuids = set(d['id'] for d in self.previousResult['detectionResults'])
+        for key, e in energies.items():
+            previousEnergies = self._previousEnergies.get(key)
+            if previousEnergies is None or _energiesDiffer(previousEnergies, e, self.threshold) \
+                    or (key[0] == 'detection' and key[1] not in solvedUuids):
+                changedComponents.add(componentPerUuid[key[1]])
+        # removed hypotheses change the components of the detections that are still there
+        for key in self._previousEnergies.keys():
+            if key not in energies:
+                for u in key[1:]:
+                    if u in componentPerUuid:
+                        changedComponents.add(componentPerUuid[u])
+        return changedComponents
+
+    def _previousValues(self, model, excludedUuids):
+        ''' **returns** a result dictionary with the previous values of all hypotheses that are not part of `excludedUuids` '''
+        uuids = set(d['id'] for d in model['segmentationHypotheses']) - excludedUuids
+        result = {
+            'detectionResults': [d for d in self.previousResult['detectionResults'] if d['id'] in uuids],
+            'linkingResults': [l for l in self.previousResult['linkingResults'] if l['src'] in uuids],
+            'divisionResults': None
+        }
+        if self.previousResult.get('divisionResults') is not None:
+            result['divisionResults'] = [d for d in self.previousResult['divisionResults'] if d['id'] in uuids]
+        return result
+
+def readWarmStart(resultFilename, modelFilename=None, weightFilename=None, threshold=1e-6):
+    '''
+    Load the result, and optionally the model and weights, of a previous run
+    (JSON or HDF5, see `hytra.core.jsongraph.readFromFile`).
+
+    **returns** a `WarmStart`
+    '''
+    previousModel = None
+    previousWeights = None
+    if modelFilename is not None:
+        previousModel = hytra.core.jsongraph.readFromFile(modelFilename)
+    if weightFilename is not None:
+        previousWeights = hytra.core.jsongraph.readFromFile(weightFilename)
+    return WarmStart(hytra.core.jsongraph.readFromFile(resultFilename), previousModel, previousWeights, threshold)
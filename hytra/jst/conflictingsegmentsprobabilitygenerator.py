@@ -6,6 +6,7 @@ import concurrent.futures
 
 from hytra.core.probabilitygenerator import IlpProbabilityGenerator, computeDivisionFeaturesOnCloud, computeRegionFeaturesOnCloud, DummyExecutor
 from hytra.util.progressbar import ProgressBar
+from hytra.util.labelimageindex import LabelImageIndex
 
 def getLogger():
     return logging.getLogger(__name__)
@@ -34,15 +35,14 @@ def findConflictingHypothesesInSeparateProcess(frame,
         labelImageA = pluginManager.getImageProvider().getLabelImageForFrame(labelImageFilenames[labelImageIndexA],
                                                                                     labelImagePaths[labelImageIndexA],
                                                                                     frame)
+        objectIndexA = LabelImageIndex(labelImageA)
         for labelImageIndexB in range(labelImageIndexA + 1, len(labelImageFilenames)):
             labelImageB = pluginManager.getImageProvider().getLabelImageForFrame(labelImageFilenames[labelImageIndexB],
                                                                                         labelImagePaths[labelImageIndexB],
                                                                                         frame)
             # check for overlaps - even a 1-pixel overlap is enough to be mutually exclusive!
-            for objectIdA in np.unique(labelImageA):
-                if objectIdA == 0:
-                    continue
-                overlapping = set(np.unique(labelImageB[labelImageA == objectIdA])) - set([0])
+            for objectIdA in objectIndexA.labels():
+                overlapping = set(np.unique(objectIndexA.valuesIn(objectIdA, labelImageB))) - set([0])
                 overlappingGlobalIds = [labelImageFrameIdToGlobalId[(labelImageFilenames[labelImageIndexB], frame, o)] for o in overlapping]
                 globalIdA = labelImageFrameIdToGlobalId[(labelImageFilenames[labelImageIndexA], frame, objectIdA)]
                 overlaps.setdefault(globalIdA, []).extend(overlappingGlobalIds)
@@ -77,23 +77,23 @@ def computeJaccardScoresOnCloud(frame,
     gtToGlobalIdMap = {}
 
     groundTruthLabelImage = pluginManager.getImageProvider().getLabelImageForFrame(groundTruthFilename, groundTruthPath, frame)
+    groundTruthIndex = LabelImageIndex(groundTruthLabelImage)
 
     for labelImageIndexA in range(len(labelImageFilenames)):
         labelImageA = pluginManager.getImageProvider().getLabelImageForFrame(labelImageFilenames[labelImageIndexA],
                                                                                     labelImagePaths[labelImageIndexA],
                                                                                     frame)
+        objectIndexA = LabelImageIndex(labelImageA)
         # check for overlaps - even a 1-pixel overlap is enough to be mutually exclusive!
-        for objectIdA in np.unique(labelImageA):
-            if objectIdA == 0:
-                continue
+        for objectIdA in objectIndexA.labels():
             globalIdA = labelImageFrameIdToGlobalId[(labelImageFilenames[labelImageIndexA], frame, objectIdA)]
-            overlap = groundTruthLabelImage[labelImageA == objectIdA]
+            overlap = objectIndexA.valuesIn(objectIdA, groundTruthLabelImage)
             overlappingGtElements = set(np.unique(overlap)) - set([0])
             
             for gtLabel in overlappingGtElements:
                 # compute Jaccard scores
                 intersectingPixels = np.sum(overlap == gtLabel)
-                unionPixels = np.sum(np.logical_or(groundTruthLabelImage == gtLabel, labelImageA == objectIdA))
+                unionPixels = objectIndexA.count(objectIdA) + groundTruthIndex.count(gtLabel) - intersectingPixels
                 jaccardScore = float(intersectingPixels) / float(unionPixels) 
 
                 # append to object's score list
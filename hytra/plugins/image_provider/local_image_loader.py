@@ -5,6 +5,14 @@ import numpy as np
 import h5py
 import logging
 
+def _blockRoi(block):
+    ''' **returns** the list of `(start, stop)` per axis of a `LabelImage_v2` block, parsed from its `blockSlice` attribute '''
+    assert 'blockSlice' in block.attrs
+    bs = block.attrs['blockSlice'][1:-1]
+    if isinstance(bs, bytes):
+        bs = bs.decode()
+    return [(int(r.split(':')[0]), int(r.split(':')[1])) for r in bs.split(',')]
+
 class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
     """
     Computes the subtraction of features in the feature vector
@@ -48,13 +56,7 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
                 # loop though all blocks in h5 file and read the blockshape, and figure out whether this frame is in there.
                 labelImage = None
                 for block in h5file[PathInResource].values():
-                    assert 'blockSlice' in block.attrs
-                    blockSlice = block.attrs['blockSlice']
-                    bs = blockSlice[1:-1]
-                    if isinstance(bs, bytes):
-                        bs = bs.decode()
-
-                    roi = [(int(r.split(':')[0]), int(r.split(':')[1])) for r in bs.split(',')]
+                    roi = _blockRoi(block)
                     if timeframe in range(roi[0][0], roi[0][1]):
                         timeStart = timeframe - roi[0][0]
                         # WARNING we assume that every block captures the full image extent or more timeframes, 
@@ -100,17 +102,35 @@ class LocalImageLoader(image_provider_plugin.ImageProviderPlugin):
             if PathInResource.count('%') == 5 and not 'LabelImage_v2' in PathInResource:
                 internalPath = PathInResource % (timeframe, timeframe + 1, self.shape[0], self.shape[1], self.shape[2])
                 blockSlice = None
+                # replace the frame if it was exported before
+                if internalPath in h5file:
+                    del h5file[internalPath]
             elif 'LabelImage_v2' in PathInResource:
                 # loop though all blocks in h5 file and read the blockshape, and figure out whether this frame is in there.
-                labelImage = None
+                blockName = None
                 if PathInResource in h5file and len(h5file[PathInResource].keys()) > 0:
+                    for name, block in h5file[PathInResource].items():
+                        roi = _blockRoi(block)
+                        if roi[0][0] <= timeframe < roi[0][1]:
+                            blockName = name
+                            break
                     lastBlock = sorted(h5file[PathInResource].keys())[-1]
                     lastBlockNr = int(lastBlock.replace('block', ''))
                 else:
                     lastBlockNr = -1
-                newBlockName = "block{:04d}".format(lastBlockNr+1)
+
+                # replace the frame if it was exported before
+                if blockName is not None:
+                    block = h5file[PathInResource][blockName]
+                    if roi[0][1] - roi[0][0] > 1:
+                        # the frame is part of a block holding several frames, overwrite it there
+                        block[timeframe - roi[0][0], ..., 0] = labelimage.reshape(block.shape[1:-1])
+                        return
+                    del h5file[PathInResource][blockName]
+                else:
+                    blockName = "block{:04d}".format(lastBlockNr+1)
                 blockSlice = "[{}:{},{}:{},{}:{},{}:{},{}:{}]".format(timeframe, timeframe+1, 0, self.shape[0], 0, self.shape[1], 0, self.shape[2], 0, 1)
-                internalPath = '/'.join([PathInResource, newBlockName])
+                internalPath = '/'.join([PathInResource, blockName])
             else:
                 raise ValueError("Invalid PathInResource: {}".format(PathInResource))
             
@@ -46,7 +46,7 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
         return self.getObjectInitializationList(gmm)
 
 
-    def resolveMerger(self, labelImage, objectId, nextId, mergerCount, initializations=None):
+    def resolveMerger(self, labelImage, objectId, nextId, mergerCount, initializations=None, boundingBox=None, coordinates=None):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into `mergerCount`
         new segments by fitting some kind of model. The `initializations` provide fits
@@ -54,29 +54,35 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
         also be more than `mergerCount`).
   
         `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation
+
+        If given, only the `boundingBox` of the object is searched, or the known `coordinates` are used directly.
   
         **returns** a list of fitted objects
         """
   
         # fit GMM to label image data
-        coordinates = np.transpose(np.vstack(np.where(labelImage == objectId)))
+        coordinates = self.getObjectCoordinates(labelImage, objectId, boundingBox, coordinates)
         gmm = self.initGMM(mergerCount, initializations)
         gmm.fit(coordinates)
         assert(gmm.converged_)
   
         return self.getObjectInitializationList(gmm)
 
-    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None):
+    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None, boundingBox=None, coordinates=None):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into the fitted models with the given new IDs.
         `labelImage` should be updated by replacing all pixels that were labelled with `objectId`
         to get a new Id depending on the fit.
+
+        If given, only the pixels within the `boundingBox` or at the known `coordinates` of the object are
+        read and written, so the cost scales with the size of the object instead of the size of the image.
         """
         
         if len(fits) > 1:
             assert(len(fits) == len(newIds))
             # edit labelimage in-place
-            coordinates = np.transpose(np.vstack(np.where(labelImage == objectId)))
+            coordinates = self.getObjectCoordinates(labelImage, objectId, boundingBox, coordinates)
+            pixelIndices = tuple(coordinates.T)
             if offset is not None:
                 assert(coordinates.shape[1] == len(offset))
                 coordinates = coordinates + offset
@@ -84,4 +90,4 @@ class GMMMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
             responsibilities = gmm.predict(coordinates)
             newIds = np.array(newIds)
             newObjectIds = newIds[responsibilities]
-            labelImage[labelImage == objectId] = newObjectIds
+            labelImage[pixelIndices] = newObjectIds
@@ -0,0 +1,124 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.pluginsystem import merger_resolver_plugin
+import numpy as np
+
+
+class KMeansMergerResolver(merger_resolver_plugin.MergerResolverPlugin):
+    """
+    Resolves mergers by k-means clustering of the pixel coordinates, warm-started from the fits
+    of the preceding frame. Pixels are assigned to the closest cluster center.
+
+    The fits have the same layout as the ones of the `GMMMergerResolver`:
+    a tuple of (weight, covariance, mean, precision cholesky factor) per object, where the covariance
+    is estimated from the pixels of each cluster. Thus the fits can be used wherever a region center
+    (`fit[2]`) is expected.
+    """
+
+    maxIterations = 30
+    covarianceRegularization = 1e-6
+
+    def _initialCenters(self, coordinates, mergerCount, initializations):
+        """
+        Use the means of the given initializations that are closest to the object as initial cluster centers,
+        and add the pixels farthest away from all centers chosen so far if there are not enough initializations.
+        """
+        centers = []
+        if initializations is not None and len(initializations) > 0:
+            means = np.array([o[2] for o in initializations], dtype=np.float64)
+            centroid = coordinates.mean(axis=0)
+            order = np.argsort(np.sum((means - centroid)**2, axis=1), kind='mergesort')
+            centers = [means[i] for i in order[:mergerCount]]
+
+        if len(centers) == 0:
+            # start with the pixel farthest from the centroid
+            centroid = coordinates.mean(axis=0)
+            centers.append(coordinates[np.argmax(np.sum((coordinates - centroid)**2, axis=1))])
+
+        while len(centers) < mergerCount:
+            distances = np.min(self._squaredDistances(coordinates, np.array(centers)), axis=1)
+            centers.append(coordinates[np.argmax(distances)])
+
+        return np.array(centers, dtype=np.float64)
+
+    @staticmethod
+    def _squaredDistances(coordinates, centers):
+        ''' **returns** a `(numPixels, numCenters)` matrix of squared distances '''
+        return np.sum((coordinates[:, np.newaxis, :] - centers[np.newaxis, :, :])**2, axis=2)
+
+    def _fitFromCluster(self, clusterCoordinates, center, numPixels):
+        ''' estimate weight, covariance, mean and precision cholesky factor of one cluster '''
+        ndim = len(center)
+        if len(clusterCoordinates) > 1:
+            covariance = np.atleast_2d(np.cov(clusterCoordinates, rowvar=False, bias=True))
+        else:
+            covariance = np.zeros((ndim, ndim))
+        covariance = covariance + self.covarianceRegularization * np.eye(ndim)
+        precisionCholesky = np.linalg.inv(np.linalg.cholesky(covariance)).T
+        weight = len(clusterCoordinates) / float(max(numPixels, 1))
+        return weight, covariance, center, precisionCholesky
+
+    def resolveMergerForCoords(self, coordinates, mergerCount, initializations=None):
+        """
+        Resolve the pixel coordinates belonging to an object ID, into `mergerCount`
+        new segments by k-means clustering. The `initializations` provide fits
+        in the preceding frame of all possible incomings (list may be empty, but could
+        also be more than `mergerCount`).
+
+        `coordinates` pixel coordinates that belong to a merger ID in labelImage
+
+        `mergerCount` number of clusters
+
+        **returns** a list of fitted objects
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        centers = self._initialCenters(coordinates, mergerCount, initializations)
+
+        assignment = None
+        for _ in range(self.maxIterations):
+            newAssignment = np.argmin(self._squaredDistances(coordinates, centers), axis=1)
+            if assignment is not None and np.array_equal(assignment, newAssignment):
+                break
+            assignment = newAssignment
+            for k in range(mergerCount):
+                members = coordinates[assignment == k]
+                if len(members) > 0:
+                    centers[k] = members.mean(axis=0)
+
+        return [self._fitFromCluster(coordinates[assignment == k], centers[k], len(coordinates)) for k in range(mergerCount)]
+
+    def resolveMerger(self, labelImage, objectId, nextId, mergerCount, initializations=None, boundingBox=None, coordinates=None):
+        """
+        Resolve the object with the ID `objectId` in the `labelImage` into `mergerCount`
+        new segments by k-means clustering. The `initializations` provide fits
+        in the preceding frame of all possible incomings (list may be empty, but could
+        also be more than `mergerCount`).
+
+        `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation
+
+        If given, only the `boundingBox` of the object is searched, or the known `coordinates` are used directly.
+
+        **returns** a list of fitted objects
+        """
+        coordinates = self.getObjectCoordinates(labelImage, objectId, boundingBox, coordinates)
+        return self.resolveMergerForCoords(coordinates, mergerCount, initializations)
+
+    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None, boundingBox=None, coordinates=None):
+        """
+        Resolve the object with the ID `objectId` in the `labelImage` into the fitted models with the given new IDs.
+        `labelImage` is updated by assigning each pixel that was labelled with `objectId` the new Id
+        of the closest cluster center.
+
+        If given, only the pixels within the `boundingBox` or at the known `coordinates` of the object are
+        read and written.
+        """
+        if len(fits) > 1:
+            assert(len(fits) == len(newIds))
+            # edit labelimage in-place
+            coordinates = self.getObjectCoordinates(labelImage, objectId, boundingBox, coordinates)
+            pixelIndices = tuple(coordinates.T)
+            if offset is not None:
+                assert(coordinates.shape[1] == len(offset))
+                coordinates = coordinates + offset
+            centers = np.array([f[2] for f in fits], dtype=np.float64)
+            assignment = np.argmin(self._squaredDistances(np.asarray(coordinates, dtype=np.float64), centers), axis=1)
+            labelImage[pixelIndices] = np.array(newIds)[assignment]
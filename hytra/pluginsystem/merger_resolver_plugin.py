@@ -1,5 +1,6 @@
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
 from yapsy.IPlugin import IPlugin
+import numpy as np
 
 
 class MergerResolverPlugin(IPlugin):
@@ -38,7 +39,7 @@ class MergerResolverPlugin(IPlugin):
 
         return []
 
-    def resolveMerger(self, labelImage, objectId, nextId, mergerCount, initializations=None):
+    def resolveMerger(self, labelImage, objectId, nextId, mergerCount, initializations=None, boundingBox=None, coordinates=None):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into `mergerCount`
         new segments by fitting some kind of model. The `initializations` provide fits
@@ -47,16 +48,38 @@ class MergerResolverPlugin(IPlugin):
 
         `labelImage` is used read-only, use `updateLabelImage` to refine the segmentation
 
+        If known, the `boundingBox` of the object (tuple of slices) and/or its pixel `coordinates`
+        can be passed so that the full label image does not need to be searched (see `getObjectCoordinates`).
+
         **returns** a list of fitted objects
         """
         raise NotImplementedError()
 
         return []
     
-    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None):
+    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None, boundingBox=None, coordinates=None):
         """
         Resolve the object with the ID `objectId` in the `labelImage` into the fitted models with the given new IDs.
         `labelImage` should be updated by replacing all pixels that were labelled with `objectId`
         to get a new Id depending on the fit.
+
+        If known, the `boundingBox` of the object (tuple of slices) and/or its pixel `coordinates`
+        can be passed, then only those pixels should be read and written.
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def getObjectCoordinates(labelImage, objectId, boundingBox=None, coordinates=None):
+        """
+        Helper for plugins to find the pixel coordinates of the object `objectId` in `labelImage`.
+        If `coordinates` are given they are used as they are, if a `boundingBox` (tuple of slices) is given
+        only that region of the label image is searched.
+
+        **returns** a `(numPixels, numDimensions)` array of coordinates in the label image
         """
-        raise NotImplementedError()
\ No newline at end of file
+        if coordinates is not None:
+            return coordinates
+        if boundingBox is None:
+            return np.transpose(np.vstack(np.where(labelImage == objectId)))
+        localCoordinates = np.transpose(np.vstack(np.where(labelImage[boundingBox] == objectId)))
+        return localCoordinates + np.array([s.start for s in boundingBox], dtype=localCoordinates.dtype)
\ No newline at end of file
@@ -155,3 +155,24 @@ class TrackingPluginManager(object):
         ''' get an instance of the selected merger resolver plugin '''
         return self._getPluginOfCategory(self.chosen_merger_resolver, "MergerResolver")
 
+
+# the plugin manager of a worker process, see `initializeWorkerPluginManager`
+_workerPluginManager = None
+
+def initializeWorkerPluginManager(pluginPaths, mergerResolverName, imageProviderName):
+    """
+    Create the plugin manager of a worker process once, with the given `pluginPaths` and chosen plugins,
+    such that it does not need to be pickled and set up again for every task that is sent to the worker.
+
+    Pass it as `initializer` to a `concurrent.futures.ProcessPoolExecutor`, and use `getWorkerPluginManager`
+    within the tasks.
+    """
+    global _workerPluginManager
+    _workerPluginManager = TrackingPluginManager(pluginPaths=pluginPaths)
+    _workerPluginManager.setMergerResolver(mergerResolverName)
+    _workerPluginManager.setImageProvider(imageProviderName)
+
+def getWorkerPluginManager():
+    ''' **returns** the plugin manager created by `initializeWorkerPluginManager` in this process '''
+    assert _workerPluginManager is not None, "initializeWorkerPluginManager was not called in this process"
+    return _workerPluginManager
@@ -0,0 +1,191 @@
+"""
+This module provides an index of the pixels of all objects in a label image, such that coordinates, masks and
+relabeling of single objects can be obtained in O(object size) instead of scanning the full image
+(`labelImage == objectId`) once per object.
+"""
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import collections
+import numpy as np
+
+class LabelImageIndex(object):
+    """
+    Index of all labels in a label image. It is built in a single pass by sorting the flat pixel indices by label.
+    For every label it stores the range of its pixels within that sorted order, as well as its bounding box.
+
+    The pixels of each label are kept in C order, so `coordinates(label)` yields exactly the same
+    array as `np.transpose(np.vstack(np.where(labelImage == label)))`.
+
+    **Note:** the index keeps a reference to the label image, but is not updated if the image is modified in place.
+    """
+
+    def __init__(self, labelImage):
+        self.labelImage = labelImage
+        self.shape = labelImage.shape
+        self.dtype = labelImage.dtype
+
+        flatLabels = np.ravel(labelImage)
+        # stable sort, so that the pixels of one label stay in C order
+        self._order = np.argsort(flatLabels, kind='mergesort')
+        sortedLabels = flatLabels[self._order]
+
+        if len(sortedLabels) > 0:
+            self._starts = np.concatenate(([0], np.flatnonzero(sortedLabels[1:] != sortedLabels[:-1]) + 1))
+        else:
+            self._starts = np.zeros(0, dtype=np.int64)
+        self._labels = sortedLabels[self._starts]
+        self._ends = np.append(self._starts[1:], len(sortedLabels))
+
+        # bounding boxes of all labels, computed axis by axis to keep the memory footprint low
+        self._boxMin = np.zeros((len(self._labels), len(self.shape)), dtype=np.int64)
+        self._boxMax = np.zeros((len(self._labels), len(self.shape)), dtype=np.int64)
+        if len(self._labels) > 0:
+            remainder = self._order
+            for axis in reversed(range(len(self.shape))):
+                coordinate = remainder % self.shape[axis]
+                remainder = remainder // self.shape[axis]
+                self._boxMin[:, axis] = np.minimum.reduceat(coordinate, self._starts)
+                self._boxMax[:, axis] = np.maximum.reduceat(coordinate, self._starts) + 1
+
+    def _position(self, label):
+        ''' **returns** the position of the label in our sorted arrays, or `None` if it is not present '''
+        pos = np.searchsorted(self._labels, label)
+        if pos == len(self._labels) or self._labels[pos] != label:
+            return None
+        return pos
+
+    def __contains__(self, label):
+        return self._position(label) is not None
+
+    def __len__(self):
+        return len(self._labels)
+
+    def labels(self, includeBackground=False):
+        ''' **returns** a sorted array of all labels present in the image, by default without the background label 0 '''
+        if includeBackground:
+            return self._labels.copy()
+        return self._labels[self._labels != 0]
+
+    def maxLabel(self):
+        if len(self._labels) == 0:
+            return 0
+        return self._labels[-1]
+
+    def count(self, label):
+        ''' **returns** the number of pixels with the given label '''
+        pos = self._position(label)
+        if pos is None:
+            return 0
+        return int(self._ends[pos] - self._starts[pos])
+
+    def counts(self, labels):
+        ''' vectorized version of `count`, **returns** an array of pixel counts (0 for labels that are not present) '''
+        labels = np.asarray(labels)
+        if len(self._labels) == 0:
+            return np.zeros(len(labels), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._labels, labels), len(self._labels) - 1)
+        result = self._ends[positions] - self._starts[positions]
+        result[self._labels[positions] != labels] = 0
+        return result
+
+    def flatIndices(self, label):
+        ''' **returns** the indices of all pixels of that label into the flattened (C order) image '''
+        pos = self._position(label)
+        if pos is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._order[self._starts[pos]:self._ends[pos]]
+
+    def coordinates(self, label):
+        ''' **returns** a `(numPixels, numDimensions)` array of the pixel coordinates of that label '''
+        return np.column_stack(np.unravel_index(self.flatIndices(label), self.shape)).reshape(-1, len(self.shape))
+
+    def boundingBox(self, label):
+        '''
+        **returns** the bounding box of the label as tuple of slices (like `scipy.ndimage.find_objects`),
+        or `None` if the label is not present
+        '''
+        pos = self._position(label)
+        if pos is None:
+            return None
+        return tuple(slice(int(lower), int(upper)) for lower, upper in zip(self._boxMin[pos], self._boxMax[pos]))
+
+    def localMask(self, label):
+        '''
+        **returns** a tuple of the bounding box (see `boundingBox`) and a boolean mask of the label within that box,
+        or `(None, None)` if the label is not present
+        '''
+        boundingBox = self.boundingBox(label)
+        if boundingBox is None:
+            return None, None
+        pos = self._position(label)
+        mask = np.zeros([s.stop - s.start for s in boundingBox], dtype=bool)
+        localCoordinates = self.coordinates(label) - self._boxMin[pos]
+        mask[tuple(localCoordinates.T)] = True
+        return boundingBox, mask
+
+    def valuesIn(self, label, image):
+        ''' **returns** the values of another `image` of the same shape at all pixels of the given label '''
+        assert(image.shape == self.shape)
+        return np.ravel(image)[self.flatIndices(label)]
+
+    def assign(self, image, label, values):
+        '''
+        Set all pixels of the given label in `image` (of the same shape, e.g. the label image itself) to `values`,
+        which can be a scalar or an array with one value per pixel in the order of `coordinates(label)`.
+        '''
+        assert(image.shape == self.shape)
+        image.flat[self.flatIndices(label)] = values
+
+    def relabel(self, mapping, out=None, background=0):
+        '''
+        Create a new label image where each label `key` of the `mapping` dictionary is replaced by `mapping[key]`.
+        All pixels whose label is not contained in the mapping are set to `background`.
+        If `out` is given, the mapped labels are written into this array, which is not cleared beforehand.
+
+        **returns** the relabeled image
+        '''
+        if out is None:
+            out = np.full(self.shape, background, dtype=self.dtype)
+        for oldLabel, newLabel in mapping.items():
+            self.assign(out, oldLabel, newLabel)
+        return out
+
+def _sameData(a, b):
+    ''' **returns** True if both arrays are views of the same memory with the same shape, strides and type '''
+    return a is b or (a.__array_interface__['data'][0] == b.__array_interface__['data'][0]
+                      and a.shape == b.shape and a.strides == b.strides and a.dtype == b.dtype)
+
+class LabelImageIndexCache(object):
+    """
+    Keeps the `LabelImageIndex` of the last `maxNumFrames` label images that were requested, e.g. indexed by timestep.
+    """
+
+    def __init__(self, maxNumFrames=2):
+        self.maxNumFrames = maxNumFrames
+        self._indices = collections.OrderedDict()
+
+    def getIndex(self, key, labelImage=None):
+        '''
+        **returns** the cached index for `key`. If `labelImage` is given, the index is rebuilt for that image
+        unless the cached one was built from the same data, which may also be another view of the same array
+        (e.g. `labelImage[0, ..., 0]` taken anew for every call). Raises a `KeyError` if there is no cached index
+        and no `labelImage` was given.
+        '''
+        index = self._indices.pop(key, None)
+        if index is None or (labelImage is not None and not _sameData(index.labelImage, labelImage)):
+            if labelImage is None:
+                raise KeyError(key)
+            index = LabelImageIndex(labelImage)
+        self._indices[key] = index
+        while len(self._indices) > self.maxNumFrames:
+            self._indices.popitem(last=False)
+        return index
+
+    def __contains__(self, key):
+        return key in self._indices
+
+    def invalidate(self, key=None):
+        ''' remove the index of the given key, or all indices if no key is specified '''
+        if key is None:
+            self._indices.clear()
+        else:
+            self._indices.pop(key, None)
@@ -0,0 +1,207 @@
+# pythonpath modification to make hytra available
+# for import without requiring it to be installed
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import sys
+sys.path.insert(0, os.path.abspath('..'))
+# standard imports
+import logging
+import time
+import itertools
+import numpy as np
+import configargparse as argparse
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+from hytra.util.labelimageindex import LabelImageIndex
+
+def getLogger():
+    return logging.getLogger('benchmark_merger_resolvers.py')
+
+def _fitFromCenter(center, radius, weight):
+    ''' create a fit in the (weight, covariance, mean, precision cholesky) layout of our merger resolver plugins '''
+    covariance = np.eye(len(center)) * (radius**2 / 4.0)
+    return weight, covariance, np.array(center, dtype=np.float64), np.linalg.inv(np.linalg.cholesky(covariance)).T
+
+def createSyntheticMergers(numMergers, mergerCount, ndim, radius, seed=42):
+    '''
+    Create `numMergers` synthetic mergers of `mergerCount` overlapping discs (2D) or balls (3D) each.
+
+    **returns** a list of tuples (label image where the merger has ID 1, ground truth label image,
+    initializations obtained from slightly displaced true centers)
+    '''
+    rng = np.random.RandomState(seed)
+    shape = [int(4 * radius * mergerCount)] * ndim
+    grid = np.indices(shape).reshape(ndim, -1).T
+    mergers = []
+    for _ in range(numMergers):
+        centers = [np.array(shape) / 2.0]
+        while len(centers) < mergerCount:
+            # place the next object touching a random previous one, such that the objects overlap
+            direction = rng.normal(size=ndim)
+            direction /= np.linalg.norm(direction)
+            candidate = centers[rng.randint(len(centers))] + direction * radius * rng.uniform(1.2, 1.7)
+            if min(np.linalg.norm(candidate - c) for c in centers) > radius:
+                centers.append(candidate)
+        centers = np.array(centers)
+
+        distances = np.sqrt(np.sum((grid[:, np.newaxis, :] - centers[np.newaxis, :, :])**2, axis=2))
+        inside = np.min(distances, axis=1) <= radius
+        labelImage = inside.astype(np.uint32).reshape(shape)
+        groundTruth = np.zeros(grid.shape[0], dtype=np.uint32)
+        groundTruth[inside] = np.argmin(distances[inside], axis=1) + 1
+        groundTruth = groundTruth.reshape(shape)
+
+        initializations = [_fitFromCenter(c + rng.normal(scale=radius * 0.2, size=ndim), radius, 1.0 / mergerCount) for c in centers]
+        mergers.append((labelImage, groundTruth, initializations))
+    return mergers
+
+def splitAgreement(labelsA, labelsB):
+    '''
+    Fraction of pixels that are assigned to the same segment in both label arrays,
+    under the best matching between the segment IDs of A and B (only feasible for a few segments).
+    '''
+    idsA = np.unique(labelsA)
+    idsB = np.unique(labelsB)
+    overlaps = np.array([[np.sum((labelsA == a) & (labelsB == b)) for b in idsB] for a in idsA])
+    best = 0
+    for permutation in itertools.permutations(range(len(idsB)), min(len(idsA), len(idsB))):
+        best = max(best, sum(overlaps[i, j] for i, j in enumerate(permutation)))
+    return best / float(len(labelsA))
+
+def resolve(plugin, labelImage, objectId, count, initializations, labelImageIndex):
+    '''
+    Fit and relabel one merger with the given plugin.
+
+    **returns** the new labels of the merger's pixels, or `None` if the plugin failed
+    '''
+    coordinates = labelImageIndex.coordinates(objectId)
+    boundingBox = labelImageIndex.boundingBox(objectId)
+    relabeled = labelImage.copy()
+    newIds = list(range(1, count + 1))
+    try:
+        fits = list(plugin.resolveMerger(labelImage, objectId, 0, count, initializations, boundingBox=boundingBox, coordinates=coordinates))
+        plugin.updateLabelImage(relabeled, objectId, fits, newIds, boundingBox=boundingBox, coordinates=coordinates)
+    except (AssertionError, ValueError, np.linalg.LinAlgError) as e:
+        getLogger().debug("Plugin {} failed: {}".format(plugin.__class__.__name__, e))
+        return None
+    return relabeled[tuple(coordinates.T)]
+
+def benchmarkSynthetic(plugins, mergers):
+    print("Synthetic mergers")
+    print("{:>24} {:>14} {:>14} {:>10}".format('plugin', 'time [ms]', 'accuracy', 'failures'))
+    for name, plugin in plugins:
+        duration = 0.0
+        accuracies = []
+        failures = 0
+        for labelImage, groundTruth, initializations in mergers:
+            index = LabelImageIndex(labelImage)
+            count = len(initializations)
+            start = time.time()
+            labels = resolve(plugin, labelImage, 1, count, initializations, index)
+            duration += time.time() - start
+            if labels is None:
+                failures += 1
+                continue
+            accuracies.append(splitAgreement(labels, index.valuesIn(1, groundTruth)))
+        print("{:>24} {:>14.3f} {:>14.4f} {:>10}".format(name,
+                                                        1000.0 * duration / max(len(mergers), 1),
+                                                        np.mean(accuracies) if len(accuracies) > 0 else float('nan'),
+                                                        failures))
+
+def findLargeObjects(pluginManager, labelImageFilename, labelImagePath, mergerSizeFactor):
+    '''
+    Without a tracking result at hand, we consider all objects that are significantly larger than the median object
+    to be mergers, and estimate their object count from the size ratio.
+
+    **returns** a list of tuples (label image, label image index, object ID, object count)
+    '''
+    imageProvider = pluginManager.getImageProvider()
+    shape = imageProvider.getImageShape(labelImageFilename, labelImagePath)
+    timeRange = imageProvider.getTimeRange(labelImageFilename, labelImagePath)
+    frames = []
+    sizes = []
+    for t in range(timeRange[0], timeRange[1]):
+        labelImage = imageProvider.getLabelImageForFrame(labelImageFilename, labelImagePath, t)
+        index = LabelImageIndex(labelImage)
+        frames.append((labelImage, index))
+        sizes.extend(index.counts(index.labels()))
+    getLogger().info("Loaded {} frames of shape {}".format(len(frames), shape))
+
+    medianSize = np.median(sizes)
+    mergers = []
+    for labelImage, index in frames:
+        for objectId in index.labels():
+            count = int(round(index.count(objectId) / medianSize))
+            if index.count(objectId) > mergerSizeFactor * medianSize and count > 1:
+                mergers.append((labelImage, index, objectId, count))
+    return mergers
+
+def benchmarkDataset(plugins, mergers):
+    print("Dataset mergers (quality is the agreement with the first plugin)")
+    print("{:>24} {:>14} {:>14} {:>10}".format('plugin', 'time [ms]', 'agreement', 'failures'))
+    referenceLabels = None
+    for name, plugin in plugins:
+        duration = 0.0
+        allLabels = []
+        failures = 0
+        for labelImage, index, objectId, count in mergers:
+            start = time.time()
+            labels = resolve(plugin, labelImage, objectId, count, [], index)
+            duration += time.time() - start
+            failures += labels is None
+            allLabels.append(labels)
+        if referenceLabels is None:
+            referenceLabels = allLabels
+        agreements = [splitAgreement(a, b) for a, b in zip(allLabels, referenceLabels) if a is not None and b is not None]
+        print("{:>24} {:>14.3f} {:>14.4f} {:>10}".format(name,
+                                                        1000.0 * duration / max(len(mergers), 1),
+                                                        np.mean(agreements) if len(agreements) > 0 else float('nan'),
+                                                        failures))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare runtime and split quality of merger resolver plugins on synthetic mergers '
+                    'and (optionally) on the large objects of a label image, e.g. of the mergerResolvingTestDataset',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-c', '--config', is_config_file=True, help='config file path', dest='config_file')
+    parser.add_argument('--plugins', dest='plugins', type=str, nargs='+',
+                        default=['GMMMergerResolver', 'KMeansMergerResolver'],
+                        help='Names of the merger resolver plugins to compare, the first one is the reference')
+    parser.add_argument('--plugin-paths', dest='pluginPaths', type=str, nargs='+',
+                        default=[os.path.abspath('../hytra/plugins')],
+                        help='A list of paths to search for plugins for the tracking pipeline.')
+    parser.add_argument('--num-synthetic-mergers', dest='num_synthetic_mergers', type=int, default=50,
+                        help='Number of synthetic mergers per merger count')
+    parser.add_argument('--synthetic-radius', dest='synthetic_radius', type=float, default=8.0,
+                        help='Radius of the synthetic objects in pixels')
+    parser.add_argument('--label-image-file', type=str, dest='label_image_filename', default=None,
+                        help='Filename of the HDF5/ilp file containing the segmentation, e.g. '
+                             'tests/mergerResolvingTestDataset/tracking.ilp')
+    parser.add_argument('--label-image-path', dest='label_image_path', type=str,
+                        default='/TrackingFeatureExtraction/LabelImage/0000/[[%d, 0, 0, 0, 0], [%d, %d, %d, %d, 1]]',
+                        help='internal hdf5 path to label image')
+    parser.add_argument('--merger-size-factor', dest='merger_size_factor', type=float, default=1.5,
+                        help='Objects larger than this factor times the median object size are treated as mergers')
+    parser.add_argument("--verbose", dest='verbose', action='store_true', default=False)
+
+    # parse command line
+    args, unknown = parser.parse_known_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
+    getLogger().debug("Ignoring unknown parameters: {}".format(unknown))
+
+    pluginManager = TrackingPluginManager(pluginPaths=args.pluginPaths, verbose=args.verbose)
+    plugins = []
+    for name in args.plugins:
+        pluginManager.setMergerResolver(name)
+        plugins.append((name, pluginManager.getMergerResolver()))
+
+    for ndim, mergerCount in [(2, 2), (2, 3), (3, 2)]:
+        print("\n{}D, {} objects per merger".format(ndim, mergerCount))
+        benchmarkSynthetic(plugins, createSyntheticMergers(args.num_synthetic_mergers, mergerCount, ndim, args.synthetic_radius))
+
+    if args.label_image_filename is not None:
+        print("")
+        benchmarkDataset(plugins, findLargeObjects(pluginManager, args.label_image_filename, args.label_image_path, args.merger_size_factor))
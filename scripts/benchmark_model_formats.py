@@ -0,0 +1,95 @@
+# pythonpath modification to make hytra available
+# for import without requiring it to be installed
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import sys
+sys.path.insert(0, os.path.abspath('..'))
+# standard imports
+import logging
+import time
+import resource
+import tempfile
+import shutil
+import multiprocessing
+import configargparse as argparse
+import hytra.core.jsongraph
+
+def getLogger():
+    return logging.getLogger('benchmark_model_formats.py')
+
+def _peakRSSInMB():
+    ''' peak resident set size of this process, ru_maxrss is given in KB on linux but in bytes on OS X '''
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxRSS / (1024.0 * 1024.0)
+    return maxRSS / 1024.0
+
+def _loadInFreshProcess(filename, queue):
+    '''
+    Runs in a child process, such that the RSS measurement is not influenced by previous loads.
+    Puts (load time, RSS before loading, peak RSS after loading) into the queue.
+    '''
+    rssBefore = _peakRSSInMB()
+    start = time.time()
+    dictionary = hytra.core.jsongraph.readFromFile(filename)
+    duration = time.time() - start
+    queue.put((duration, rssBefore, _peakRSSInMB()))
+    del dictionary
+
+def benchmarkLoading(filename, numRepetitions):
+    '''
+    Load the given file `numRepetitions` times, each in a separate process.
+
+    **returns** a tuple of (minimal load time in seconds, additional peak RSS in MB)
+    '''
+    times = []
+    rssIncrease = []
+    for _ in range(numRepetitions):
+        queue = multiprocessing.Queue()
+        p = multiprocessing.Process(target=_loadInFreshProcess, args=(filename, queue))
+        p.start()
+        duration, rssBefore, rssAfter = queue.get()
+        p.join()
+        times.append(duration)
+        rssIncrease.append(rssAfter - rssBefore)
+    return min(times), min(rssIncrease)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare load time, memory consumption and file size of JSON and HDF5 models/results',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-c', '--config', is_config_file=True, help='config file path', dest='config_file')
+    parser.add_argument('--in', required=True, type=str, dest='in_filename',
+                        help='Filename of the model, weights or result file (JSON or HDF5) to benchmark')
+    parser.add_argument('--repetitions', type=int, dest='repetitions', default=3,
+                        help='Number of times each file is loaded, the minimum is reported')
+    parser.add_argument("--verbose", dest='verbose', action='store_true', default=False)
+
+    # parse command line
+    args, unknown = parser.parse_known_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
+    getLogger().debug("Ignoring unknown parameters: {}".format(unknown))
+
+    tempDir = tempfile.mkdtemp()
+    try:
+        dictionary = hytra.core.jsongraph.readFromFile(args.in_filename)
+        filenames = {'json': os.path.join(tempDir, 'model.json'),
+                     'hdf5': os.path.join(tempDir, 'model.h5')}
+        for filename in filenames.values():
+            hytra.core.jsongraph.writeToFile(filename, dictionary)
+        del dictionary
+
+        print("{:>6} {:>14} {:>14} {:>16}".format('format', 'size [MB]', 'load [s]', 'peak RSS [MB]'))
+        for fileFormat in ['json', 'hdf5']:
+            filename = filenames[fileFormat]
+            duration, rss = benchmarkLoading(filename, args.repetitions)
+            print("{:>6} {:>14.2f} {:>14.3f} {:>16.1f}".format(fileFormat,
+                                                                os.path.getsize(filename) / (1024.0 * 1024.0),
+                                                                duration,
+                                                                rss))
+    finally:
+        shutil.rmtree(tempDir)
@@ -0,0 +1,101 @@
+# pythonpath modification to make hytra available
+# for import without requiring it to be installed
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import sys
+sys.path.insert(0, os.path.abspath('..'))
+# standard imports
+import logging
+import time
+import copy
+import multiprocessing
+import configargparse as argparse
+import hytra.core.jsongraph
+from hytra.core.splittracking import SplitTracking
+
+def getLogger():
+    return logging.getLogger('benchmark_split_tracking.py')
+
+def _sortedResult(result):
+    ''' bring a result into a canonical order, such that results of different runs can be compared '''
+    return {'detectionResults': sorted((int(d['id']), int(d['value'])) for d in result['detectionResults']),
+            'linkingResults': sorted((int(l['src']), int(l['dest']), int(l['value'])) for l in result['linkingResults'])}
+
+def benchmark(model, weights, numFramesPerSplit, numRepetitions, withMergerResolver, **kwargs):
+    '''
+    Run split tracking `numRepetitions` times with the given keyword arguments for `trackFlowBasedWithSplits`.
+
+    **returns** a tuple of (minimal runtime in seconds, result of the last run)
+    '''
+    times = []
+    for _ in range(numRepetitions):
+        # the model is modified while splitting, so every run gets its own copy
+        modelCopy = copy.deepcopy(model)
+        start = time.time()
+        result = SplitTracking.trackFlowBasedWithSplits(modelCopy,
+                                                        weights,
+                                                        numFramesPerSplit,
+                                                        withMergerResolver=withMergerResolver,
+                                                        **kwargs)
+        times.append(time.time() - start)
+    return min(times), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure how split tracking scales with the number of threads and processes, '
+                    'e.g. on a graph that was replicated several times with replicate_graph.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-c', '--config', is_config_file=True, help='config file path', dest='config_file')
+    parser.add_argument('--model', required=True, type=str, dest='model_filename',
+                        help='Filename of the model (JSON or HDF5), e.g. the output of replicate_graph.py')
+    parser.add_argument('--weights', required=True, type=str, dest='weights_filename',
+                        help='Filename of the weights (JSON or HDF5)')
+    parser.add_argument('--num-frames-per-split', type=int, dest='num_frames_per_split', default=20,
+                        help='Number of frames per submodel')
+    parser.add_argument('--max-workers', type=int, dest='max_workers', default=multiprocessing.cpu_count(),
+                        help='Largest number of threads/processes to measure, we use powers of two up to this number')
+    parser.add_argument('--repetitions', type=int, dest='repetitions', default=1,
+                        help='Number of runs per configuration, the minimum is reported')
+    parser.add_argument('--with-merger-resolver', dest='with_merger_resolver', action='store_true', default=False,
+                        help='Use the max flow solver that is used during merger resolving')
+    parser.add_argument("--verbose", dest='verbose', action='store_true', default=False)
+
+    # parse command line
+    args, unknown = parser.parse_known_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+    getLogger().debug("Ignoring unknown parameters: {}".format(unknown))
+
+    model = hytra.core.jsongraph.readFromFile(args.model_filename)
+    weights = hytra.core.jsongraph.readFromFile(args.weights_filename)
+    print("Model contains {} detections and {} links".format(len(model['segmentationHypotheses']),
+                                                             len(model['linkingHypotheses'])))
+
+    serialTime, serialResult = benchmark(model, weights, args.num_frames_per_split, args.repetitions, args.with_merger_resolver)
+    serialResult = _sortedResult(serialResult)
+
+    numWorkers = [1]
+    while numWorkers[-1] * 2 <= args.max_workers:
+        numWorkers.append(numWorkers[-1] * 2)
+    if numWorkers[-1] != args.max_workers:
+        numWorkers.append(args.max_workers)
+
+    print("{:>10} {:>8} {:>12} {:>10} {:>14}".format('mode', 'workers', 'time [s]', 'speedup', 'same result'))
+    print("{:>10} {:>8} {:>12.3f} {:>10.2f} {:>14}".format('serial', 1, serialTime, 1.0, 'yes'))
+    for mode in ['threads', 'processes']:
+        for n in numWorkers:
+            duration, result = benchmark(model,
+                                         weights,
+                                         args.num_frames_per_split,
+                                         args.repetitions,
+                                         args.with_merger_resolver,
+                                         numThreads=n,
+                                         useMultiprocessing=(mode == 'processes'))
+            print("{:>10} {:>8} {:>12.3f} {:>10.2f} {:>14}".format(mode,
+                                                                    n,
+                                                                    duration,
+                                                                    serialTime / duration,
+                                                                    'yes' if _sortedResult(result) == serialResult else 'no'))
@@ -1,9 +1,6 @@
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import argparse
+import hytra.core.jsongraph
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Compare two JSON graphs')
@@ -15,8 +12,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     print("Loading model A: " + args.modelFilenameA)
-    with open(args.modelFilenameA, 'r') as f:
-        modelA = json.load(f)
+    modelA = hytra.core.jsongraph.readFromFile(args.modelFilenameA)
 
     traxelIdPerTimestepToUniqueIdMap = modelA['traxelToUniqueId']
     timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
@@ -29,8 +25,7 @@ if __name__ == "__main__":
             uuidToTraxelMapA[uuid].append((int(t), int(i)))
 
     print("Loading model B: " + args.modelFilenameB)
-    with open(args.modelFilenameB, 'r') as f:
-        modelB = json.load(f)
+    modelB = hytra.core.jsongraph.readFromFile(args.modelFilenameB)
 
     traxelIdPerTimestepToUniqueIdMap = modelB['traxelToUniqueId']
     timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
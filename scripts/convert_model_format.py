@@ -0,0 +1,46 @@
+# pythonpath modification to make hytra available
+# for import without requiring it to be installed
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import sys
+sys.path.insert(0, os.path.abspath('..'))
+# standard imports
+import logging
+import time
+import configargparse as argparse
+import hytra.core.jsongraph
+
+def getLogger():
+    return logging.getLogger('convert_model_format.py')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Convert models, weights or results between JSON and the compact HDF5 format. '
+                    'The direction of the conversion is determined by the file extensions (.json / .h5, .hdf5)',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-c', '--config', is_config_file=True, help='config file path', dest='config_file')
+    parser.add_argument('--in', required=True, type=str, dest='in_filename',
+                        help='Filename of the model, weights or result file to convert')
+    parser.add_argument('--out', required=True, type=str, dest='out_filename',
+                        help='Filename of the converted file')
+    parser.add_argument("--verbose", dest='verbose', action='store_true', default=False)
+
+    # parse command line
+    args, unknown = parser.parse_known_args()
+
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
+    getLogger().debug("Ignoring unknown parameters: {}".format(unknown))
+
+    start = time.time()
+    dictionary = hytra.core.jsongraph.readFromFile(args.in_filename)
+    getLogger().info("Loaded {} in {} secs".format(args.in_filename, time.time() - start))
+
+    start = time.time()
+    hytra.core.jsongraph.writeToFile(args.out_filename, dictionary)
+    getLogger().info("Wrote {} in {} secs".format(args.out_filename, time.time() - start))
+
+    getLogger().info("File size changed from {} to {} bytes".format(os.path.getsize(args.in_filename),
+                                                                     os.path.getsize(args.out_filename)))
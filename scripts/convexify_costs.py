@@ -7,7 +7,7 @@ sys.path.insert(0, os.path.abspath('..'))
 # standard imports
 import logging
 import configargparse as argparse
-from hytra.core.jsongraph import JsonTrackingGraph, writeToFormattedJSON
+from hytra.core.jsongraph import JsonTrackingGraph, writeToFile
 
 def getLogger():
     return logging.getLogger('convexify_costs.py')
@@ -41,4 +41,4 @@ if __name__ == "__main__":
     if args.result_filename is None:
         args.result_filename = args.model_filename
 
-    writeToFormattedJSON(args.result_filename, trackingGraph.model)
+    writeToFile(args.result_filename, trackingGraph.model)
@@ -13,6 +13,7 @@ import time
 import glob
 import logging
 from skimage.external import tifffile
+from hytra.util.labelimageindex import LabelImageIndex
 
 def get_num_frames(options):
     if len(options.input_files) == 1:
@@ -79,11 +80,7 @@ def remap_label_image(label_image, mapping):
     given a label image and a mapping, creates and 
     returns a new label image with remapped object pixel values 
     """
-    remapped_label_image = np.zeros(label_image.shape, dtype=label_image.dtype)
-    for dest, src in mapping.items():
-        remapped_label_image[label_image == dest] = src
-
-    return remapped_label_image
+    return LabelImageIndex(label_image).relabel(mapping)
 
 
 def convert_label_volume(options):
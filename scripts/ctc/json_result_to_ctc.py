@@ -14,6 +14,7 @@ import logging
 from skimage.external import tifffile
 from hytra.core.jsongraph import JsonTrackingGraph
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+from hytra.util.labelimageindex import LabelImageIndex
 
 def getLogger():
     return logging.getLogger(__name__)
@@ -56,11 +57,7 @@ def remap_label_image(label_image, mapping):
     given a label image and a mapping, creates and 
     returns a new label image with remapped object pixel values 
     """
-    remapped_label_image = np.zeros(label_image.shape, dtype=label_image.dtype)
-    for dest, src in mapping.items():
-        remapped_label_image[label_image == dest] = src
-
-    return remapped_label_image
+    return LabelImageIndex(label_image).relabel(mapping)
 
 
 if __name__ == "__main__":
@@ -5,15 +5,12 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('..'))
 # standard importsfrom empryonic import io
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import argparse
 import numpy as np
 import h5py
 from multiprocessing import Pool
 from hytra.util.progressbar import ProgressBar
+import hytra.core.jsongraph
 
 def get_num_frames(options):
     if len(options.input_files) == 1:
@@ -51,8 +48,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     print("Loading model...")
-    with open(args.model_filename, 'r') as f:
-        model = json.load(f)
+    model = hytra.core.jsongraph.readFromFile(args.model_filename)
 
     # load forward mapping and create reverse mapping from json uuid to (timestep,ID)
     traxelIdPerTimestepToUniqueIdMap = model['traxelToUniqueId']
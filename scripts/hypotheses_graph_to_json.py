@@ -774,4 +774,4 @@ if __name__ == "__main__":
     trackingGraph.model['settings']['optimizerEpGap'] = options.ep_gap
 
     # write everything to JSON
-    hytra.core.jsongraph.writeToFormattedJSON(options.json_filename, trackingGraph.model)
+    hytra.core.jsongraph.writeToFile(options.json_filename, trackingGraph.model)
@@ -10,11 +10,8 @@ import logging
 import h5py
 import vigra
 from vigra import numpy as np
-try:
-    import commentjson as json
-except ImportError:
-    import json
 from hytra.util.progressbar import ProgressBar
+import hytra.core.jsongraph
 
 def get_uuid_to_traxel_map(traxelIdPerTimestepToUniqueIdMap):
     timesteps = [t for t in traxelIdPerTimestepToUniqueIdMap.keys()]
@@ -91,11 +88,9 @@ if __name__ == "__main__":
     shape = getShape(args.labelImageFilename, args.labelImagePath)
 
     # load json model and results
-    with open(args.modelFilename, 'r') as f:
-        model = json.load(f)
+    model = hytra.core.jsongraph.readFromFile(args.modelFilename)
 
-    with open(args.resultFilename, 'r') as f:
-        result = json.load(f)
+    result = hytra.core.jsongraph.readFromFile(args.resultFilename)
 
     # load forward mapping and create reverse mapping from json uuid to (timestep,ID)
     traxelIdPerTimestepToUniqueIdMap = model['traxelToUniqueId']
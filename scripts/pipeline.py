@@ -12,93 +12,231 @@ import logging
 from subprocess import check_call
 import configargparse as argparse
 
+# the stages of the pipeline in the order they are run, each with the stages whose outputs it uses
+STAGES = [
+    ('ctc-groundtruth-conversion', []),
+    ('ctc-raw-data-conversion', []),
+    ('ctc-segmentation-conversion', []),
+    ('train-transition-classifier', ['ctc-groundtruth-conversion', 'ctc-raw-data-conversion', 'ctc-segmentation-conversion']),
+    ('extract-weights', []),
+    ('create-graph', ['ctc-raw-data-conversion', 'ctc-segmentation-conversion', 'train-transition-classifier']),
+    ('convexify', ['create-graph']),
+    ('tracking', ['extract-weights', 'create-graph', 'convexify']),
+    ('merger-resolving', ['tracking']),
+    ('export', ['tracking', 'merger-resolving'])
+]
+
+# the conversion scripts write files we do not know about, so their checkpoints only depend on the config
+_CONVERSION_STAGES = ['ctc-groundtruth-conversion', 'ctc-raw-data-conversion', 'ctc-segmentation-conversion', 'train-transition-classifier']
+
+# config file parameters that are only read by merger resolving or the export,
+# changing them does not invalidate the checkpoints of earlier stages
+_MERGER_RESOLVING_PARAMS = ['out-graph-json-file', 'out-label-image-file', 'out-result-json-file', 'merger-fits-file',
+                            'export-from-merger-fits', 'merger-resolver-plugin', 'parallel-fitting', 'merger-solver']
+_EXPORT_PARAMS = ['h5-event-out-dir', 'ctc-output-dir', 'ctc-filename-zero-pad-length', 'h5-event-input-file-pattern',
+                  'h5-event-label-image-path', 'h5-group-zero-pad-length', 'label-image-out']
+
+# pipeline options that influence the tracking result
+_TRACKING_OPTIONS = ['solver', 'decompose_components', 'min_component_batch_size', 'sliding_window_length',
+                     'sliding_window_overlap', 'warm_start_result_filename', 'warm_start_model_filename',
+                     'warm_start_weight_filename', 'warm_start_threshold', 'tracking_executable']
+
+def stage_enabled(stage, options):
+    if stage == 'export':
+        return options.export_format is not None
+    return getattr(options, 'do_' + stage.replace('-', '_'))
+
+def stage_config(stage, options, params):
+    """
+    The configuration values that determine the outcome of a `stage`: the parameters from the config file
+    it may read, and the filenames of the graph, weights and result.
+    """
+    config = {'graph-json-file': options.model_filename,
+              'weight-json-file': options.weight_filename,
+              'result-json-file': options.result_filename}
+    if stage == 'tracking':
+        config.update((k, getattr(options, k)) for k in _TRACKING_OPTIONS)
+        return config
+    if stage == 'export':
+        config.update(params)
+        config['export-format'] = options.export_format
+        return config
+    excluded = _EXPORT_PARAMS + (_MERGER_RESOLVING_PARAMS if stage != 'merger-resolving' else [])
+    config.update((k, v) for k, v in params.items() if k not in excluded)
+    return config
+
+def stage_outputs(stage, options, params):
+    """ **returns** the files a `stage` writes, given how the pipeline is run """
+    writesIntermediateFiles = options.use_subprocesses or options.write_intermediate_files
+    if stage == 'extract-weights':
+        return [options.weight_filename]
+    if stage == 'create-graph':
+        return [options.model_filename]
+    if stage == 'convexify':
+        return [params.get('out-json-file', options.model_filename)] if writesIntermediateFiles else []
+    if stage == 'tracking':
+        # with checkpointing we always write the result, so that a failure in a later stage does not require tracking again
+        if writesIntermediateFiles or options.tracking_executable is not None or not options.do_merger_resolving \
+                or options.stage_manifest_file is not None:
+            return [options.result_filename]
+        return []
+    if stage == 'merger-resolving':
+        return [params[k] for k in ['out-graph-json-file', 'out-result-json-file', 'out-label-image-file', 'merger-fits-file'] if k in params]
+    if stage == 'export':
+        return [params[k] for k in ['h5-event-out-dir', 'ctc-output-dir', 'label-image-out'] if k in params]
+    return []
+
+class StageRunner(object):
+    """
+    Runs the enabled stages, and skips those that are up to date according to the stage manifest (if any).
+    Stages that only keep their outputs in memory are always run.
+    """
+    def __init__(self, options, params, manifest=None):
+        self.options = options
+        self.params = params
+        self.manifest = manifest
+        self.outputs = dict((stage, stage_outputs(stage, options, params)) for stage, _ in STAGES if stage_enabled(stage, options))
+        self.allOutputs = set(os.path.abspath(f) for files in self.outputs.values() for f in files)
+
+    def run(self, stage, run):
+        """
+        Call `run()` if the `stage` is enabled and not up to date.
+
+        **returns** True if the stage was run, False if it was skipped or is disabled
+        """
+        if not stage_enabled(stage, self.options):
+            return False
+        if self.manifest is None:
+            run()
+            return True
+
+        config = stage_config(stage, self.options, self.params)
+        inputFiles = []
+        if stage not in _CONVERSION_STAGES:
+            inputFiles = sorted(set(v for v in config.values() if isinstance(v, str) and os.path.exists(v)
+                                    and os.path.abspath(v) not in self.allOutputs))
+        return self.manifest.runStage(stage,
+                                      run,
+                                      config,
+                                      inputFiles=inputFiles,
+                                      outputFiles=self.outputs[stage],
+                                      upstreamStages=dict(STAGES)[stage],
+                                      force=len(self.outputs[stage]) == 0 and stage not in _CONVERSION_STAGES)
+
+def run_script(description, script, options):
+    logging.info(description)
+    check_call(["python", os.path.abspath(script), "--config", options.config_file])
+
 def run_pipeline(options, unknown):
     """
-    Run the complete tracking pipeline by invoking the scripts as subprocesses.
+    Run the complete tracking pipeline. Data conversion, classifier training, weight extraction and graph creation
+    are run as scripts in subprocesses, all following stages run in this process unless `--use-subprocesses` is given.
     Using the `do-SOMETHING` switches one can configure which parts of the pipeline are run.
 
+    With a `--stage-manifest-file`, every stage records a checkpoint when it finishes, and stages whose inputs
+    and outputs did not change since are skipped when the pipeline is restarted. `--force-stage` re-runs a stage anyway.
+
     **Params:**
 
     * `options`: the options of the tracking script as returned from argparse
     * `unknown`: unknown parameters read from the config file, needed in case merger resolving is supposed to be run.
 
     """
+    from hytra.core.trackingpipeline import convertToDict
+    params = convertToDict(unknown)
 
-    if options.do_ctc_groundtruth_conversion:
-        logging.info("Convert CTC groundtruth to our format...")
-        check_call(["python", os.path.abspath("ctc/ctc_gt_to_hdf5.py"), "--config", options.config_file])
-
-    if options.do_ctc_raw_data_conversion:
-        logging.info("Convert CTC raw data to HDF5...")
-        check_call(["python", os.path.abspath("ctc/stack_to_h5.py"), "--config", options.config_file])
-    if options.do_ctc_segmentation_conversion:
+    manifest = None
+    if options.stage_manifest_file is not None:
+        from hytra.core.stagemanifest import StageManifest
+        unknownStages = set(options.force_stages) - set(stage for stage, _ in STAGES)
+        if len(unknownStages) > 0:
+            raise ValueError("Unknown stages {}, choose from {}".format(sorted(unknownStages), [stage for stage, _ in STAGES]))
+        manifest = StageManifest(options.stage_manifest_file, options.force_stages, options.hash_stage_files)
+    runner = StageRunner(options, params, manifest)
 
-        logging.info("Convert CTC segmentation to HDF5...")
-        check_call(["python", os.path.abspath("ctc/segmentation_to_hdf5.py"), "--config", options.config_file])
+    runner.run('ctc-groundtruth-conversion',
+               lambda: run_script("Convert CTC groundtruth to our format...", "ctc/ctc_gt_to_hdf5.py", options))
+    runner.run('ctc-raw-data-conversion',
+               lambda: run_script("Convert CTC raw data to HDF5...", "ctc/stack_to_h5.py", options))
+    runner.run('ctc-segmentation-conversion',
+               lambda: run_script("Convert CTC segmentation to HDF5...", "ctc/segmentation_to_hdf5.py", options))
+    runner.run('train-transition-classifier',
+               lambda: run_script("Train transition classifier...", "train_transition_classifier.py", options))
+    runner.run('extract-weights',
+               lambda: run_script("Extracting weights from ilastik project...", "tracking_ilp_to_weights.py", options))
+    runner.run('create-graph',
+               lambda: run_script("Create hypotheses graph...", "hypotheses_graph_to_json.py", options))
 
-    if options.do_train_transition_classifier:
-        logging.info("Train transition classifier...")
-        check_call(["python", os.path.abspath("train_transition_classifier.py"), "--config", options.config_file])
-
-    if options.do_extract_weights:
-        logging.info("Extracting weights from ilastik project...")
-        check_call(["python", os.path.abspath("tracking_ilp_to_weights.py"), "--config", options.config_file])
+    if options.use_subprocesses:
+        run_stages_as_scripts(runner, options, params)
+    else:
+        run_stages_in_process(runner, options, params)
 
-    if options.do_create_graph:
-        logging.info("Create hypotheses graph...")
-        check_call(["python", os.path.abspath("hypotheses_graph_to_json.py"), "--config", options.config_file])
+def solve_model(model, weights, options):
+    """
+    Track the `model` with the solver and strategy (component decomposition, sliding window, or plain solve
+    with optional warm start and result cache) chosen in the `options`.
+    """
+    if options.decompose_components:
+        from hytra.core.componentdecomposition import trackWithComponentDecomposition
+        result = trackWithComponentDecomposition(model,
+                                                 weights,
+                                                 solver=options.solver,
+                                                 numWorkers=options.num_workers,
+                                                 minBatchSize=options.min_component_batch_size)
+    elif options.sliding_window_length is not None:
+        from hytra.core.slidingwindowtracking import trackWithSlidingWindow
+        result = trackWithSlidingWindow(model,
+                                        weights,
+                                        options.sliding_window_length,
+                                        overlap=options.sliding_window_overlap,
+                                        solver=options.solver)
+    else:
+        import hytra.core.solvers
+        warmStart = None
+        if options.warm_start_result_filename is not None:
+            from hytra.core.warmstart import readWarmStart
+            warmStart = readWarmStart(options.warm_start_result_filename,
+                                      options.warm_start_model_filename,
+                                      options.warm_start_weight_filename,
+                                      options.warm_start_threshold)
+        cache = None
+        if options.result_cache_dir is not None:
+            from hytra.core.resultcache import ResultCache
+            cache = ResultCache(options.result_cache_dir, options.result_cache_size * 1024 * 1024)
+        result = hytra.core.solvers.solve(model, weights, options.solver, warmStart, cache)
+    return result
 
-    if options.do_convexify:
-        logging.info("Convexifying graph energies...")
-        check_call(["python", os.path.abspath("convexify_costs.py"), "--config", options.config_file])
+def run_stages_as_scripts(runner, options, params):
+    """
+    Run convexification, tracking, merger resolving and export by invoking the scripts as subprocesses,
+    which pass the graph and result through the files given in the config file.
+    """
+    runner.run('convexify', lambda: run_script("Convexifying graph energies...", "convexify_costs.py", options))
 
-    if options.do_tracking:
+    def track():
         logging.info("Run tracking...")
-
         if options.tracking_executable is not None:
             check_call([options.tracking_executable,
                         "-m", options.model_filename,
                         "-w", options.weight_filename,
                         "-o", options.result_filename])
         else:
-            try:
-                import commentjson as json
-            except ImportError:
-                import json
-            
             import hytra.core.jsongraph
-            with open(options.model_filename, 'r') as f:
-                model = json.load(f)
-
-            with open(options.weight_filename, 'r') as f:
-                weights = json.load(f)
-            
-            if options.solver == "flow-based":
-                import dpct
-                result = dpct.trackFlowBased(model, weights)
-            elif options.solver == "ilp":
-                try:
-                    import multiHypoTracking_with_cplex as mht
-                except ImportError:
-                    try:
-                        import multiHypoTracking_with_gurobi as mht
-                    except ImportError:
-                        raise ImportError("Could not find multi hypotheses tracking ilp solver")
-                result = mht.track(model, weights)
-
-            hytra.core.jsongraph.writeToFormattedJSON(options.result_filename, result)
+            model = hytra.core.jsongraph.readFromFile(options.model_filename)
+            weights = hytra.core.jsongraph.readFromFile(options.weight_filename)
+            result = solve_model(model, weights, options)
+            hytra.core.jsongraph.writeToFile(options.result_filename, result)
+    runner.run('tracking', track)
 
+    runner.run('merger-resolving', lambda: run_script("Run merger resolving", "run_merger_resolving.py", options))
     extra_params = []
     if options.do_merger_resolving:
-        logging.info("Run merger resolving")
-        check_call(["python", os.path.abspath("run_merger_resolving.py"), "--config", options.config_file])
-
-        for p in ["--out-graph-json-file", "--out-label-image-file", "--out-result-json-file"]:
-            index = unknown.index(p)
-            extra_params.append(p.replace('--out-', '--'))
-            extra_params.append(unknown[index + 1])
+        for p in ["out-graph-json-file", "out-label-image-file", "out-result-json-file"]:
+            extra_params.append('--' + p.replace('out-', ''))
+            extra_params.append(params[p])
 
-    if options.export_format is not None:
+    def export():
         logging.info("Convert result to {}...".format(options.export_format))
         if options.export_format in ['ilastikH5', 'ctc']:
             check_call(["python", os.path.abspath("json_result_to_events.py"), "--config", options.config_file] + extra_params)
@@ -106,9 +244,122 @@ def run_pipeline(options, unknown):
                 check_call(["python", os.path.abspath("ctc/hdf5_to_ctc.py"), "--config", options.config_file] + extra_params)
         elif options.export_format == 'labelimage':
             check_call(["python", os.path.abspath("json_result_to_labelimage.py"), "--config", options.config_file] + extra_params)
-        elif options.export_format is not None:
+        else:
+            logging.error("Unknown export format chosen!")
+            raise ValueError("Unknown export format chosen!")
+    runner.run('export', export)
+
+def run_stages_in_process(runner, options, params):
+    """
+    Run convexification, tracking, merger resolving and export with a `hytra.core.trackingpipeline.TrackingPipeline`,
+    which passes the graph and result between the stages in memory. The parameters of the stages are read
+    from the config file, just like the scripts would do.
+    Intermediate files are only written with `--write-intermediate-files`, or if a later stage needs them.
+    If a stage is skipped because it is up to date, its outputs are read from disk instead.
+    """
+    from hytra.core.trackingpipeline import TrackingPipeline
+
+    pluginPaths = [os.path.abspath(p) for p in params.get('plugin-paths', '../hytra/plugins').split()]
+    pipeline = TrackingPipeline(pluginPaths=pluginPaths, verbose=options.verbose)
+    convexifiedModelFilename = params.get('out-json-file', options.model_filename)
+
+    # Weights, graph and result are only read by the stages that need them, from the file that holds their latest
+    # version. A filename of None means that the latest version only exists in memory.
+    latestFiles = {'model': options.model_filename, 'result': options.result_filename}
+
+    def loadWeights():
+        if pipeline.weights is None:
+            pipeline.readWeights(options.weight_filename)
+
+    def loadModel():
+        if pipeline.model is None:
+            pipeline.readModel(latestFiles['model'])
+
+    def loadResult():
+        if pipeline.result is None:
+            pipeline.readResult(latestFiles['result'])
+
+    def convexify():
+        loadModel()
+        pipeline.convexify(float(params.get('epsilon', 0.000001)))
+        latestFiles['model'] = None
+        if options.write_intermediate_files:
+            pipeline.writeModel(convexifiedModelFilename)
+            latestFiles['model'] = convexifiedModelFilename
+    if not runner.run('convexify', convexify) and options.do_convexify:
+        latestFiles['model'] = convexifiedModelFilename
+
+    def track():
+        if options.tracking_executable is not None:
+            if latestFiles['model'] is None:
+                pipeline.writeModel(convexifiedModelFilename)
+                latestFiles['model'] = convexifiedModelFilename
+            logging.info("Run tracking...")
+            check_call([options.tracking_executable,
+                        "-m", latestFiles['model'],
+                        "-w", options.weight_filename,
+                        "-o", options.result_filename])
+            pipeline.result = None
+        else:
+            loadWeights()
+            loadModel()
+            logging.info("Run tracking...")
+            pipeline.result = solve_model(pipeline.model, pipeline.weights, options)
+            latestFiles['result'] = None
+            if options.result_filename in runner.outputs['tracking']:
+                pipeline.writeResult(options.result_filename)
+                latestFiles['result'] = options.result_filename
+    runner.run('tracking', track)
+
+    labelImageFilename = params.get('label-image-file')
+    extra_params = []
+    def resolveMergers():
+        loadModel()
+        loadResult()
+        pipeline.resolveMergers(params['label-image-file'],
+                                params.get('label-image-path', '/TrackingFeatureExtraction/LabelImage/0000/[[%d, 0, 0, 0, 0], [%d, %d, %d, %d, 1]]'),
+                                params['out-label-image-file'],
+                                params.get('raw-data-file'),
+                                params.get('raw-data-path', 'volume/data'),
+                                params.get('raw-data-axes', 'txyzc'),
+                                transitionClassifierFilename=params.get('transition-classifier-file'),
+                                transitionClassifierPath=params.get('transition-classifier-path', '/'),
+                                useMultiprocessing='parallel-fitting' in params,
+                                numWorkers=options.num_workers,
+                                mergerResolverPluginName=params.get('merger-resolver-plugin', 'GMMMergerResolver'),
+                                solver=params.get('merger-solver', 'max-flow'))
+        if 'merger-fits-file' in params:
+            pipeline.mergerResolver.saveMergerFits(params['merger-fits-file'])
+        # the resolved graph and result are the final outputs of the pipeline
+        pipeline.writeModel(params['out-graph-json-file'])
+        pipeline.writeResult(params['out-result-json-file'])
+    if options.do_merger_resolving:
+        if not runner.run('merger-resolving', resolveMergers):
+            pipeline.model = None
+            pipeline.result = None
+        latestFiles['model'] = params['out-graph-json-file']
+        latestFiles['result'] = params['out-result-json-file']
+        labelImageFilename = params['out-label-image-file']
+        for p in ["out-graph-json-file", "out-label-image-file", "out-result-json-file"]:
+            extra_params.append('--' + p.replace('out-', ''))
+            extra_params.append(params[p])
+
+    def export():
+        logging.info("Convert result to {}...".format(options.export_format))
+        if options.export_format in ['ilastikH5', 'ctc']:
+            loadModel()
+            loadResult()
+            pipeline.exportEvents(labelImageFilename,
+                                  params.get('label-image-path', '/ObjectExtraction/LabelImage/0/[[%d, 0, 0, 0, 0], [%d, %d, %d, %d, 1]]'),
+                                  params.get('h5-event-out-dir', '.'))
+            if options.export_format == 'ctc':
+                check_call(["python", os.path.abspath("ctc/hdf5_to_ctc.py"), "--config", options.config_file] + extra_params)
+        elif options.export_format == 'labelimage':
+            check_call(["python", os.path.abspath("json_result_to_labelimage.py"), "--config", options.config_file] + extra_params)
+        else:
             logging.error("Unknown export format chosen!")
             raise ValueError("Unknown export format chosen!")
+    runner.run('export', export)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -128,7 +379,41 @@ if __name__ == "__main__":
     parser.add_argument("--export-format", dest='export_format', type=str, default=None,
                         help='Export format may be one of: "ilastikH5", "ctc", "labelimage", or None')
     parser.add_argument("--solver", dest='solver', default='flow-based', type=str,
-                        help='Name of the solver to use, can be "ilp" or "flow-based"')
+                        help='Name of the solver to use, can be "ilp", "flow-based" or "python-flow"')
+    parser.add_argument("--decompose-components", dest='decompose_components', action='store_true', default=False,
+                        help='Track the independent connected components of the graph separately and in parallel')
+    parser.add_argument("--num-workers", dest='num_workers', type=int, default=None,
+                        help='Number of processes used to track components, defaults to the number of CPU cores')
+    parser.add_argument("--min-component-batch-size", dest='min_component_batch_size', type=int, default=1000,
+                        help='Small components are batched together until they contain at least this many detections')
+    parser.add_argument("--sliding-window-length", dest='sliding_window_length', type=int, default=None,
+                        help='Track in overlapping windows of this many frames, one after another')
+    parser.add_argument("--sliding-window-overlap", dest='sliding_window_overlap', type=int, default=1,
+                        help='Number of frames shared by consecutive windows, their solution is fixed in the later window')
+    parser.add_argument("--warm-start-result-file", dest='warm_start_result_filename', type=str, default=None,
+                        help='Result of a previous run to start from, e.g. after changing the weights')
+    parser.add_argument("--warm-start-graph-file", dest='warm_start_model_filename', type=str, default=None,
+                        help='Graph of the previous run, needed to find the changed components if the solver cannot warm start')
+    parser.add_argument("--warm-start-weight-file", dest='warm_start_weight_filename', type=str, default=None,
+                        help='Weights of the previous run, if not given they are assumed to be unchanged')
+    parser.add_argument("--warm-start-threshold", dest='warm_start_threshold', type=float, default=1e-6,
+                        help='Components are only solved again if an energy changed by more than this')
+    parser.add_argument("--result-cache-dir", dest='result_cache_dir', type=str, default=None,
+                        help='Directory in which results are cached, such that the same model and weights are not solved twice')
+    parser.add_argument("--result-cache-size", dest='result_cache_size', type=int, default=1024,
+                        help='Maximum size of the result cache in MB, least recently used results are removed first')
+    parser.add_argument("--use-subprocesses", dest='use_subprocesses', action='store_true', default=False,
+                        help='Run convexification, tracking, merger resolving and export as separate scripts '
+                             'instead of passing graph and result between them in memory')
+    parser.add_argument("--write-intermediate-files", dest='write_intermediate_files', action='store_true', default=False,
+                        help='When running in process, also write the convexified graph and the result before merger resolving')
+    parser.add_argument("--stage-manifest-file", dest='stage_manifest_file', type=str, default=None,
+                        help='JSON file in which finished stages are recorded, such that unchanged stages are skipped on restart')
+    parser.add_argument("--force-stage", dest='force_stages', type=str, action='append', default=[],
+                        help='Re-run this stage even if it is up to date, can be given multiple times. One of: '
+                             + ', '.join(stage for stage, _ in STAGES))
+    parser.add_argument("--hash-stage-files", dest='hash_stage_files', action='store_true', default=False,
+                        help='Compare the inputs and outputs of stages by content instead of size and modification time')
     parser.add_argument("--tracking-executable", dest='tracking_executable', default=None,
                         type=str, help='executable that can run tracking based on JSON specified models')
     parser.add_argument('--graph-json-file', type=str, dest='model_filename',
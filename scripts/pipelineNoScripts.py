@@ -1,5 +1,6 @@
 """
 Run the full pipeline, configured by a config file, but without calling a series of other scripts.
+All stages run in this process using `hytra.core.trackingpipeline.TrackingPipeline`.
 """
 from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
 # pythonpath modification to make hytra available
@@ -9,42 +10,16 @@ import sys
 sys.path.insert(0, os.path.abspath('..'))
 
 import logging
-try:
-    import commentjson as json
-except ImportError:
-    import json
-import dpct
 from subprocess import check_call
 import configargparse as argparse
-import hytra.core.ilastik_project_options
-from hytra.core.jsongraph import JsonTrackingGraph
-from hytra.core.ilastikhypothesesgraph import IlastikHypothesesGraph
-from hytra.core.fieldofview import FieldOfView
-from hytra.core.jsonmergerresolver import JsonMergerResolver
-
-def convertToDict(unknown):
-    indicesOfParameters = [i for i, p in enumerate(unknown) if p.startswith('--')]
-    keys = [u.replace('--', '') for u in [unknown[i] for i in indicesOfParameters]]
-    values = []
-    for i in indicesOfParameters:
-        if i + 1 > len(unknown) or unknown[i + 1].startswith('--'):
-            values.append(True)
-        else:
-            values.append(unknown[i + 1])
-    return dict(zip(keys, values))
-
-def constructFov(shape, t0, t1, scale=[1, 1, 1]):
-    [xshape, yshape, zshape] = shape
-    [xscale, yscale, zscale] = scale
-
-    fov = FieldOfView(t0, 0, 0, 0, t1, xscale * (xshape - 1), yscale * (yshape - 1),
-                      zscale * (zshape - 1))
-    return fov
+from hytra.core.trackingpipeline import TrackingPipeline, convertToDict, ilastikProjectOptionsFromParams
 
 def run_pipeline(options, unknown):
     """
     Run the complete tracking pipeline by invoking the different steps.
     Using the `do-SOMETHING` switches one can configure which parts of the pipeline are run.
+    The graph, model and result are passed between the steps in memory, and are only written to disk
+    if `--write-intermediate-files` is given. The final result is always written.
 
     **Params:**
 
@@ -54,133 +29,94 @@ def run_pipeline(options, unknown):
     """
 
     params = convertToDict(unknown)
-    
+    pipeline = TrackingPipeline(pluginPaths=[str('../hytra/plugins')])
+
     if options.do_extract_weights:
-        logging.info("Extracting weights from ilastik project...")
-        weights = hytra.core.ilastik_project_options.extractWeightDictFromIlastikProject(options.ilastik_tracking_project)
+        pipeline.extractWeights(options.ilastik_tracking_project)
     else:
-        with open(options.weight_filename, 'r') as f:
-            weights = json.load(f)
+        pipeline.readWeights(options.weight_filename)
 
+    ilpOptions = ilastikProjectOptionsFromParams(params, options.ilastik_tracking_project)
+    # the file that holds the current model, None if it only exists in memory
+    modelFilename = options.model_filename
     if options.do_create_graph:
-        logging.info("Create hypotheses graph...")
-
-        import hytra.core.probabilitygenerator as probabilitygenerator
-        from hytra.core.ilastik_project_options import IlastikProjectOptions
-        ilpOptions = IlastikProjectOptions()
-        ilpOptions.labelImagePath = params[str('label-image-path')]
-        ilpOptions.labelImageFilename = params[str('label-image-file')]
-        ilpOptions.rawImagePath = params[str('raw-data-path')]
-        ilpOptions.rawImageFilename = params[str('raw-data-file')]
-        try:
-            ilpOptions.rawImageAxes = params[str('raw-data-axes')]
-        except:
-            ilpOptions.rawImageAxes = 'txyzc'
-
-        ilpOptions.sizeFilter = [int(params[str('min-size')]), 100000]
-
-        if 'object-count-classifier-file' in params:
-            ilpOptions.objectCountClassifierFilename = params[str('object-count-classifier-file')]
+        pipeline.createGraph(ilpOptions,
+                             maxNumObjects=int(params[str('max-number-objects')]),
+                             numNearestNeighbors=int(params[str('max-nearest-neighbors')]),
+                             withDivisions=ilpOptions.divisionClassifierFilename is not None)
+        if options.write_intermediate_files:
+            pipeline.writeModel(options.model_filename)
         else:
-            ilpOptions.objectCountClassifierFilename = options.ilastik_tracking_project
-
-        withDivisions = 'without-divisions' not in params
-        if withDivisions:
-            if 'division-classifier-file' in params:
-                ilpOptions.divisionClassifierFilename = params[str('division-classifier-file')]
-            else:
-                ilpOptions.divisionClassifierFilename = options.ilastik_tracking_project
-        else:
-            ilpOptions.divisionClassifierFilename = None
-
-        probGenerator = probabilitygenerator.IlpProbabilityGenerator(ilpOptions, 
-                                              pluginPaths=[str('../hytra/plugins')],
-                                              useMultiprocessing=False)
-
-        # if time_range is not None:
-        #     traxelstore.timeRange = time_range
-
-        probGenerator.fillTraxels(usePgmlink=False)
-        fieldOfView = constructFov(probGenerator.shape,
-                                   probGenerator.timeRange[0],
-                                   probGenerator.timeRange[1],
-                                   [probGenerator.x_scale,
-                                   probGenerator.y_scale,
-                                   probGenerator.z_scale])
-
-        hypotheses_graph = IlastikHypothesesGraph(
-            probabilityGenerator=probGenerator,
-            timeRange=probGenerator.timeRange,
-            maxNumObjects=int(params[str('max-number-objects')]),
-            numNearestNeighbors=int(params[str('max-nearest-neighbors')]),
-            fieldOfView=fieldOfView,
-            withDivisions=withDivisions,
-            divisionThreshold=0.1
-        )
-
-        withTracklets = True
-        if withTracklets:
-            hypotheses_graph = hypotheses_graph.generateTrackletGraph()
-
-        hypotheses_graph.insertEnergies()
-        trackingGraph = hypotheses_graph.toTrackingGraph()
+            modelFilename = None
     else:
-        trackingGraph = JsonTrackingGraph(model_filename=options.model_filename)
+        pipeline.readModel(options.model_filename)
 
     if options.do_convexify:
-        logging.info("Convexifying graph energies...")
-        trackingGraph.convexifyCosts()
-
-    # get model out of trackingGraph
-    model = trackingGraph.model
+        pipeline.convexify()
+        if options.write_intermediate_files:
+            pipeline.writeModel(options.model_filename)
+        else:
+            modelFilename = None
 
     if options.do_tracking:
-        logging.info("Run tracking...")
-        if options.solver == "flow-based":
-            result = dpct.trackFlowBased(model, weights)
-        elif options.solver == "ilp":
-            try:
-                import multiHypoTracking_with_cplex as mht
-            except ImportError:
-                try:
-                    import multiHypoTracking_with_gurobi as mht
-                except ImportError:
-                    raise ImportError("Could not find multi hypotheses tracking ilp solver")
-            result = mht.track(model, weights)
-            
-        hytra.core.jsongraph.writeToFormattedJSON(options.result_filename, result)
-        
-        if hypotheses_graph:
-            # insert the solution into the hypotheses graph and from that deduce the lineages
-            hypotheses_graph.insertSolution(result)
-            hypotheses_graph.computeLineage()
-
+        warmStart = None
+        if options.warm_start_result_filename is not None:
+            from hytra.core.warmstart import readWarmStart
+            warmStart = readWarmStart(options.warm_start_result_filename,
+                                      options.warm_start_model_filename,
+                                      options.warm_start_weight_filename,
+                                      options.warm_start_threshold)
+        cache = None
+        if options.result_cache_dir is not None:
+            from hytra.core.resultcache import ResultCache
+            cache = ResultCache(options.result_cache_dir, options.result_cache_size * 1024 * 1024)
+        pipeline.track(options.solver,
+                       warmStart=warmStart,
+                       cache=cache,
+                       decomposeComponents=options.decompose_components,
+                       numWorkers=options.num_workers,
+                       minComponentBatchSize=options.min_component_batch_size,
+                       slidingWindowLength=options.sliding_window_length,
+                       slidingWindowOverlap=options.sliding_window_overlap)
+        if not options.do_merger_resolving or options.write_intermediate_files:
+            pipeline.writeResult(options.result_filename)
+    elif options.do_merger_resolving or options.export_format is not None:
+        pipeline.readResult(options.result_filename)
+
+    resultFilename = options.result_filename
+    labelImageFilename = ilpOptions.labelImageFilename
     if options.do_merger_resolving:
-        logging.info("Run merger resolving")
-        trackingGraph = JsonTrackingGraph(model=model, result=result)
-        merger_resolver = JsonMergerResolver(
-            trackingGraph,
-            ilpOptions.labelImageFilename,
-            ilpOptions.labelImagePath,
-            params[str('out-label-image-file')],
-            ilpOptions.rawImageFilename,
-            ilpOptions.rawImagePath,
-            ilpOptions.rawImageAxes,
-            [str('../hytra/plugins')],
-            True)
-        ilpOptions.labelImagePath = params[str('label-image-path')]
-        ilpOptions.labelImageFilename = params[str('label-image-file')]
-        ilpOptions.rawImagePath = params[str('raw-data-path')]
-        ilpOptions.rawImageFilename = params[str('raw-data-file')]
-        try:
-            ilpOptions.rawImageAxes = params[str('raw-data-axes')]
-        except:
-            ilpOptions.rawImageAxes = 'txyzc'
-        merger_resolver.run(None,  None)
-
-        ## resolved model and result are now here:
-        # merger_resolver.model
-        # merger_resolver.result
+        pipeline.resolveMergers(ilpOptions.labelImageFilename,
+                                ilpOptions.labelImagePath,
+                                params[str('out-label-image-file')],
+                                ilpOptions.rawImageFilename,
+                                ilpOptions.rawImagePath,
+                                ilpOptions.rawImageAxes)
+        labelImageFilename = params[str('out-label-image-file')]
+        # the resolved model and result are the final result of the pipeline
+        modelFilename = params.get(str('out-graph-json-file'))
+        if modelFilename is not None:
+            pipeline.writeModel(modelFilename)
+        resultFilename = params.get(str('out-result-json-file'), options.result_filename)
+        pipeline.writeResult(resultFilename)
+
+    if options.export_format in ['ilastikH5', 'ctc']:
+        pipeline.exportEvents(labelImageFilename, ilpOptions.labelImagePath, params.get(str('h5-event-out-dir'), '.'))
+        if options.export_format == 'ctc':
+            logging.info("Convert result to ctc...")
+            check_call(["python", os.path.abspath("ctc/hdf5_to_ctc.py"), "--config", options.config_file])
+    elif options.export_format == 'labelimage':
+        # the conversion script reads the final graph and result from disk
+        if modelFilename is None:
+            modelFilename = params.get(str('out-graph-json-file'), options.model_filename)
+            pipeline.writeModel(modelFilename)
+        logging.info("Convert result to labelimage...")
+        check_call(["python", os.path.abspath("json_result_to_labelimage.py"), "--config", options.config_file,
+                    "--graph-json-file", modelFilename,
+                    "--result-json-file", resultFilename,
+                    "--label-image-file", labelImageFilename])
+    elif options.export_format is not None:
+        logging.warning("Unknown export format {} chosen, skipping the export".format(options.export_format))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -200,7 +136,31 @@ if __name__ == "__main__":
     parser.add_argument("--export-format", dest='export_format', type=str, default=None,
                         help='Export format may be one of: "ilastikH5", "ctc", "labelimage", or None')
     parser.add_argument("--solver", dest='solver', default='flow-based', type=str,
-                        help='Name of the solver to use, can be "ilp" or "flow-based"')
+                        help='Name of the solver to use, can be "ilp", "flow-based" or "python-flow"')
+    parser.add_argument("--decompose-components", dest='decompose_components', action='store_true', default=False,
+                        help='Track the independent connected components of the graph separately and in parallel')
+    parser.add_argument("--num-workers", dest='num_workers', type=int, default=None,
+                        help='Number of processes used to track components, defaults to the number of CPU cores')
+    parser.add_argument("--min-component-batch-size", dest='min_component_batch_size', type=int, default=1000,
+                        help='Small components are batched together until they contain at least this many detections')
+    parser.add_argument("--sliding-window-length", dest='sliding_window_length', type=int, default=None,
+                        help='Track in overlapping windows of this many frames, one after another')
+    parser.add_argument("--sliding-window-overlap", dest='sliding_window_overlap', type=int, default=1,
+                        help='Number of frames shared by consecutive windows, their solution is fixed in the later window')
+    parser.add_argument("--warm-start-result-file", dest='warm_start_result_filename', type=str, default=None,
+                        help='Result of a previous run to start from, e.g. after changing the weights')
+    parser.add_argument("--warm-start-graph-file", dest='warm_start_model_filename', type=str, default=None,
+                        help='Graph of the previous run, needed to find the changed components if the solver cannot warm start')
+    parser.add_argument("--warm-start-weight-file", dest='warm_start_weight_filename', type=str, default=None,
+                        help='Weights of the previous run, if not given they are assumed to be unchanged')
+    parser.add_argument("--warm-start-threshold", dest='warm_start_threshold', type=float, default=1e-6,
+                        help='Components are only solved again if an energy changed by more than this')
+    parser.add_argument("--result-cache-dir", dest='result_cache_dir', type=str, default=None,
+                        help='Directory in which results are cached, such that the same model and weights are not solved twice')
+    parser.add_argument("--result-cache-size", dest='result_cache_size', type=int, default=1024,
+                        help='Maximum size of the result cache in MB, least recently used results are removed first')
+    parser.add_argument("--write-intermediate-files", dest='write_intermediate_files', action='store_true', default=False,
+                        help='Also write the graph after creation and convexification, and the result before merger resolving')
     parser.add_argument("--ilastik-tracking-project", dest='ilastik_tracking_project', required=True,
                         type=str, help='ilastik tracking project file that contains the chosen weights')
     parser.add_argument('--graph-json-file', required=True, type=str, dest='model_filename',
@@ -61,21 +61,15 @@ def run_pipeline(options, unknown):
                         "-w", options.weight_filename,
                         "-o", options.result_filename])
         else:
-            try:
-                import commentjson as json
-            except ImportError:
-                import json
             import dpct
             import hytra.core.jsongraph
 
-            with open(options.model_filename, 'r') as f:
-                model = json.load(f)
+            model = hytra.core.jsongraph.readFromFile(options.model_filename)
 
-            with open(options.weight_filename, 'r') as f:
-                weights = json.load(f)
+            weights = hytra.core.jsongraph.readFromFile(options.weight_filename)
 
             result = dpct.trackFlowBased(model, weights)
-            hytra.core.jsongraph.writeToFormattedJSON(options.result_filename, result)
+            hytra.core.jsongraph.writeToFile(options.result_filename, result)
 
 
     extra_params = []
@@ -5,14 +5,11 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('..'))
 # standard imports
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import argparse
 import numpy as np
 import copy
 from hytra.util.progressbar import ProgressBar
+import hytra.core.jsongraph
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Replicate nodes, links, divisions and exclusion sets N times, ' \
@@ -28,8 +25,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     print("Loading model file: " + args.model_filename)
-    with open(args.model_filename, 'r') as f:
-        model = json.load(f)
+    model = hytra.core.jsongraph.readFromFile(args.model_filename)
 
     segmentationHypotheses = model['segmentationHypotheses']
     # use generator expression instead of list comprehension, we only need it once!
@@ -65,8 +61,7 @@ if __name__ == "__main__":
                 newDiv['children'] = [offset + c for c in d['children']]
                 newModel['divisions'].append(newDiv)
             
-    with open(args.result_filename, 'w') as f:
-        json.dump(newModel, f, indent=4, separators=(',', ': '))
+    hytra.core.jsongraph.writeToFile(args.result_filename, newModel)
 
 
 # python replicate_graph.py --model /Users/chaubold/GoogleDrive/Jobs/IWRHeidelberg/eccv16data/rapoport/graphDistTransitionsConvex.json --output /Users/chaubold/GoogleDrive/Jobs/IWRHeidelberg/eccv16data/rapoport/graphDistTransitionsConvex-2times.json --num 2
@@ -7,7 +7,7 @@ sys.path.insert(0, os.path.abspath('..'))
 # standard imports
 import logging
 import configargparse as argparse
-from hytra.core.jsongraph import JsonTrackingGraph, writeToFormattedJSON
+from hytra.core.jsongraph import JsonTrackingGraph, writeToFile
 from hytra.core.jsonmergerresolver import JsonMergerResolver
 
 if __name__ == "__main__":
@@ -41,8 +41,21 @@ if __name__ == "__main__":
                         help='Filename where to store the label image with updated segmentation')
     parser.add_argument('--out-result-json-file', type=str, dest='out_result', required=True, 
                         help='Filename where to store the new result')
+    parser.add_argument('--merger-fits-file', type=str, dest='merger_fits_file', default=None,
+                        help='Filename of a HDF5 file where the fits of all resolved mergers are stored, '
+                             'such that the segmentation can be re-exported without resolving the mergers again')
+    parser.add_argument('--export-from-merger-fits', dest='export_from_merger_fits', action='store_true', default=False,
+                        help='Only export the refined segmentation using the fits stored in --merger-fits-file')
     parser.add_argument('--trans-par', dest='trans_par', type=float, default=5.0,
                         help='alpha for the transition prior')
+    parser.add_argument('--merger-resolver-plugin', dest='merger_resolver_plugin', type=str, default='GMMMergerResolver',
+                        help='Name of the merger resolver plugin, e.g. GMMMergerResolver or KMeansMergerResolver')
+    parser.add_argument('--parallel-fitting', dest='parallel_fitting', action='store_true', default=False,
+                        help='Fit all mergers of a frame in parallel using multiple processes')
+    parser.add_argument('--num-workers', dest='num_workers', type=int, default=None,
+                        help='Number of processes used for parallel fitting, defaults to the number of CPU cores')
+    parser.add_argument('--merger-solver', dest='merger_solver', type=str, default='max-flow',
+                        help='Name of the max flow solver used to link the resolved objects, "max-flow" (dpct) or "python-max-flow"')
     parser.add_argument('--verbose', dest='verbose', action='store_true',
                         help='Turn on verbose logging', default=False)
     parser.add_argument('--plugin-paths', dest='pluginPaths', type=str, nargs='+',
@@ -65,11 +78,21 @@ if __name__ == "__main__":
         args.raw_path,
         args.raw_axes,
         args.pluginPaths,
-        args.verbose)
-    merger_resolver.run(
-        args.transition_classifier_filename,
-        args.transition_classifier_path)
+        args.verbose,
+        useMultiprocessing=args.parallel_fitting,
+        numWorkers=args.num_workers,
+        mergerResolverPluginName=args.merger_resolver_plugin,
+        solver=args.merger_solver)
+    if args.export_from_merger_fits:
+        assert(args.merger_fits_file is not None)
+        merger_resolver.exportFromMergerFits(args.merger_fits_file)
+    else:
+        merger_resolver.run(
+            args.transition_classifier_filename,
+            args.transition_classifier_path)
 
-    # save
-    writeToFormattedJSON(args.out_model_filename, merger_resolver.model)
-    writeToFormattedJSON(args.out_result, merger_resolver.result)
+        # save
+        writeToFile(args.out_model_filename, merger_resolver.model)
+        writeToFile(args.out_result, merger_resolver.result)
+        if args.merger_fits_file is not None:
+            merger_resolver.saveMergerFits(args.merger_fits_file)
@@ -7,10 +7,6 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath('..'))
 # standard imports
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import logging
 import copy
 import configargparse as argparse
@@ -143,11 +139,9 @@ def trackAndContractSubmodel(submodel, weights, modelIdx, solver):
 def main(args):
     assert args.solver in ['flow', 'ilp'], "Invalid Solver selected"
 
-    with open(args.model_filename, 'r') as f:
-        model = json.load(f)
+    model = hytra.core.jsongraph.readFromFile(args.model_filename)
 
-    with open(args.weights_filename, 'r') as f:
-        weights = json.load(f)
+    weights = hytra.core.jsongraph.readFromFile(args.weights_filename)
     _getLogger().info("Done loading model and weights")
 
     traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = hytra.core.jsongraph.getMappingsBetweenUUIDsAndTraxels(model)
@@ -339,7 +333,7 @@ def main(args):
     _getLogger().info("Extracting result took {} secs".format(t1-t0))
 
     _getLogger().info("Saving stitched result to {}".format(args.results_filename))
-    hytra.core.jsongraph.writeToFormattedJSON(args.results_filename, fullResult)
+    hytra.core.jsongraph.writeToFile(args.results_filename, fullResult)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Take a json file containing a result to a set of HDF5 events files',
@@ -14,19 +14,16 @@ import numpy as np
 import logging
 from skimage.external import tifffile
 import vigra
-try:
-    import commentjson as json
-except ImportError:
-    import json
 import configargparse as argparse
 sys.path.insert(0, os.path.abspath('..'))
 from hytra.core.ilastikhypothesesgraph import IlastikHypothesesGraph
 from hytra.core.fieldofview import FieldOfView
 from hytra.pluginsystem.plugin_manager import TrackingPluginManager
-from hytra.core.jsongraph import writeToFormattedJSON
+from hytra.core.jsongraph import writeToFile, readFromFile
 import hytra.jst.conflictingsegmentsprobabilitygenerator as probabilitygenerator
 import hytra.jst.classifiertrainingexampleextractor
 from hytra.core.ilastik_project_options import IlastikProjectOptions
+from hytra.util.labelimageindex import LabelImageIndex
 
 def getLogger():
     return logging.getLogger("track_conflicting_seg_hypotheses")
@@ -45,9 +42,13 @@ def remap_label_image(label_images, mapping):
     returns a new label image with remapped object pixel values 
     """
     remapped_label_image = np.zeros(list(label_images.values())[0].shape, dtype=list(label_images.values())[0].dtype)
+    mapping_per_filename = {}
     for origObject, trackId in mapping.items():
         objectId, filename = origObject
-        remapped_label_image[label_images[filename] == objectId] = trackId
+        mapping_per_filename.setdefault(filename, {})[objectId] = trackId
+
+    for filename, filename_mapping in mapping_per_filename.items():
+        LabelImageIndex(label_images[filename]).relabel(filename_mapping, out=remapped_label_image)
 
     return remapped_label_image
 
@@ -116,7 +117,7 @@ def mapGroundTruth(options, hypotheses_graph, trackingGraph, probGenerator):
         weights = mht.train(trackingGraph.model, jsonGT)
 
         if options.learned_weights_json_filename is not None:
-            writeToFormattedJSON(options.learned_weights_json_filename, weights)
+            writeToFile(options.learned_weights_json_filename, weights)
         return weights
     return None
 
@@ -191,7 +192,7 @@ def setupGraph(options):
         trackingGraph.convexifyCosts()
 
     if options.graph_json_filename is not None:
-        writeToFormattedJSON(options.graph_json_filename, trackingGraph.model)
+        writeToFile(options.graph_json_filename, trackingGraph.model)
 
     return fieldOfView, hypotheses_graph, ilpOptions, probGenerator, trackingGraph
 
@@ -204,8 +205,7 @@ def runTracking(options, trackingGraph, weights=None):
     getLogger().info("Run tracking...")
     if weights is None:
         getLogger().info("Loading weights from " + options.weight_json_filename)
-        with open(options.weight_json_filename, 'r') as f:
-            weights = json.load(f)
+        weights = readFromFile(options.weight_json_filename)
 
         # if withDivisions:
         #     weights = {"weights" : [10, 10, 10, 500, 500]}
@@ -228,7 +228,7 @@ def runTracking(options, trackingGraph, weights=None):
         result = mht.track(trackingGraph.model, weights)
     
     if options.result_json_filename is not None:
-        writeToFormattedJSON(options.result_json_filename, result)
+        writeToFile(options.result_json_filename, result)
 
     return result
 
@@ -22,4 +22,4 @@ if __name__ == "__main__":
     args, _ = parser.parse_known_args()
 
     weightsDict = hytra.core.ilastik_project_options.extractWeightDictFromIlastikProject(args.ilpFilename, args.param_path)
-    hytra.core.jsongraph.writeToFormattedJSON(args.out, weightsDict)
+    hytra.core.jsongraph.writeToFile(args.out, weightsDict)
@@ -0,0 +1,59 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+import h5py
+import hytra.core.jsongraph as jg
+import hytra.core.binarygraph as bg
+from .test_jsongraph import return_example_model, return_example_result
+
+def _roundTrip(dictionary, filename='model.h5'):
+    tempDir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempDir, filename)
+        jg.writeToFile(filename, dictionary)
+        assert(h5py.is_hdf5(filename) == bg.isHDF5Filename(filename))
+        return jg.readFromFile(filename)
+    finally:
+        shutil.rmtree(tempDir)
+
+def test_modelRoundTrip():
+    model = return_example_model()
+    assert(_roundTrip(model) == model)
+
+    # the uuid mapping should be stored as integer arrays
+    tempDir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempDir, 'model.hdf5')
+        bg.writeToHDF5(filename, model)
+        with h5py.File(filename, 'r') as f:
+            layouts = [f[g].attrs['layout'] for g in f.keys()]
+        assert('traxelmap' in layouts)
+        assert('table' in layouts)
+    finally:
+        shutil.rmtree(tempDir)
+
+def test_resultRoundTrip():
+    result = return_example_result()
+    assert(_roundTrip(result) == result)
+
+def test_bytesRoundTrip():
+    model = return_example_model()
+    data = bg.writeToBytes(model)
+    assert(isinstance(data, bytes))
+    assert(bg.readFromBytes(data) == model)
+
+def test_mixedEntriesRoundTrip():
+    d = {
+        'weights': [1, 2.5, -3],
+        'empty': [],
+        'none': None,
+        'ragged': [[1, 2], [3]],
+        'partial': [{'id': 1, 'value': True, 'features': [[0.5], [1.5, 2.0]]}, {'id': 2, 'name': 'b'}],
+        'settings': {'statesShareWeights': True, 'optimizerEpGap': 0.01}
+    }
+    assert(_roundTrip(d) == d)
+
+def test_jsonStillWorks():
+    model = return_example_model()
+    assert(_roundTrip(model, 'model.json') == model)
@@ -0,0 +1,46 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.componentdecomposition import findConnectedComponents, decomposeModel, mergeResults
+
+def _exampleModel():
+    # two chains 0->1->2 and 3->4, detection 5 is only connected to 4 through an exclusion set, 6 is isolated
+    return {
+        'segmentationHypotheses': [{'id': i, 'features': [[1.0], [0.0]]} for i in range(7)],
+        'linkingHypotheses': [{'src': 0, 'dest': 1, 'features': [[0.0], [1.0]]},
+                              {'src': 1, 'dest': 2, 'features': [[0.0], [1.0]]},
+                              {'src': 3, 'dest': 4, 'features': [[0.0], [1.0]]}],
+        'exclusions': [[4, 5]],
+        'settings': {'statesShareWeights': True}
+    }
+
+def test_findConnectedComponents():
+    components = findConnectedComponents(_exampleModel())
+    assert(sorted(sorted(c) for c in components) == [[0, 1, 2], [3, 4, 5], [6]])
+    assert(len(components[-1]) == 1)
+
+def test_divisionsConnectComponents():
+    model = _exampleModel()
+    model['divisionHypotheses'] = [{'parent': 2, 'children': [3, 6], 'features': [[0.0], [1.0]]}]
+    assert(len(findConnectedComponents(model)) == 1)
+
+def test_decomposeModel():
+    model = _exampleModel()
+    submodels = decomposeModel(model, minBatchSize=1)
+    assert(len(submodels) == 3)
+    assert(sum(len(s['segmentationHypotheses']) for s in submodels) == 7)
+    assert(sum(len(s['linkingHypotheses']) for s in submodels) == 3)
+    assert(all(s['settings'] == model['settings'] for s in submodels))
+    withExclusion = [s for s in submodels if len(s['exclusions']) > 0]
+    assert(len(withExclusion) == 1)
+    assert(sorted(d['id'] for d in withExclusion[0]['segmentationHypotheses']) == [3, 4, 5])
+
+    # small components are batched
+    assert(len(decomposeModel(model, minBatchSize=4)) == 2)
+    assert(len(decomposeModel(model, minBatchSize=100)) == 1)
+
+def test_mergeResults():
+    results = [{'detectionResults': [{'id': 0, 'value': 1}], 'linkingResults': [], 'divisionResults': None},
+               {'detectionResults': [{'id': 1, 'value': 0}], 'linkingResults': [{'src': 1, 'dest': 2, 'value': 0}]}]
+    merged = mergeResults(results)
+    assert(len(merged['detectionResults']) == 2)
+    assert(len(merged['linkingResults']) == 1)
+    assert(merged['divisionResults'] is None)
@@ -467,6 +467,27 @@ def test_toHypoGraph():
         else:
             assert(hypothesesGraph._graph.edge[a[0]][a[1]]['value'] == 1)
 
+def test_toHypoGraphWithEnergies():
+    model = return_example_model()
+    trackingGraph = jg.JsonTrackingGraph(model=model)
+    hypothesesGraph = trackingGraph.toHypothesesGraph(withEnergies=True)
+    assert(hypothesesGraph._nextNodeUuid == 6)
+
+    # without a result there are no solution values, but the energies of the model
+    node = hypothesesGraph._graph.node[(0, 1)]
+    assert('value' not in node)
+    assert(node['id'] == 0)
+    assert(node['features'] == model['segmentationHypotheses'][0]['features'])
+    assert(node['appearanceFeatures'] == [[0.0], [0.0], [0.0]])
+    edge = hypothesesGraph._graph.edge[(0, 1)][(1, 1)]
+    assert(edge['src'] == 0 and edge['dest'] == 4)
+    assert(len(edge['features']) == 3)
+
+    # by default only the structure is inserted
+    hypothesesGraph = trackingGraph.toHypothesesGraph()
+    assert('features' not in hypothesesGraph._graph.node[(0, 1)])
+    assert('features' not in hypothesesGraph._graph.edge[(0, 1)][(1, 1)])
+
 def test_weightListToFromDict():
     model = return_example_model()
     weights = [0,1,2,3,4]
@@ -476,3 +497,145 @@ def test_weightListToFromDict():
     
     otherWeights = trackingGraph.weightsDictToList(wd)
     assert(otherWeights == [0,1,0,3,4])
+
+def test_convexifyBatch():
+    vectors = [
+        [[3.0], [1.0], [1.0], [1.0]],
+        [[0.0], [1.0], [1.0], [5.0]],
+        [[2.0], [0.5], [4.0], [3.3]],
+        [[1.0], [0.0]],
+        [[7.0]],
+        [[0.2], [0.1], [0.0]],
+    ]
+    expected = [jg.convexify(v, 0.000001) for v in vectors]
+    assert(jg.convexifyBatch(vectors, 0.000001) == expected)
+
+    model = return_example_model()
+    expectedModel = return_example_model()
+    jg.JsonTrackingGraph(model=model).convexifyCosts()
+    for seg in expectedModel['segmentationHypotheses']:
+        for f in ['features', 'appearanceFeatures', 'disappearanceFeatures']:
+            if f in seg:
+                seg[f] = jg.convexify(seg[f], 0.000001)
+    for link in expectedModel['linkingHypotheses']:
+        link['features'] = jg.convexify(link['features'], 0.000001)
+    assert(model == expectedModel)
+
+def test_resultIndex():
+    model = return_example_model()
+    result = return_example_result()
+    _, uuidToTraxelMap = jg.getMappingsBetweenUUIDsAndTraxels(model)
+    resultIndex = jg.ResultIndex(result, uuidToTraxelMap)
+
+    assert(resultIndex.timesteps == [0, 1, 2, 3])
+    assert(resultIndex.numMergers == 2)
+    assert(resultIndex.mergers(1) == {1: 2})
+    assert(resultIndex.mergers(3) == {})
+    assert(resultIndex.isMerger(2, 1) and not resultIndex.isMerger(3, 1))
+    assert(sorted(resultIndex.detections(3)) == [1, 2])
+    assert(resultIndex.links(0) == [])
+    assert(resultIndex.links(1) == [(1, 1), (2, 1)])
+    assert(resultIndex.links(3) == [(1, 2), (1, 1)])
+    assert(resultIndex.linkArray(3).shape == (2, 2))
+    assert(sorted(resultIndex.linkTargets(3, 1)) == [1, 2])
+    assert(not resultIndex.hasDivisions)
+    assert(resultIndex.divisions(2) == {})
+    assert(sorted(resultIndex.mergerLinks()) == [(1, (1, 1)), (1, (2, 1)), (2, (1, 1)), (3, (1, 1)), (3, (1, 2))])
+
+def test_resultIndexMergerTimeRange():
+    model = return_example_model()
+    result = return_example_result()
+    _, uuidToTraxelMap = jg.getMappingsBetweenUUIDsAndTraxels(model)
+    resultIndex = jg.ResultIndex(result, uuidToTraxelMap, mergerTimeRange=(2, 4))
+
+    assert(resultIndex.timesteps == [0, 1, 2, 3])
+    assert(resultIndex.numMergers == 1)
+    assert(resultIndex.mergers(1) == {})
+    assert(resultIndex.isMerger(2, 1))
+    assert(sorted(resultIndex.detections(1)) == [1])
+    assert(sorted(resultIndex.mergerLinks()) == [(2, (1, 1)), (3, (1, 1)), (3, (1, 2))])
+
+def test_divisionsPerTimestep():
+    model = return_example_model()
+    result = return_example_result()
+    # let the object in frame 2 divide instead of being a merger
+    for r in result['detectionResults']:
+        r['value'] = 1
+    result['divisionResults'] = [{'id': 3, 'value': True}]
+    traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = jg.getMappingsBetweenUUIDsAndTraxels(model)
+    timesteps = [str(t) for t in range(4)]
+
+    mergers, detections, links, divisions = jg.getMergersDetectionsLinksDivisions(result, uuidToTraxelMap)
+    linksPerTimestep = jg.getLinksPerTimestep(links, timesteps)
+    divisionsPerTimestep = jg.getDivisionsPerTimestep(divisions, linksPerTimestep, timesteps)
+    assert(divisionsPerTimestep == {'0': {}, '1': {}, '2': {}, '3': {1: [2, 1]}})
+
+    resultIndex = jg.ResultIndex(result, uuidToTraxelMap, timesteps)
+    assert(resultIndex.numMergers == 0)
+    assert(resultIndex.divisions(2) == {1: [2, 1]})
+    assert(resultIndex.isDividing(2, 1) and not resultIndex.isDividing(3, 1))
+    assert(resultIndex.children(2, 1) == [2, 1])
+
+def test_uuidTraxelMapping():
+    model = return_example_model()
+    traxelIdPerTimestepToUniqueIdMap, uuidToTraxelMap = jg.getMappingsBetweenUUIDsAndTraxels(model)
+    mapping = jg.UuidTraxelMapping.fromModel(model)
+
+    assert(mapping.toTraxelToUniqueId() == traxelIdPerTimestepToUniqueIdMap)
+    assert(mapping.toUuidToTraxelMap() == uuidToTraxelMap)
+    assert(sorted(mapping.keys()) == sorted(uuidToTraxelMap.keys()))
+    assert(len(mapping) == 6 and mapping.numTraxels() == 6)
+    assert(mapping.timesteps() == [0, 1, 2, 3])
+    assert(mapping[1] == [(3, 2)])
+    assert(5 in mapping and 6 not in mapping)
+    assert(mapping.getUuid(0, 2) == 5)
+    assert(mapping.hasTraxel(3, 1) and not mapping.hasTraxel(3, 3))
+    assert(list(mapping.getUuids([0, 3, 3], [1, 2, 3])) == [0, 1, -1])
+    try:
+        mapping.getUuid(1, 2)
+        assert(False)
+    except KeyError:
+        pass
+
+    # tracklets map several traxels to the same uuid, sorted by timestep
+    trackletMapping = jg.UuidTraxelMapping.fromUuidToTraxelMap({7: [(2, 1), (1, 4)], 3: [(0, 1)]})
+    assert(trackletMapping[7] == [(1, 4), (2, 1)])
+    assert(trackletMapping.getUuid(2, 1) == 7)
+    assert(trackletMapping.maxUuid() == 7)
+    assert(trackletMapping.toTraxelToUniqueId() == {'0': {'1': 3}, '1': {'4': 7}, '2': {'1': 7}})
+
+def test_addHypothesesBatch():
+    single = jg.JsonTrackingGraph()
+    batch = jg.JsonTrackingGraph()
+    features = [[[0], [1]], [[0], [1], [4]], [[0], [2]]]
+    appearance = [None, [[0.0], [0.01], [0.04]], None]
+    for f, a in zip(features, appearance):
+        single.addDetectionHypotheses(f, appearanceFeatures=a, nid=len(f))
+    uuids = batch.addDetectionHypothesesBatch(features, appearanceFeatures=appearance, nid=[len(f) for f in features])
+    assert(uuids == [0, 1, 2])
+    assert(single.model['segmentationHypotheses'] == batch.model['segmentationHypotheses'])
+    assert(batch.addDetectionHypotheses([[0], [1]]) == 3)
+
+    single.addLinkingHypotheses(0, 1, [[0.5], [0.2]])
+    single.addLinkingHypotheses(1, 2, [[0.1], [0.7]])
+    batch.addLinkingHypothesesBatch([0, 1], [1, 2], [[[0.5], [0.2]], [[0.1], [0.7]]])
+    assert(single.model['linkingHypotheses'] == batch.model['linkingHypotheses'])
+
+def test_addHypothesesToLoadedModel():
+    import collections
+    Traxel = collections.namedtuple('Traxel', ['Timestep', 'Id'])
+    model = {
+        'segmentationHypotheses': [{'id': 0, 'features': [[0], [1]]}, {'id': 1, 'features': [[0], [1]]}],
+        'linkingHypotheses': [{'src': 0, 'dest': 1, 'features': [[0], [1]]}],
+        'traxelToUniqueId': {'0': {'1': 0}, '1': {'1': 1}}
+    }
+    trackingGraph = jg.JsonTrackingGraph(model=model)
+    assert(isinstance(trackingGraph.uuidToTraxelMap, jg.UuidTraxelMapping))
+
+    # new detections get fresh uuids and extend both mappings
+    uuid = trackingGraph.addDetectionHypothesesFromTracklet([Traxel(1, 2), Traxel(2, 1)], [[0], [1]])
+    assert(uuid == 2)
+    assert(trackingGraph.uuidToTraxelMap[2] == [(1, 2), (2, 1)])
+    assert(trackingGraph.uuidToTraxelMap[0] == [(0, 1)])
+    assert(trackingGraph.model['traxelToUniqueId']['2'] == {'1': 2})
+    assert(jg.UuidTraxelMapping.fromModel(trackingGraph.model).getUuid(1, 2) == 2)
@@ -0,0 +1,65 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+import numpy as np
+import networkx as nx
+from hytra.core.mergerfitcache import MergerFitCache
+
+class NearestMeanPlugin(object):
+    ''' minimal merger resolver that assigns every pixel to the closest mean of the fits '''
+    def updateLabelImage(self, labelImage, objectId, fits, newIds, offset=None, boundingBox=None, coordinates=None):
+        means = np.array([f[2] for f in fits])
+        distances = np.sum((coordinates[:, np.newaxis, :] - means[np.newaxis, :, :])**2, axis=2)
+        labelImage[tuple(coordinates.T)] = np.array(newIds)[np.argmin(distances, axis=1)]
+
+def _fit(mean):
+    return (0.5, np.eye(2) * 4.0, np.array(mean, dtype=np.float64), np.eye(2) * 0.5)
+
+def _exampleUnresolvedGraph():
+    unresolvedGraph = nx.DiGraph()
+    unresolvedGraph.add_node((0, 1), fits=[_fit([2.0, 2.0]), _fit([2.0, 8.0])], newIds=range(5, 7))
+    unresolvedGraph.add_node((1, 1), fits=[_fit([3.0, 3.0])], newIds=range(5, 6))
+    unresolvedGraph.add_node((1, 2), fits=[_fit([3.0, 3.0])])
+    return unresolvedGraph
+
+def test_fromUnresolvedGraph():
+    cache = MergerFitCache.fromUnresolvedGraph(_exampleUnresolvedGraph(), 'SomeResolver')
+    assert(len(cache) == 1)
+    assert(cache.timesteps() == [0])
+    fits, newIds = cache.mergers(0)[1]
+    assert(newIds == [5, 6])
+    assert(len(fits) == 2)
+    assert(cache.mergers(1) == {})
+
+def test_roundTrip():
+    cache = MergerFitCache.fromUnresolvedGraph(_exampleUnresolvedGraph(), 'SomeResolver')
+    cache.addMerger(3, 7, [_fit([1.0, 1.0]), _fit([4.0, 1.0]), _fit([8.0, 1.0])], [10, 11, 12])
+    tempDir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempDir, 'fits.h5')
+        cache.writeToHDF5(filename)
+        loaded = MergerFitCache.readFromHDF5(filename)
+    finally:
+        shutil.rmtree(tempDir)
+
+    assert(loaded.mergerResolverName == 'SomeResolver')
+    assert(loaded.timesteps() == [0, 3])
+    for t in [0, 3]:
+        for objectId, (fits, newIds) in cache.mergers(t).items():
+            loadedFits, loadedNewIds = loaded.mergers(t)[objectId]
+            assert(loadedNewIds == newIds)
+            for fit, loadedFit in zip(fits, loadedFits):
+                for a, b in zip(fit, loadedFit):
+                    assert(np.allclose(a, b))
+
+def test_relabelFrame():
+    cache = MergerFitCache.fromUnresolvedGraph(_exampleUnresolvedGraph())
+    labelImage = np.zeros((5, 11), dtype=np.uint32)
+    labelImage[1:4, 1:10] = 1
+    labelImage[4, :] = 2
+    cache.relabelFrame(labelImage, 0, NearestMeanPlugin())
+    assert(np.all(labelImage[1:4, 1:5] == 5))
+    assert(np.all(labelImage[1:4, 6:10] == 6))
+    assert(np.all(labelImage[4, :] == 2))
+    assert(not np.any(labelImage == 1))
@@ -0,0 +1,183 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from hytra.core.mergerresolver import MergerResolver
+from hytra.core.mergerfitcache import relabelFrameInSeparateProcess
+from hytra.util.labelimageindex import LabelImageIndex
+from hytra.pluginsystem.plugin_manager import TrackingPluginManager
+
+_pluginPaths = [os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'hytra', 'plugins')]
+
+def _labelImage(t):
+    # three mergers of two squares each, placed far from the origin such that cropping to their bounding box matters
+    labelImage = np.zeros((60, 80), dtype=np.uint32)
+    for i, objectId in enumerate([2, 5, 7]):
+        top = 10 + 15 * i
+        labelImage[top:top + 6, 40 + t:46 + t] = objectId
+        labelImage[top:top + 6, 52 + 2 * i:58 + 2 * i] = objectId
+        labelImage[top + 2, 46 + t:52 + 2 * i] = objectId
+    return labelImage
+
+def _mergerResolver(useMultiprocessing):
+    mergerResolver = MergerResolver(pluginPaths=_pluginPaths, useMultiprocessing=useMultiprocessing, numWorkers=2,
+                                    mergerResolverPluginName='KMeansMergerResolver')
+    mergerResolver.pluginManager.setImageProvider('LocalImageLoader')
+    return mergerResolver
+
+def _fitAll(mergerResolver):
+    labelImageIndex = LabelImageIndex(_labelImage(0))
+    initializations = mergerResolver.mergerResolverPlugin.resolveMergerForCoords(labelImageIndex.coordinates(5), 2)
+    fittingJobs = [(labelImageIndex.coordinates(2), 2, []),
+                   (labelImageIndex.coordinates(5), 2, initializations),
+                   (labelImageIndex.coordinates(7), 3, None)]
+    with mergerResolver._createFittingExecutor() as executor:
+        return mergerResolver._fitObjects(executor, fittingJobs)
+
+def test_fitObjectsInParallel():
+    sequentialFits = _fitAll(_mergerResolver(False))
+    mergerResolver = _mergerResolver(True)
+    # the workers set up their own plugin manager, it is never sent along with the jobs
+    getstate = TrackingPluginManager.__getstate__
+    def failingGetstate(pluginManager):
+        raise AssertionError("The plugin manager must not be pickled")
+    TrackingPluginManager.__getstate__ = failingGetstate
+    try:
+        parallelFits = _fitAll(mergerResolver)
+    finally:
+        TrackingPluginManager.__getstate__ = getstate
+    assert(len(parallelFits) == 3)
+    assert([len(fits) for fits in parallelFits] == [2, 2, 3])
+    for fits, otherFits in zip(sequentialFits, parallelFits):
+        for fit, otherFit in zip(fits, otherFits):
+            assert(len(fit) == len(otherFit) == 4)
+            assert(all(np.allclose(a, b) for a, b in zip(fit, otherFit)))
+    # the fits are in image coordinates, not relative to the bounding box of the object
+    means = sorted(tuple(f[2]) for f in parallelFits[0])
+    assert(np.allclose(means[0], [12.5, 42.5], atol=1.0) and np.allclose(means[1], [12.5, 54.5], atol=1.0))
+
+def test_relabelFramesInParallel():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'labelimage.h5')
+        path = '/TrackingFeatureExtraction/LabelImage/0000/[[%d, 0, 0, 0, 0], [%d, %d, %d, %d, 1]]'
+        with h5py.File(filename, 'w') as h5file:
+            for t in range(2):
+                h5file.create_dataset(path % (t, t + 1, 60, 80, 1), data=_labelImage(t)[np.newaxis, ..., np.newaxis, np.newaxis])
+
+        relabeledFrames = []
+        for useMultiprocessing in [False, True]:
+            mergerResolver = _mergerResolver(useMultiprocessing)
+            plugin = mergerResolver.mergerResolverPlugin
+            with mergerResolver._createFittingExecutor() as executor:
+                futures = []
+                for t in range(2):
+                    coordinates = LabelImageIndex(_labelImage(t)).coordinates(5)
+                    mergerFits = {5: (plugin.resolveMergerForCoords(coordinates, 2), [10, 11])}
+                    futures.append(executor.submit(relabelFrameInSeparateProcess, filename, path, t, mergerFits,
+                                                   mergerResolver._workerPluginManager()))
+                relabeledFrames.append([f.result() for f in futures])
+
+        for (t, labelImage), (otherT, otherLabelImage) in zip(*relabeledFrames):
+            assert(t == otherT)
+            assert(np.array_equal(labelImage, otherLabelImage))
+            assert(set(np.unique(labelImage)) == set([0, 2, 7, 10, 11]))
+    finally:
+        shutil.rmtree(directory)
+
+class InMemoryMergerResolver(MergerResolver):
+    ''' resolves mergers in label images held in memory, and records the fitting jobs '''
+    def __init__(self, model, result, labelImages):
+        super(InMemoryMergerResolver, self).__init__(pluginPaths=_pluginPaths, mergerResolverPluginName='KMeansMergerResolver',
+                                                     solver='python-max-flow')
+        self.model = model
+        self.result = result
+        self.labelImages = labelImages
+        self.refinedLabelImages = {}
+        self.fittingJobs = []
+
+    def _readLabelImage(self, timeframe):
+        return self.labelImages[timeframe].copy()
+
+    def _readRefinedLabelImage(self, timeframe):
+        return self.refinedLabelImages[timeframe]
+
+    def _beginRefinedSegmentationExport(self, truncate=True):
+        if truncate:
+            self.refinedLabelImages = {}
+
+    def _exportRefinedFrame(self, timestep, labelImage):
+        self.refinedLabelImages[timestep] = labelImage.copy()
+
+    def _computeFrameFeatures(self, timestep, labelImage, objectIds):
+        labelImageIndex = LabelImageIndex(labelImage)
+        return dict(((timestep, idx), {'RegionCenter': labelImageIndex.coordinates(idx).mean(axis=0)}) for idx in objectIds)
+
+    def _fitObjects(self, executor, fittingJobs):
+        self.fittingJobs.extend(fittingJobs)
+        return super(InMemoryMergerResolver, self)._fitObjects(executor, fittingJobs)
+
+def _twoObjectsMergingTwice():
+    # objects 1 and 2 merge into object 1 in frames 1 and 3
+    labelImages = []
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'traxelToUniqueId': {}, 'settings': {'statesShareWeights': True}}
+    result = {'detectionResults': [], 'linkingResults': [], 'divisionResults': None}
+    for t in range(5):
+        labelImage = np.zeros((20, 40), dtype=np.uint32)
+        isMerger = t in [1, 3]
+        labelImage[5:11, 5 + t:11 + t] = 1
+        labelImage[5:11, 25 + t:31 + t] = 1 if isMerger else 2
+        if isMerger:
+            labelImage[8, 11 + t:25 + t] = 1
+        labelImages.append(labelImage)
+
+        ids = [1] if isMerger else [1, 2]
+        for idx in ids:
+            uuid = 10 * t + idx
+            model['segmentationHypotheses'].append({'id': uuid, 'features': [[0.0], [-1.0], [-2.0]]})
+            model['traxelToUniqueId'].setdefault(str(t), {})[str(idx)] = uuid
+            result['detectionResults'].append({'id': uuid, 'value': 2 if isMerger else 1})
+        if t > 0:
+            for src in model['traxelToUniqueId'][str(t - 1)].values():
+                for dest in model['traxelToUniqueId'][str(t)].values():
+                    model['linkingHypotheses'].append({'src': src, 'dest': dest, 'features': [[0.0], [-1.0], [-2.0]]})
+                    result['linkingResults'].append({'src': src, 'dest': dest, 'value': 1})
+    return model, result, labelImages
+
+def test_resolveInConsecutiveTimeRanges():
+    model, result, labelImages = _twoObjectsMergingTwice()
+    mergerResolver = InMemoryMergerResolver(model, result, labelImages)
+
+    assert(mergerResolver.run(timeRange=(0, 3)) == {1: {1: range(2, 4)}})
+    # only the frames of the time range are exported, the objects of the last frame are kept as initializations
+    assert(sorted(mergerResolver.refinedLabelImages.keys()) == [0, 1, 2])
+    assert(set(np.unique(mergerResolver.refinedLabelImages[1])) == set([0, 2, 3]))
+    assert(sorted(mergerResolver.borderFits.keys()) == [(2, 1), (2, 2)])
+    borderFits = dict((node, fits[0]) for node, fits in mergerResolver.borderFits.items())
+    firstRefinedModel = mergerResolver.model['traxelToUniqueId']['1'].copy()
+
+    mergerResolver.fittingJobs = []
+    assert(mergerResolver.run(timeRange=(3, 5)) == {3: {1: range(2, 4)}})
+    # the merger in the first frame of the second time range is initialized with the fits of the first run
+    mergerJobs = [job for job in mergerResolver.fittingJobs if job[1] == 2]
+    assert(len(mergerJobs) == 1)
+    initializations = mergerJobs[0][2]
+    assert(len(initializations) == 2)
+    assert(all(any(np.allclose(i[2], fit[2]) for i in initializations) for fit in borderFits.values()))
+
+    # the frames and IDs of the first run are kept
+    assert(sorted(mergerResolver.refinedLabelImages.keys()) == [0, 1, 2, 3, 4])
+    assert(set(np.unique(mergerResolver.refinedLabelImages[1])) == set([0, 2, 3]))
+    assert(set(np.unique(mergerResolver.refinedLabelImages[3])) == set([0, 2, 3]))
+    assert(mergerResolver.model['traxelToUniqueId']['1'] == firstRefinedModel)
+    assert(sorted(mergerResolver.model['traxelToUniqueId']['3'].keys()) == ['2', '3'])
+
+    # the resolved objects are linked across the border of the time ranges
+    uuidToTraxel = dict((uuid, (int(t), int(idx))) for t, ids in mergerResolver.model['traxelToUniqueId'].items()
+                        for idx, uuid in ids.items())
+    activeLinks = set((uuidToTraxel[l['src']], uuidToTraxel[l['dest']]) for l in mergerResolver.result['linkingResults']
+                      if l['value'] > 0)
+    assert(len([l for l in activeLinks if l[0][0] == 2 and l[1][0] == 3]) == 2)
+    assert(len([l for l in activeLinks if l[0][0] == 1 and l[1][0] == 2]) == 2)
@@ -0,0 +1,66 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import networkx as nx
+from hytra.core.overlaygraph import OverlayGraph
+
+def _exampleGraph():
+    g = nx.DiGraph()
+    g.add_node((0, 1), traxel='a')
+    g.add_edges_from([((0, 1), (1, 1)), ((0, 2), (1, 1)), ((1, 1), (2, 1)), ((1, 1), (2, 2))])
+    return g
+
+def test_viewOnBaseGraph():
+    base = _exampleGraph()
+    g = OverlayGraph(base, division=False)
+    assert(len(g) == 5)
+    assert((1, 1) in g)
+    assert(sorted(g.nodes()) == sorted(base.nodes()))
+    assert(sorted(g.edges()) == sorted(base.edges()))
+    assert(sorted(g.in_edges((1, 1))) == [((0, 1), (1, 1)), ((0, 2), (1, 1))])
+    assert(g.node[(0, 1)] == {'division': False})
+
+def test_attributesAreStoredInOverlay():
+    base = _exampleGraph()
+    g = OverlayGraph(base, division=False)
+    g.node[(1, 1)]
+    assert(len(g._nodeAttributes) == 0)
+    g.node[(1, 1)]['count'] = 2
+    assert(g.node[(1, 1)]['count'] == 2)
+    assert(g.node[(1, 1)]['division'] == False)
+    assert('count' not in base.node[(1, 1)])
+    assert(len(g._nodeAttributes) == 1)
+
+def test_splitNode():
+    base = _exampleGraph()
+    g = OverlayGraph(base, division=False)
+    g.node[(1, 1)]['count'] = 2
+    resolved = g.copy()
+    for idx in [5, 6]:
+        resolved.add_node((1, idx), division=False, count=1)
+        for e in g.in_edges((1, 1)):
+            resolved.add_edge(e[0], (1, idx))
+        for e in g.out_edges((1, 1)):
+            resolved.add_edge((1, idx), e[1])
+    resolved.remove_node((1, 1))
+
+    # the unresolved graph and the base graph are untouched
+    assert((1, 1) in g)
+    assert(len(g) == 5)
+    assert(len(base) == 5)
+    assert(base.number_of_edges() == 4)
+
+    assert((1, 1) not in resolved)
+    assert(len(resolved) == 6)
+    assert(resolved.node[(1, 5)]['count'] == 1)
+    assert(sorted(resolved.successors((0, 1))) == [(1, 5), (1, 6)])
+    assert(sorted(resolved.predecessors((2, 2))) == [(1, 5), (1, 6)])
+    assert(len(resolved.edges()) == 8)
+    assert(resolved.has_edge((0, 2), (1, 6)))
+    assert(not resolved.has_edge((0, 2), (1, 1)))
+
+def test_removeAddedNode():
+    g = OverlayGraph(_exampleGraph())
+    g.add_edge((2, 1), (3, 1))
+    assert(g.successors((2, 1)) == [(3, 1)])
+    g.remove_node((3, 1))
+    assert(g.successors((2, 1)) == [])
+    assert(len(g) == 5)
@@ -0,0 +1,103 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.pythonflowsolver import trackFlowBased, trackMaxFlow
+
+def _values(result):
+    detections = dict((d['id'], d['value']) for d in result['detectionResults'])
+    links = dict(((l['src'], l['dest']), l['value']) for l in result['linkingResults'])
+    return detections, links
+
+def test_trackTwoTracks():
+    # two objects move through three frames, where detection 4 is a merger of both
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[3.0], [-1.0], [1.0]], 'appearanceFeatures': [[0.0], [0.0], [0.0]]},
+            {'id': 2, 'features': [[3.0], [-1.0], [1.0]], 'appearanceFeatures': [[0.0], [0.0], [0.0]]},
+            {'id': 4, 'features': [[5.0], [1.0], [-2.0]]},
+            {'id': 5, 'features': [[3.0], [-1.0], [1.0]], 'disappearanceFeatures': [[0.0], [0.0], [0.0]]},
+            {'id': 6, 'features': [[3.0], [-1.0], [1.0]], 'disappearanceFeatures': [[0.0], [0.0], [0.0]]},
+            # a false detection that should stay inactive
+            {'id': 7, 'features': [[-1.0], [2.0], [5.0]], 'appearanceFeatures': [[0.0], [1.0], [2.0]],
+             'disappearanceFeatures': [[0.0], [1.0], [2.0]]}
+        ],
+        'linkingHypotheses': [
+            {'src': 1, 'dest': 4, 'features': [[0.0], [-1.0], [1.0]]},
+            {'src': 2, 'dest': 4, 'features': [[0.0], [-1.0], [1.0]]},
+            {'src': 4, 'dest': 5, 'features': [[0.0], [-1.0], [1.0]]},
+            {'src': 4, 'dest': 6, 'features': [[0.0], [-1.0], [1.0]]},
+            {'src': 7, 'dest': 6, 'features': [[0.0], [-1.0], [1.0]]}
+        ],
+        'settings': {'statesShareWeights': True}
+    }
+    detections, links = _values(trackFlowBased(model, {'weights': [1.0, 1.0, 1.0, 1.0]}))
+    assert(detections == {1: 1, 2: 1, 4: 2, 5: 1, 6: 1, 7: 0})
+    assert(links[(1, 4)] == 1 and links[(2, 4)] == 1 and links[(4, 5)] == 1 and links[(4, 6)] == 1)
+    assert(links[(7, 6)] == 0)
+
+def test_division():
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[5.0], [0.0]], 'appearanceFeatures': [[0.0], [0.0]], 'divisionFeatures': [[2.0], [0.0]]},
+            {'id': 2, 'features': [[5.0], [0.0]], 'disappearanceFeatures': [[0.0], [0.0]]},
+            {'id': 3, 'features': [[5.0], [0.0]], 'disappearanceFeatures': [[0.0], [0.0]]}
+        ],
+        'linkingHypotheses': [
+            {'src': 1, 'dest': 2, 'features': [[0.0], [0.0]]},
+            {'src': 1, 'dest': 3, 'features': [[0.0], [0.0]]}
+        ],
+        'settings': {}
+    }
+    result = trackFlowBased(model, {'weights': [1.0, 1.0, 1.0, 1.0, 1.0]})
+    detections, links = _values(result)
+    assert(detections == {1: 1, 2: 1, 3: 1})
+    assert(links == {(1, 2): 1, (1, 3): 1})
+    assert(result['divisionResults'] == [{'id': 1, 'value': True}])
+
+def test_maxFlow():
+    # like in merger resolving: all costs are positive, but as many objects as possible should be tracked
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[0.0], [1.0]], 'appearanceFeatures': [[0.0], [0.01]]},
+            {'id': 2, 'features': [[0.0], [1.0]], 'appearanceFeatures': [[0.0], [0.01]]},
+            {'id': 3, 'features': [[0.0], [1.0]], 'disappearanceFeatures': [[0.0], [0.01]]},
+            {'id': 4, 'features': [[0.0], [1.0]], 'disappearanceFeatures': [[0.0], [0.01]]}
+        ],
+        'linkingHypotheses': [
+            {'src': 1, 'dest': 3, 'features': [[0.0], [0.1]]},
+            {'src': 1, 'dest': 4, 'features': [[0.0], [2.0]]},
+            {'src': 2, 'dest': 3, 'features': [[0.0], [3.0]]},
+            {'src': 2, 'dest': 4, 'features': [[0.0], [0.2]]}
+        ],
+        'settings': {}
+    }
+    weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    detections, _ = _values(trackFlowBased(model, weights))
+    assert(sum(detections.values()) == 0)
+
+    detections, links = _values(trackMaxFlow(model, weights))
+    assert(sum(detections.values()) == 4)
+    assert(links == {(1, 3): 1, (1, 4): 0, (2, 3): 0, (2, 4): 1})
+
+def test_warmStart():
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [1.5]], 'disappearanceFeatures': [[0.0], [1.5]]},
+            {'id': 2, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [1.5]], 'disappearanceFeatures': [[0.0], [1.5]]},
+            {'id': 3, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [1.5]], 'disappearanceFeatures': [[0.0], [1.5]]}
+        ],
+        'linkingHypotheses': [
+            {'src': 1, 'dest': 2, 'features': [[0.0], [-1.0]]},
+            {'src': 2, 'dest': 3, 'features': [[0.0], [-1.0]]}
+        ],
+        'settings': {}
+    }
+    previousResult = trackFlowBased(model, {'weights': [1.0, 1.0, 1.0, 1.0]})
+    assert(_values(previousResult) == ({1: 1, 2: 1, 3: 1}, {(1, 2): 1, (2, 3): 1}))
+
+    # with expensive links, no detection is worth tracking on its own
+    weights = {'weights': [-3.0, 1.0, 1.0, 1.0]}
+    assert(_values(trackFlowBased(model, weights, initialResult=previousResult)) == _values(trackFlowBased(model, weights)))
+    assert(_values(trackFlowBased(model, weights, initialResult=previousResult))[1] == {(1, 2): 0, (2, 3): 0})
+
+    # an invalid initial result falls back to solving from scratch
+    invalidResult = {'detectionResults': [{'id': 2, 'value': 0}], 'linkingResults': [{'src': 1, 'dest': 2, 'value': 1}]}
+    assert(_values(trackFlowBased(model, weights, initialResult=invalidResult)) == _values(trackFlowBased(model, weights)))
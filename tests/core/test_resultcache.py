@@ -0,0 +1,72 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+import time
+import hytra.core.solvers
+from hytra.core.resultcache import ResultCache, fingerprint
+
+def _getModel(linkFeature=-1.0):
+    return {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [0.5]]},
+            {'id': 2, 'features': [[1.0], [-1.0]], 'disappearanceFeatures': [[0.0], [0.5]]}
+        ],
+        'linkingHypotheses': [{'src': 1, 'dest': 2, 'features': [[0.0], [linkFeature]]}],
+        'settings': {'statesShareWeights': True}
+    }
+
+def test_fingerprint():
+    weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    key = fingerprint(_getModel(), weights, 'flow-based')
+    # the order of keys does not matter, but everything that changes the solution does
+    reorderedModel = dict(reversed(list(_getModel().items())))
+    reorderedModel['linkingHypotheses'] = [dict(reversed(list(l.items()))) for l in reorderedModel['linkingHypotheses']]
+    assert(fingerprint(reorderedModel, weights, 'flow-based') == key)
+    assert(fingerprint(_getModel(-2.0), weights, 'flow-based') != key)
+    assert(fingerprint(_getModel(), {'weights': [1.0, 2.0, 1.0, 1.0]}, 'flow-based') != key)
+    assert(fingerprint(_getModel(), weights, 'ilp') != key)
+    # entries that are not part of the hypotheses do not matter
+    model = _getModel()
+    model['traxelToUniqueId'] = {'0': {'1': 1}}
+    assert(fingerprint(model, weights, 'flow-based') == key)
+
+def test_cachedSolve():
+    numSolves = [0]
+    def countingSolver(model, weights):
+        numSolves[0] += 1
+        return {'detectionResults': [{'id': d['id'], 'value': 1} for d in model['segmentationHypotheses']],
+                'linkingResults': [{'src': l['src'], 'dest': l['dest'], 'value': 1} for l in model['linkingHypotheses']],
+                'divisionResults': None}
+    hytra.core.solvers.registerSolver('counting', countingSolver)
+
+    tempDir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(tempDir)
+        weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+        result = hytra.core.solvers.solve(_getModel(), weights, 'counting', cache=cache)
+        cachedResult = hytra.core.solvers.solve(_getModel(), weights, 'counting', cache=cache)
+        assert(numSolves[0] == 1)
+        assert(cachedResult == result)
+        hytra.core.solvers.solve(_getModel(-2.0), weights, 'counting', cache=cache)
+        assert(numSolves[0] == 2)
+    finally:
+        shutil.rmtree(tempDir)
+        del hytra.core.solvers._solvers['counting']
+
+def test_eviction():
+    result = {'detectionResults': [{'id': i, 'value': 1} for i in range(100)], 'linkingResults': [], 'divisionResults': None}
+    tempDir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(tempDir)
+        cache.put('a', result)
+        cache.put('b', result)
+        # make 'a' the least recently used result, then only leave room for two results
+        os.utime(os.path.join(tempDir, 'a.h5'), (time.time() - 100, time.time() - 100))
+        cache.maxSizeInBytes = 2 * os.path.getsize(os.path.join(tempDir, 'b.h5'))
+        cache.put('c', result)
+        assert(cache.get('a') is None)
+        assert(cache.get('b') == result)
+        assert(cache.get('c') == result)
+    finally:
+        shutil.rmtree(tempDir)
@@ -0,0 +1,110 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.slidingwindowtracking import getWindows, SlidingWindowTracking, trackWithSlidingWindow
+from hytra.core.pythonflowsolver import trackFlowBased
+
+def _exampleModel(numFrames):
+    # two detections per frame, linked to both detections in the next frame
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'traxelToUniqueId': {}, 'settings': {}}
+    for t in range(numFrames):
+        for i in range(2):
+            uuid = t * 10 + i
+            model['segmentationHypotheses'].append({'id': uuid, 'features': [[1.0], [0.0]], 'divisionFeatures': [[0.0], [1.0]]})
+            model['traxelToUniqueId'].setdefault(str(t), {})[str(i + 1)] = uuid
+            if t > 0:
+                for j in range(2):
+                    model['linkingHypotheses'].append({'src': (t - 1) * 10 + j, 'dest': uuid, 'features': [[0.0], [1.0]]})
+    return model
+
+def test_getWindows():
+    assert(getWindows(0, 9, 5, 1) == [(0, 5), (4, 9), (8, 10)])
+    assert(getWindows(2, 9, 4, 2) == [(2, 6), (4, 8), (6, 10)])
+    assert(getWindows(0, 3, 10, 2) == [(0, 4)])
+
+def test_windowModel():
+    tracking = SlidingWindowTracking(_exampleModel(10), {}, 5, overlap=2)
+    assert(tracking.windows == [(0, 5), (3, 8), (6, 10)])
+
+    windowModel = tracking._getWindowModel(3, 8, {30: 1, 31: 0}, {(30, 40): 1}, {30: True})
+    assert(len(windowModel['segmentationHypotheses']) == 10)
+    # only links between frames of the window
+    assert(len(windowModel['linkingHypotheses']) == 16)
+
+    detections = dict((d['id'], d) for d in windowModel['segmentationHypotheses'])
+    assert(detections[30]['features'][1] == [0.0])
+    assert(detections[30]['features'][0][0] > 1000)
+    assert(detections[31]['features'][1][0] > 1000)
+    assert(detections[30]['divisionFeatures'][0][0] > 1000)
+    assert(detections[40]['features'] == [[1.0], [0.0]])
+    # tracks can enter and leave the window for free
+    assert(detections[31]['appearanceFeatures'][0] == [0.0])
+    assert(detections[71]['disappearanceFeatures'][0] == [0.0])
+    assert('disappearanceFeatures' not in detections[60])
+
+    links = dict(((l['src'], l['dest']), l) for l in windowModel['linkingHypotheses'])
+    assert(links[(30, 40)]['features'][0][0] > 1000)
+    assert(links[(30, 41)]['features'] == [[0.0], [1.0]])
+
+    # the input model is not modified
+    assert(tracking.model['segmentationHypotheses'][6]['features'] == [[1.0], [0.0]])
+
+def test_windowModelDivisionHypotheses():
+    model = _exampleModel(10)
+    model['divisionHypotheses'] = [{'parent': 20, 'children': [30, 31], 'features': [[0.0], [1.0]]},
+                                   {'parent': 40, 'children': [50, 51], 'features': [[0.0], [1.0]]}]
+    tracking = SlidingWindowTracking(model, {}, 5, overlap=2)
+    # only divisions whose parent and children are within the window are kept
+    assert(tracking._getWindowModel(0, 5, {}, {}, {})['divisionHypotheses'] == [model['divisionHypotheses'][0]])
+    assert(tracking._getWindowModel(3, 8, {}, {}, {})['divisionHypotheses'] == [model['divisionHypotheses'][1]])
+    assert(tracking._getWindowModel(6, 10, {}, {}, {})['divisionHypotheses'] == [])
+
+def test_fixedValuesWithMoreStates():
+    # detections and links that may contain up to two objects, where two objects are most likely
+    model = _exampleModel(10)
+    model['settings']['statesShareWeights'] = True
+    for d in model['segmentationHypotheses']:
+        d['features'] = [[0.0], [-2.0], [-5.0]]
+        del d['divisionFeatures']
+    for l in model['linkingHypotheses']:
+        l['features'] = [[0.0], [-1.0], [-2.0]]
+    tracking = SlidingWindowTracking(model, {}, 5, overlap=2)
+    # a consistent overlap as decided by the previous window: one object moves from 31 to 40
+    fixedLinks = {(30, 40): 0, (30, 41): 0, (31, 40): 1, (31, 41): 0}
+    windowModel = tracking._getWindowModel(3, 8, {30: 0, 31: 1, 40: 1, 41: 0}, fixedLinks, {})
+
+    # the costs of fixed values must stay convex, otherwise the flow solver can pick states it should not
+    detections = dict((d['id'], d) for d in windowModel['segmentationHypotheses'])
+    for uuid in [30, 31, 40, 41]:
+        costs = [f[0] for f in detections[uuid]['features']]
+        assert(all(b - a <= c - b for a, b, c in zip(costs, costs[1:], costs[2:])))
+
+    result = trackFlowBased(windowModel, {'weights': [1.0, 1.0, 1.0, 1.0]})
+    values = dict((d['id'], d['value']) for d in result['detectionResults'])
+    assert(values[30] == 0 and values[31] == 1 and values[40] == 1 and values[41] == 0)
+    links = dict(((l['src'], l['dest']), l['value']) for l in result['linkingResults'])
+    assert(all(links[link] == value for link, value in fixedLinks.items()))
+
+def test_trackWithSlidingWindow():
+    # one track that is very likely in the first three frames, and slightly unlikely after that
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'traxelToUniqueId': {}, 'settings': {'statesShareWeights': True}}
+    for t in range(10):
+        model['segmentationHypotheses'].append({'id': t, 'features': [[0.0], [-5.0 if t < 3 else 1.5]],
+                                                'appearanceFeatures': [[0.0], [2.0]], 'disappearanceFeatures': [[0.0], [2.0]]})
+        model['traxelToUniqueId'][str(t)] = {'1': t}
+        if t > 0:
+            model['linkingHypotheses'].append({'src': t - 1, 'dest': t, 'features': [[0.0], [-1.0]]})
+    weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+
+    tracking = SlidingWindowTracking(model, weights, 5, overlap=2, solver='python-flow')
+    assert(tracking.windows == [(0, 5), (3, 8), (6, 10)])
+    committedFrames = [(first, last) for first, last, _ in tracking.track()]
+    assert(committedFrames == [(0, 3), (3, 6), (6, 10)])
+
+    result = trackWithSlidingWindow(model, weights, 5, overlap=2, solver='python-flow')
+    detections = dict((d['id'], d['value']) for d in result['detectionResults'])
+    links = dict(((l['src'], l['dest']), l['value']) for l in result['linkingResults'])
+    assert(len(detections) == 10 and len(links) == 9)
+    # The first window continues the track to its end, where it can disappear for free. The second window on its own
+    # would not use any detection, but the overlap (frames 3 and 4) is fixed to the values of the first window,
+    # so the track continues until the second window ends.
+    assert([detections[t] for t in range(10)] == [1] * 8 + [0] * 2)
+    assert([links[(t, t + 1)] for t in range(9)] == [1] * 7 + [0] * 2)
@@ -0,0 +1,31 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import hytra.core.solvers
+
+def test_registry():
+    names = hytra.core.solvers.getSolverNames()
+    for name in ['flow-based', 'max-flow', 'ilp', 'python-flow', 'python-max-flow']:
+        assert(name in names)
+
+    hytra.core.solvers.registerSolver('nothing', lambda model, weights: {'detectionResults': [], 'linkingResults': []})
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': []}
+    assert(hytra.core.solvers.solve(model, {}, 'nothing') == {'detectionResults': [], 'linkingResults': []})
+    del hytra.core.solvers._solvers['nothing']
+
+    try:
+        hytra.core.solvers.solve(model, {}, 'unknown')
+        assert(False)
+    except ValueError:
+        pass
+
+def test_pythonFlowSolver():
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[1.0], [0.0]], 'appearanceFeatures': [[0.0], [0.0]]},
+            {'id': 2, 'features': [[1.0], [0.0]], 'disappearanceFeatures': [[0.0], [0.0]]}
+        ],
+        'linkingHypotheses': [{'src': 1, 'dest': 2, 'features': [[1.0], [0.0]]}],
+        'settings': {}
+    }
+    result = hytra.core.solvers.solve(model, {'weights': [1.0, 1.0, 1.0, 1.0]}, 'python-flow')
+    assert([d['value'] for d in result['detectionResults']] == [1, 1])
+    assert(result['linkingResults'][0]['value'] == 1)
@@ -0,0 +1,51 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.jsongraph import UuidTraxelMapping
+from hytra.core.splitplanner import SplitPlanner
+
+def _exampleModel(numFrames, detectionsPerFrame):
+    # a chain per detection index, where all links are likely to be active
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'traxelToUniqueId': {}}
+    for t in range(numFrames):
+        for i in range(detectionsPerFrame(t)):
+            uuid = t * 100 + i
+            model['segmentationHypotheses'].append({'id': uuid, 'features': [[1.0], [0.0]]})
+            model['traxelToUniqueId'].setdefault(str(t), {})[str(i + 1)] = uuid
+            if t > 0 and i < detectionsPerFrame(t - 1):
+                model['linkingHypotheses'].append({'src': (t - 1) * 100 + i, 'dest': uuid, 'features': [[2.0], [0.0]]})
+    return model
+
+def _planner(model, **kwargs):
+    return SplitPlanner(model, UuidTraxelMapping.fromModel(model), **kwargs)
+
+def test_balanceByLoad():
+    # the second half of the video contains three times as many detections
+    model = _exampleModel(40, lambda t: 1 if t < 20 else 3)
+    splitPoints = _planner(model, border=0).planSplits(2)
+    assert(len(splitPoints) == 1)
+    assert(splitPoints[0] > 20)
+
+def test_avoidLinksAndDivisions():
+    model = _exampleModel(30, lambda t: 2)
+    # remove the links leaving frame 13, such that cutting there is free
+    model['linkingHypotheses'] = [l for l in model['linkingHypotheses'] if l['src'] // 100 != 13]
+    planner = _planner(model)
+    assert(planner.cutScore(13) == 0)
+    assert(planner.planSplits(2) == [13])
+
+    # a likely division right next to the free cut moves the split point away
+    model['segmentationHypotheses'][2 * 13]['divisionFeatures'] = [[10.0], [0.0]]
+    planner = _planner(model)
+    assert(planner.planSplits(2) != [13])
+
+def test_linksSkippingFrames():
+    model = _exampleModel(10, lambda t: 1)
+    model['linkingHypotheses'].append({'src': 200, 'dest': 500, 'features': [[2.0], [0.0]]})
+    planner = _planner(model)
+    for t in [2, 3, 4]:
+        assert(len(planner.crossingLinkIndices(t)) == 2)
+    assert(len(planner.crossingLinkIndices(5)) == 1)
+
+def test_notEnoughFrames():
+    model = _exampleModel(5, lambda t: 1)
+    assert(_planner(model).planSplits(4) == [])
+    assert(len(_planner(_exampleModel(12, lambda t: 1)).planSplits(8)) == 3)
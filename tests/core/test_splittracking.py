@@ -0,0 +1,40 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.splittracking import SplitTracking
+
+def _twoTracksWithSkipLinks(numFrames):
+    # two tracks a and b, plus very attractive links from a to b skipping one frame, such that every cut is crossed by one
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'traxelToUniqueId': {},
+             'settings': {'statesShareWeights': True}}
+    for t in range(numFrames):
+        for i in range(2):
+            uuid = t * 10 + i
+            model['segmentationHypotheses'].append({'id': uuid, 'features': [[1.0], [-1.0]],
+                                                    'appearanceFeatures': [[0.0], [0.5]],
+                                                    'disappearanceFeatures': [[0.0], [0.5]]})
+            model['traxelToUniqueId'].setdefault(str(t), {})[str(i + 1)] = uuid
+            if t > 0:
+                model['linkingHypotheses'].append({'src': (t - 1) * 10 + i, 'dest': uuid, 'features': [[0.0], [-1.0]]})
+        if t > 1:
+            model['linkingHypotheses'].append({'src': (t - 2) * 10, 'dest': t * 10 + 1, 'features': [[0.0], [-5.0]]})
+    return model
+
+def test_skipLinksAcrossSplits():
+    model = _twoTracksWithSkipLinks(12)
+    result = SplitTracking.trackFlowBasedWithSplits(model, {'weights': [1.0, 1.0, 1.0, 1.0]}, numSplits=2, solver='python-flow')
+
+    links = set((l['src'], l['dest']) for l in model['linkingHypotheses'])
+    detectionValues = dict((d['id'], d['value']) for d in result['detectionResults'])
+    assert(len(detectionValues) == len(model['segmentationHypotheses']))
+    incoming = {}
+    outgoing = {}
+    for l in result['linkingResults']:
+        if l['value'] > 0:
+            # only links of the model are used, and at most once
+            assert((l['src'], l['dest']) in links)
+            assert(detectionValues[l['src']] > 0 and detectionValues[l['dest']] > 0)
+            outgoing[l['src']] = outgoing.get(l['src'], 0) + l['value']
+            incoming[l['dest']] = incoming.get(l['dest'], 0) + l['value']
+    # flow conservation
+    for uuid, value in detectionValues.items():
+        assert(outgoing.get(uuid, 0) <= value)
+        assert(incoming.get(uuid, 0) <= value)
@@ -0,0 +1,102 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+from hytra.core.stagemanifest import StageManifest, fileFingerprint
+
+def _writeFile(filename, content):
+    with open(filename, 'w') as f:
+        f.write(content)
+
+def test_fileFingerprint():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'a.txt')
+        assert(fileFingerprint(filename) is None)
+        _writeFile(filename, 'abc')
+        os.utime(filename, (1000, 1000))
+        assert(fileFingerprint(filename) == [3, 1000])
+        hashed = fileFingerprint(filename, hashContents=True)
+        os.utime(filename, (2000, 2000))
+        assert(fileFingerprint(filename, hashContents=True) == hashed)
+        assert(fileFingerprint(directory) == {'a.txt': [3, 2000]})
+    finally:
+        shutil.rmtree(directory)
+
+def test_skipUnchangedStages():
+    directory = tempfile.mkdtemp()
+    try:
+        manifestFilename = os.path.join(directory, 'manifest.json')
+        inputFilename = os.path.join(directory, 'input.txt')
+        graphFilename = os.path.join(directory, 'graph.txt')
+        resultFilename = os.path.join(directory, 'result.txt')
+        _writeFile(inputFilename, 'segmentation')
+        runs = []
+
+        def runPipeline(config, forcedStages=(), graph='graph'):
+            manifest = StageManifest(manifestFilename, forcedStages, hashContents=True)
+            def createGraph():
+                runs.append('graph')
+                _writeFile(graphFilename, graph)
+            def track():
+                runs.append('tracking')
+                _writeFile(resultFilename, 'result')
+            manifest.runStage('graph', createGraph, config, inputFiles=[inputFilename], outputFiles=[graphFilename])
+            manifest.runStage('tracking', track, {'solver': 'flow-based'}, outputFiles=[resultFilename], upstreamStages=['graph'])
+
+        runPipeline({'threshold': 0.5})
+        assert(runs == ['graph', 'tracking'])
+
+        # nothing changed, the manifest was read back from disk
+        del runs[:]
+        runPipeline({'threshold': 0.5})
+        assert(runs == [])
+
+        # a forced stage whose output stays the same does not invalidate the downstream stages
+        runPipeline({'threshold': 0.5}, forcedStages=['graph'])
+        assert(runs == ['graph'])
+
+        # a changed config re-runs the stage, and as its output changes also the downstream stage
+        del runs[:]
+        runPipeline({'threshold': 0.7}, graph='other graph')
+        assert(runs == ['graph', 'tracking'])
+
+        # changed input file
+        del runs[:]
+        _writeFile(inputFilename, 'other segmentation')
+        runPipeline({'threshold': 0.7}, graph='other graph')
+        assert(runs == ['graph'])
+
+        # modified or deleted output
+        del runs[:]
+        os.remove(resultFilename)
+        runPipeline({'threshold': 0.7}, graph='other graph')
+        assert(runs == ['tracking'])
+    finally:
+        shutil.rmtree(directory)
+
+def test_failedStageRunsAgain():
+    directory = tempfile.mkdtemp()
+    try:
+        manifestFilename = os.path.join(directory, 'manifest.json')
+        manifest = StageManifest(manifestFilename)
+        assert(manifest.runStage('tracking', lambda: None, {'solver': 'flow-based'}))
+
+        def fail():
+            raise RuntimeError('solver crashed')
+        try:
+            StageManifest(manifestFilename, forcedStages=['tracking']).runStage('tracking', fail, {'solver': 'flow-based'})
+            assert(False)
+        except RuntimeError:
+            pass
+
+        # the checkpoint of the failed run was removed
+        runs = []
+        assert(StageManifest(manifestFilename).runStage('tracking', lambda: runs.append(1), {'solver': 'flow-based'}))
+        assert(runs == [1])
+        assert(not StageManifest(manifestFilename).runStage('tracking', lambda: runs.append(1), {'solver': 'flow-based'}))
+        # stages without file outputs can be forced to run, but keep their checkpoint
+        assert(StageManifest(manifestFilename).runStage('tracking', lambda: runs.append(1), {'solver': 'flow-based'}, force=True))
+        assert(runs == [1, 1])
+    finally:
+        shutil.rmtree(directory)
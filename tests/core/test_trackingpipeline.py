@@ -0,0 +1,27 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+from hytra.core.trackingpipeline import TrackingPipeline, convertToDict
+
+def test_convertToDict():
+    params = convertToDict(['--label-image-file', 'seg.h5', '--without-divisions', '--min-size', '4', '--parallel-fitting'])
+    assert(params == {'label-image-file': 'seg.h5', 'without-divisions': True, 'min-size': '4', 'parallel-fitting': True})
+
+def test_convexifyAndTrackInMemory():
+    pipeline = TrackingPipeline()
+    pipeline.weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    # the detection energy is not convex, which the flow solver cannot handle
+    pipeline.model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[1.0], [0.0], [-2.0]], 'appearanceFeatures': [[0.0], [0.5], [1.0]]},
+            {'id': 2, 'features': [[1.0], [0.0], [-2.0]], 'disappearanceFeatures': [[0.0], [0.5], [1.0]]}
+        ],
+        'linkingHypotheses': [{'src': 1, 'dest': 2, 'features': [[0.0], [-1.0], [-2.0]]}],
+        'traxelToUniqueId': {'0': {'1': 1}, '1': {'1': 2}},
+        'settings': {'statesShareWeights': True}
+    }
+    pipeline.convexify()
+    features = [f[0] for f in pipeline.model['segmentationHypotheses'][0]['features']]
+    assert(features[1] - features[0] <= features[2] - features[1])
+
+    pipeline.track('python-flow')
+    assert([d['value'] for d in pipeline.result['detectionResults']] == [2, 2])
+    assert(pipeline.result['linkingResults'][0]['value'] == 2)
@@ -0,0 +1,88 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import copy
+import hytra.core.solvers
+from hytra.core.pythonflowsolver import trackFlowBased, splitWeights, statesShareWeights
+from hytra.core.warmstart import WarmStart
+
+def _getModel():
+    # two independent tracks of two frames each
+    model = {'segmentationHypotheses': [], 'linkingHypotheses': [], 'settings': {}}
+    for src, dest in [(1, 2), (3, 4)]:
+        model['segmentationHypotheses'].append({'id': src, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [0.5]]})
+        model['segmentationHypotheses'].append({'id': dest, 'features': [[1.0], [-1.0]], 'disappearanceFeatures': [[0.0], [0.5]]})
+        model['linkingHypotheses'].append({'src': src, 'dest': dest, 'features': [[0.0], [-1.0]]})
+    return model
+
+def _values(result):
+    return dict((d['id'], d['value']) for d in result['detectionResults'])
+
+def test_resolveChangedComponents():
+    solvedModels = []
+    def trackAndRemember(model, weights):
+        solvedModels.append(model)
+        return trackFlowBased(model, weights)
+    hytra.core.solvers.registerSolver('remembering-flow', trackAndRemember)
+
+    previousModel = _getModel()
+    weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    previousResult = trackFlowBased(previousModel, weights)
+    assert(_values(previousResult) == {1: 1, 2: 1, 3: 1, 4: 1})
+
+    # make the second detection of the second track very unlikely
+    model = _getModel()
+    model['segmentationHypotheses'][3]['features'] = [[1.0], [5.0]]
+    warmStart = WarmStart(previousResult, copy.deepcopy(previousModel), weights)
+    result = hytra.core.solvers.solve(model, weights, 'remembering-flow', warmStart)
+    assert(_values(result) == {1: 1, 2: 1, 3: 0, 4: 0})
+    assert(len(solvedModels) == 1)
+    assert(set(d['id'] for d in solvedModels[0]['segmentationHypotheses']) == set([3, 4]))
+    assert(warmStart.statistics['numResolvedComponents'] == 1 and warmStart.statistics['numComponents'] == 2)
+
+    # nothing changed, nothing to solve
+    solvedModels[:] = []
+    result = WarmStart(previousResult, previousModel, weights).solve(_getModel(), weights, 'remembering-flow')
+    assert(_values(result) == _values(previousResult))
+    assert(len(solvedModels) == 0)
+    del hytra.core.solvers._solvers['remembering-flow']
+
+def test_warmStartSolver():
+    weights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    previousResult = trackFlowBased(_getModel(), weights)
+    model = _getModel()
+    model['linkingHypotheses'][0]['features'] = [[0.0], [5.0]]
+    warmStart = WarmStart(previousResult)
+    result = hytra.core.solvers.solve(model, weights, 'python-flow', warmStart)
+    assert(_values(result) == _values(trackFlowBased(model, weights)))
+    assert(warmStart.statistics['numDetections'] == 4)
+
+def test_statesDoNotShareWeights():
+    solvedModels = []
+    def remember(model, weights):
+        solvedModels.append(model)
+        return {'detectionResults': [{'id': d['id'], 'value': 1} for d in model['segmentationHypotheses']],
+                'linkingResults': [{'src': l['src'], 'dest': l['dest'], 'value': 1} for l in model['linkingHypotheses']],
+                'divisionResults': None}
+    hytra.core.solvers.registerSolver('remembering', remember)
+
+    previousModel = _getModel()
+    previousModel['settings']['statesShareWeights'] = False
+    previousWeights = {'weights': [1.0, 1.0, 1.0, 1.0]}
+    assert(not statesShareWeights(previousModel, previousWeights))
+    try:
+        splitWeights(previousModel, previousWeights)
+        assert(False)
+    except ValueError:
+        pass
+    previousResult = remember(previousModel, previousWeights)
+
+    # without shared weights, a change of the weights changes every component
+    solvedModels[:] = []
+    warmStart = WarmStart(previousResult, previousModel, previousWeights)
+    warmStart.solve(copy.deepcopy(previousModel), {'weights': [1.0, 2.0, 1.0, 1.0]}, 'remembering')
+    assert(warmStart.statistics['numResolvedComponents'] == 2)
+
+    # but the features are still compared if the weights stay the same
+    warmStart = WarmStart(previousResult, previousModel, previousWeights)
+    warmStart.solve(copy.deepcopy(previousModel), previousWeights, 'remembering')
+    assert(warmStart.statistics['numResolvedComponents'] == 0)
+    del hytra.core.solvers._solvers['remembering']
@@ -0,0 +1,53 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import numpy as np
+from hytra.plugins.merger_resolver.kmeans_merger_resolver import KMeansMergerResolver
+
+def _twoBlobMerger():
+    # object 5 consists of two squares connected by a thin bridge, object 3 lies next to it
+    labelImage = np.zeros((20, 30), dtype=np.uint32)
+    labelImage[2:8, 2:8] = 5
+    labelImage[2:8, 14:20] = 5
+    labelImage[4, 8:14] = 5
+    labelImage[12:16, 2:6] = 3
+    return labelImage
+
+def test_fitLayout():
+    labelImage = _twoBlobMerger()
+    fits = KMeansMergerResolver().resolveMerger(labelImage, 5, 6, 2)
+    assert(len(fits) == 2)
+    for weight, covariance, mean, precisionCholesky in fits:
+        assert(0 < weight < 1)
+        assert(covariance.shape == (2, 2) and mean.shape == (2,) and precisionCholesky.shape == (2, 2))
+        assert(np.allclose(np.dot(precisionCholesky, precisionCholesky.T), np.linalg.inv(covariance)))
+    assert(abs(sum(f[0] for f in fits) - 1.0) < 1e-9)
+    # one cluster per square, the bridge is split in the middle
+    means = sorted(tuple(f[2]) for f in fits)
+    assert(abs(means[0][1] - 5.0) < 1.0 and abs(means[1][1] - 16.0) < 1.0)
+    assert(all(abs(m[0] - 4.5) < 0.5 for m in means))
+
+def test_updateLabelImageWithBoundingBox():
+    labelImage = _twoBlobMerger()
+    resolver = KMeansMergerResolver()
+    boundingBox = (slice(2, 8), slice(2, 20))
+    fits = resolver.resolveMerger(labelImage, 5, 6, 2, boundingBox=boundingBox)
+    assert(len(fits) == 2 and all(len(f) == 4 for f in fits))
+
+    # a stray pixel of the object outside of the bounding box is neither read nor written
+    labelImage[18, 28] = 5
+    expected = labelImage.copy()
+    resolver.updateLabelImage(labelImage, 5, fits, [6, 7], boundingBox=boundingBox)
+    leftId = 6 if fits[0][2][1] < fits[1][2][1] else 7
+    rightId = 13 - leftId
+    assert(np.all(labelImage[2:8, 2:8] == leftId))
+    assert(np.all(labelImage[2:8, 14:20] == rightId))
+    assert(set(np.unique(labelImage[4, 8:14])) == set([6, 7]))
+    assert(labelImage[18, 28] == 5)
+    unchanged = expected != 5
+    assert(np.all(labelImage[unchanged] == expected[unchanged]))
+
+    # the same split from known coordinates
+    coordinates = np.transpose(np.vstack(np.where(_twoBlobMerger() == 5)))
+    otherLabelImage = _twoBlobMerger()
+    resolver.updateLabelImage(otherLabelImage, 5, fits, [6, 7], coordinates=coordinates)
+    labelImage[18, 28] = 0
+    assert(np.array_equal(otherLabelImage, labelImage))
@@ -0,0 +1,33 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+from hytra.plugins.image_provider.local_image_loader import LocalImageLoader
+
+def test_reexportLabelImageV2():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'labelimage.h5')
+        path = '/TrackingFeatureExtraction/LabelImage_v2'
+        # a block holding frames 0 and 1, as written by ilastik
+        with h5py.File(filename, 'w') as h5file:
+            block = h5file.create_dataset(path + '/block0000', data=np.zeros((2, 4, 3, 1, 1), dtype='u2'))
+            block.attrs['blockSlice'] = '[0:2,0:4,0:3,0:1,0:1]'
+
+        loader = LocalImageLoader()
+        loader.shape = (4, 3, 1)
+        for value in [1, 2]:
+            # the first export of frame 2 adds a block, exporting it again replaces that block
+            loader.exportLabelImage(np.full((4, 3), value, dtype=np.uint32), 2, filename, path)
+            assert(np.all(loader.getLabelImageForFrame(filename, path, 2) == value))
+            # frames within the existing block are overwritten in place
+            loader.exportLabelImage(np.full((4, 3), value + 10, dtype=np.uint32), 1, filename, path)
+            assert(np.all(loader.getLabelImageForFrame(filename, path, 1) == value + 10))
+
+        assert(np.all(loader.getLabelImageForFrame(filename, path, 0) == 0))
+        with h5py.File(filename, 'r') as h5file:
+            assert(sorted(h5file[path].keys()) == ['block0000', 'block0001'])
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,72 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+import pipeline
+import hytra.core.jsongraph
+
+def _writeExampleFiles(directory):
+    model = {
+        'segmentationHypotheses': [
+            {'id': 1, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [0.5]], 'disappearanceFeatures': [[0.0], [0.5]]},
+            {'id': 2, 'features': [[1.0], [-1.0]], 'appearanceFeatures': [[0.0], [0.5]], 'disappearanceFeatures': [[0.0], [0.5]]}
+        ],
+        'linkingHypotheses': [{'src': 1, 'dest': 2, 'features': [[0.0], [-1.0]]}],
+        'settings': {'statesShareWeights': True},
+        'traxelToUniqueId': {'0': {'1': 1}, '1': {'1': 2}}
+    }
+    hytra.core.jsongraph.writeToFile(os.path.join(directory, 'graph.json'), model)
+    hytra.core.jsongraph.writeToFile(os.path.join(directory, 'weights.json'), {'weights': [1.0, 1.0, 1.0, 1.0]})
+
+def _options(directory):
+    options = argparse.Namespace(
+        config_file=None, verbose=False, use_subprocesses=False, write_intermediate_files=False, tracking_executable=None,
+        export_format=None, solver='python-flow', decompose_components=False, num_workers=None, min_component_batch_size=1000,
+        sliding_window_length=None, sliding_window_overlap=1, warm_start_result_filename=None, warm_start_model_filename=None,
+        warm_start_weight_filename=None, warm_start_threshold=1e-6, result_cache_dir=None, result_cache_size=1024,
+        stage_manifest_file=os.path.join(directory, 'manifest.json'), force_stages=[], hash_stage_files=False,
+        model_filename=os.path.join(directory, 'graph.json'),
+        weight_filename=os.path.join(directory, 'weights.json'),
+        result_filename=os.path.join(directory, 'result.json'))
+    for stage, _ in pipeline.STAGES:
+        setattr(options, 'do_' + stage.replace('-', '_'), stage in ['tracking', 'merger-resolving'])
+    return options
+
+def test_restartAfterFailedMergerResolving():
+    directory = tempfile.mkdtemp()
+    solveModel = pipeline.solve_model
+    numSolves = [0]
+    def countingSolveModel(model, weights, options):
+        numSolves[0] += 1
+        return solveModel(model, weights, options)
+    pipeline.solve_model = countingSolveModel
+    try:
+        _writeExampleFiles(directory)
+        # merger resolving fails because the config lacks the label image
+        unknown = ['--out-graph-json-file', os.path.join(directory, 'out-graph.json'),
+                   '--out-result-json-file', os.path.join(directory, 'out-result.json'),
+                   '--out-label-image-file', os.path.join(directory, 'out-label-image.h5')]
+        for _ in range(2):
+            try:
+                pipeline.run_pipeline(_options(directory), unknown)
+                assert(False)
+            except KeyError:
+                pass
+        # the result was checkpointed by the first run, the restart only tried merger resolving again
+        assert(numSolves[0] == 1)
+        assert(os.path.exists(os.path.join(directory, 'result.json')))
+
+        options = _options(directory)
+        options.force_stages = ['tracking']
+        try:
+            pipeline.run_pipeline(options, unknown)
+        except KeyError:
+            pass
+        assert(numSolves[0] == 2)
+    finally:
+        pipeline.solve_model = solveModel
+        shutil.rmtree(directory)
@@ -0,0 +1,69 @@
+from __future__ import print_function, absolute_import, nested_scopes, generators, division, with_statement, unicode_literals
+import numpy as np
+from hytra.util.labelimageindex import LabelImageIndex, LabelImageIndexCache
+
+def _exampleLabelImage():
+    labelImage = np.zeros([20, 30, 4], dtype=np.uint32)
+    labelImage[2:5, 3:9, 1:3] = 1
+    labelImage[10:18, 20:25, :] = 7
+    labelImage[11, 21, 2] = 3
+    labelImage[0, 0, 0] = 3
+    return labelImage
+
+def test_coordinates():
+    labelImage = _exampleLabelImage()
+    index = LabelImageIndex(labelImage)
+    assert(list(index.labels()) == [1, 3, 7])
+    assert(list(index.labels(includeBackground=True)) == [0, 1, 3, 7])
+    assert(index.maxLabel() == 7)
+    assert(2 not in index)
+    for label in [0, 1, 3, 7]:
+        expected = np.transpose(np.vstack(np.where(labelImage == label)))
+        assert(np.array_equal(index.coordinates(label), expected))
+        assert(index.count(label) == np.sum(labelImage == label))
+    assert(index.coordinates(2).shape == (0, 3))
+    assert(list(index.counts([1, 2, 7])) == [36, 0, 159])
+
+def test_boundingBoxAndMask():
+    labelImage = _exampleLabelImage()
+    index = LabelImageIndex(labelImage)
+    assert(index.boundingBox(1) == (slice(2, 5), slice(3, 9), slice(1, 3)))
+    assert(index.boundingBox(3) == (slice(0, 12), slice(0, 22), slice(0, 3)))
+    assert(index.boundingBox(2) is None)
+
+    boundingBox, mask = index.localMask(7)
+    assert(np.array_equal(mask, labelImage[boundingBox] == 7))
+
+def test_relabel():
+    labelImage = _exampleLabelImage()
+    index = LabelImageIndex(labelImage)
+    relabeled = index.relabel({1: 5, 7: 1})
+    assert(relabeled.dtype == labelImage.dtype)
+    assert(np.all(relabeled[labelImage == 1] == 5))
+    assert(np.all(relabeled[labelImage == 7] == 1))
+    assert(np.all(relabeled[labelImage == 3] == 0))
+
+    overlap = index.valuesIn(7, relabeled)
+    assert(np.all(overlap == 1))
+
+    index.assign(labelImage, 7, np.arange(index.count(7)))
+    assert(labelImage[10, 20, 0] == 0)
+    assert(labelImage[17, 24, 3] == index.count(7) - 1)
+
+def test_cache():
+    cache = LabelImageIndexCache(maxNumFrames=2)
+    images = [_exampleLabelImage() for _ in range(3)]
+    index0 = cache.getIndex(0, images[0])
+    assert(cache.getIndex(0) is index0)
+    assert(cache.getIndex(0, images[0]) is index0)
+    # a new view of the same array reuses the index
+    assert(cache.getIndex(0, images[0][...]) is index0)
+    assert(cache.getIndex(0, images[0][:, :, :]) is index0)
+    # different array for the same key replaces the index
+    assert(cache.getIndex(0, images[1]) is not index0)
+    assert(cache.getIndex(0, images[1][:, :, 1]).shape == images[1][:, :, 1].shape)
+    cache.getIndex(1, images[1])
+    cache.getIndex(2, images[2])
+    assert(0 not in cache)
+    cache.invalidate()
+    assert(1 not in cache)